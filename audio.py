@@ -1,8 +1,10 @@
 import numpy as np
 import sounddevice as sd
 import soundfile as sf
-import sys
-from config import TTS_OUTPUT_DEVICE, AUDIO_DEVICE_INDEX, DEFAULT_GAIN
+from config import TTS_OUTPUT_DEVICE, AUDIO_DEVICE_INDEX, DEFAULT_GAIN, STREAMED_PLAYBACK
+from audio_format import negotiate_format
+from resampler import resample
+from stream_playback import play_buffer, play_file_streamed, read_scaled
 
 def list_audio_devices():
     """List all available audio devices with their IDs and channels"""
@@ -37,9 +39,30 @@ def list_audio_devices():
 
     return devices
 
-def play_audio_file(file_path, device_index=None, gain=DEFAULT_GAIN, monitor=False, debug=False):
+def find_device_index(name, kind="output"):
+    """
+    Finder index for den første device hvis navn indeholder `name`.
+
+    Args:
+        name (str): Del af device-navnet, f.eks. "CABLE Input"
+        kind (str): "output" eller "input" - device'en skal have kanaler af den type
+
+    Returns:
+        int: Device index, eller None hvis ingen matcher
+    """
+    channel_key = 'max_output_channels' if kind == "output" else 'max_input_channels'
+    for i, device in enumerate(sd.query_devices()):
+        if name in device['name'] and device.get(channel_key, 0) > 0:
+            return i
+    return None
+
+def play_audio_file(file_path, device_index=None, gain=DEFAULT_GAIN, monitor=False, debug=False,
+                    stream=STREAMED_PLAYBACK):
     """
     Play an audio file to a specific output device with gain control and level monitoring.
+
+    With stream the file is read block by block while it plays (see stream_playback),
+    so playback starts after the first block regardless of the file's length.
     """
     try:
         # Find the device by index or name
@@ -67,45 +90,48 @@ def play_audio_file(file_path, device_index=None, gain=DEFAULT_GAIN, monitor=Fal
         print(f"   Max output channels: {device_info['max_output_channels']}")
         max_channels = device_info['max_output_channels']
 
-        # Load audio file
-        data, samplerate = sf.read(file_path)
+        if stream:
+            file_info = sf.info(file_path)
+            print(f"📊 Audio file: {file_path} ({file_info.channels} ch, {file_info.samplerate}Hz, streamed)")
+            stream_format = negotiate_format(device_index, file_info.samplerate, max_channels, debug_mode=debug)
+            print("▶️ Starting playback...")
+            play_file_streamed(file_path, device_index, gain=gain, samplerate=stream_format["samplerate"],
+                               channels=stream_format["channels"], monitor=monitor, debug=debug)
+            print("✅ Playback complete.")
+            return True
+
+        # Load as float32 with gain applied in place (no float64 copy per step)
+        if gain != 1.0:
+            print(f"🔊 Applying gain: {gain}x")
+        data, samplerate = read_scaled(file_path, gain)
         print(f"📊 Audio file: {file_path}")
         print(f"   Shape: {data.shape}, Type: {data.dtype}, Rate: {samplerate}Hz")
 
-        # Apply gain to increase volume if needed
-        if gain != 1.0:
-            print(f"🔊 Applying gain: {gain}x")
-            data = data * gain
-            data = np.clip(data, -1.0, 1.0)  # Prevent distortion
-
-        # Handle channels correctly
-        if data.ndim > 1:
-            original_channels = data.shape[1]
-            if original_channels > max_channels:
-                print(f"🎧 Downmixing from {original_channels} to {max_channels} channels")
-                if max_channels == 1:
-                    data = np.mean(data, axis=1)
-                else:
-                    # Keep only the channels we need
-                    data = data[:, :max_channels]
-        elif data.ndim == 1 and max_channels > 1:
-            # Mono to stereo/multi-channel conversion
-            print(f"🎧 Upmixing from mono to {max_channels} channels")
-            data = np.tile(data.reshape(-1, 1), (1, max_channels))
-
-        # Ensure compatible data type
-        data = data.astype(np.float32)
-
-        # Print final data shape
-        if data.ndim > 1:
-            print(f"🔄 Final audio format: {data.shape[1]} channels, {len(data)} samples")
-        else:
-            print(f"🔄 Final audio format: 1 channel, {len(data)} samples")
+        # Handle channels correctly; mono is mapped to all output channels during playback
+        original_channels = data.shape[1]
+        if original_channels > max_channels:
+            print(f"🎧 Downmixing from {original_channels} to {max_channels} channels")
+            if max_channels == 1:
+                data = data.mean(axis=1, keepdims=True)
+            else:
+                # Keep only the channels we need (a view, not a copy)
+                data = data[:, :max_channels]
+        elif original_channels == 1 and max_channels > 1:
+            print(f"🎧 Mapping mono to {max_channels} channels")
+
+        # Negotiate the stream format; only resample if the device can't take the file's rate
+        stream_format = negotiate_format(device_index, samplerate, max_channels, debug_mode=debug)
+        if stream_format["resample"]:
+            print(f"🔁 Resampling from {samplerate} Hz to {stream_format['samplerate']} Hz")
+            data = resample(data, samplerate, stream_format["samplerate"])
+            samplerate = stream_format["samplerate"]
+
+        print(f"🔄 Final audio format: {data.shape[1]} -> {stream_format['channels']} channels, "
+              f"{len(data)} samples")
 
         # Play the audio directly
         print("▶️ Starting playback...")
-        sd.play(data, samplerate, device=device_index)
-        sd.wait()  # Vent til afspilningen er færdig
+        play_buffer(data, samplerate, device_index, channels=stream_format["channels"], monitor=monitor)
         print("✅ Playback complete.")
         return True
     except Exception as e:
@@ -119,8 +145,9 @@ def generate_test_tone(frequency=440, duration=3, device_index=None, gain=1.0):
     try:
         # Create a sine wave test tone
         sample_rate = 44100
-        t = np.linspace(0, duration, int(sample_rate * duration), False)
-        tone = 0.5 * np.sin(2 * np.pi * frequency * t)
+        t = np.arange(int(sample_rate * duration), dtype=np.float32) / sample_rate
+        tone = np.sin(2 * np.pi * frequency * t)
+        tone *= 0.5 * gain
 
         # Find the device
         devices = sd.query_devices()
@@ -140,33 +167,16 @@ def generate_test_tone(frequency=440, duration=3, device_index=None, gain=1.0):
             list_audio_devices()
             return False
 
-        # Get the device's channel count
-        max_channels = devices[device_index].get('max_output_channels', 2)
-
-        # Convert mono to stereo if needed
-        if tone.ndim == 1 and max_channels > 1:
-            tone = np.tile(tone.reshape(-1, 1), (1, max_channels))
-
-        # Apply gain
-        tone = tone * gain
+        # Get the device's channel count; the mono tone is mapped to all of them
+        max_channels = min(2, devices[device_index].get('max_output_channels', 2))
 
         print(f"🎵 Playing {frequency}Hz test tone at {gain*100:.0f}% amplitude")
         print(f"   Duration: {duration} seconds, Sample rate: {sample_rate}Hz")
         print(f"\n🔊 Device #{device_index}: {devices[device_index]['name']}")
 
-        # Play the tone
-        sd.play(tone, sample_rate, device=device_index)
-
-        # Show a progress bar
-        for i in range(int(duration)):
-            progress = int(30 * (i+1) / duration)
-            sys.stdout.write(f"\r[{'#' * progress}{' ' * (30-progress)}] {i+1}/{int(duration)}s")
-            sys.stdout.flush()
-            import time
-            time.sleep(1)
-
-        sd.stop()
-        print("\n✅ Test tone complete.")
+        # Play the tone (level bar while it plays)
+        play_buffer(tone, sample_rate, device_index, channels=max_channels, monitor=True)
+        print("✅ Test tone complete.")
         return True
 
     except Exception as e:
@@ -189,6 +199,7 @@ if __name__ == "__main__":
     play_parser.add_argument("--gain", type=float, default=DEFAULT_GAIN, help="Volume multiplier")
     play_parser.add_argument("--monitor", action="store_true", help="Show level monitoring")
     play_parser.add_argument("--debug", action="store_true", help="Show debug information")
+    play_parser.add_argument("--no-stream", action="store_true", help="Load the whole file before playing")
 
     # Test tone command
     tone_parser = subparsers.add_parser("tone", help="Play a test tone")
@@ -207,7 +218,8 @@ if __name__ == "__main__":
             device_index=args.device,
             gain=args.gain,
             monitor=args.monitor,
-            debug=args.debug
+            debug=args.debug,
+            stream=not args.no_stream
         )
     elif args.command == "tone":
         generate_test_tone(
@@ -6,8 +6,15 @@ import threading
 import time
 import numpy as np
 import sys
+import asyncio
 from datetime import datetime
-from config import AUDIO_INPUT_DEVICE, RECORDING_DIR
+from config import AUDIO_INPUT_DEVICE, RECORDING_DIR, VAD_SETTINGS, CAPTURE_PREROLL_SECONDS, SEGMENT_SETTINGS
+from recorder import get_capture_stream, close_capture_streams
+from vad import EndOfAnswerDetector, OnsetDetector, END_SILENCE, END_CAP, END_ERROR, END_STOPPED
+from segmenter import UtteranceSegmenter
+
+# Åbne capture-streams per device-navn (se open_answer_capture)
+_answer_captures = {}
 
 def list_audio_devices():
     """List all available audio devices with their indices."""
@@ -26,12 +33,20 @@ def list_audio_devices():
     print("-" * 80)
     return devices
 
-def record_audio_from_output(output_device_name=None, duration=10, output_dir="recordings", monitor=False):
+def open_answer_capture(output_device_name):
     """
-    Record audio from a specified output device for a given duration.
+    Åbner (første gang) den altid-kørende capture-stream for et device og returnerer den.
+
+    Device-opslaget og stream-åbningen sker kun én gang per device; senere kald
+    returnerer den kørende stream med det samme. Kald den før svaret forventes, så
+    pre-roll ringen allerede er fyldt når optagelsen startes.
+
+    Returns:
+        CaptureStream: Den åbne stream, eller None hvis device'en ikke findes
     """
-    # Ensure output directory exists
-    os.makedirs(output_dir, exist_ok=True)
+    stream = _answer_captures.get(output_device_name)
+    if stream is not None and stream.active:
+        return stream
 
     # Find the device by name
     devices = sd.query_devices()
@@ -60,71 +75,180 @@ def record_audio_from_output(output_device_name=None, duration=10, output_dir="r
     # Set parameters - brug device'ens faktiske værdier
     channels = min(2, device_info['max_input_channels'])  # Brug max 2 kanaler (stereo)
     samplerate = int(device_info['default_samplerate'])
-    print(f"   Bruger: {channels} kanaler, {samplerate} Hz")
+    print(f"   Bruger: {channels} kanaler, {samplerate} Hz, {CAPTURE_PREROLL_SECONDS}s pre-roll")
 
-    # Create output filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(output_dir, f"recording_{timestamp}.wav")
+    stream = get_capture_stream(device_index, samplerate, channels)
+    stream.name = device_info['name']
+    _answer_captures[output_device_name] = stream
+    return stream
 
-    # Start recording - brug den simpleste metode først
-    print(f"🎙️ Optager fra '{device_info['name']}' i {duration} sekunder...")
-    print(f"   Output fil: {output_file}")
 
-    try:
-        # Simpleste metode uden callback
-        print("Optager... Tryk Ctrl+C for at stoppe før tid.")
-        recording = sd.rec(int(samplerate * duration), samplerate=samplerate,
-                          channels=channels, device=device_index, dtype='float32')
-
-        # Vis en simpel progress bar
-        for i in range(duration):
-            if i > 0:
-                sys.stdout.write('\r')
-            sys.stdout.write(f"[{'#' * i}{' ' * (duration - i)}] {i}/{duration} sekunder")
-            sys.stdout.flush()
-            try:
-                sd.sleep(1000)  # Vent 1 sekund
-            except KeyboardInterrupt:
-                print("\nOptagelse stoppet før tid.")
-                break
+def record_audio_from_output(output_device_name=None, duration=10, output_dir="recordings", monitor=False,
+                             filename_prefix="recording", stop_on_silence=None, report=None, since=None,
+                             capture=None):
+    """
+    Record audio from a specified output device for a given duration.
+
+    Optagelsen læser fra device'ens altid-kørende CaptureStream (se open_answer_capture),
+    så der ikke åbnes en stream per optagelse, og flere sessioner kan optage fra hver
+    deres device samtidig. filename_prefix adskiller filerne fra samtidige sessioner.
+    since er et time.monotonic()-tidspunkt optagelsen skal starte ved - op til
+    CAPTURE_PREROLL_SECONDS tilbage, f.eks. fra før svarmode blev opdaget. capture kan
+    være en allerede kørende kilde (CaptureStream eller audio_engine.AudioEngine), som
+    så bruges i stedet for at slå output_device_name op.
+
+    Med stop_on_silence (default VAD_SETTINGS["enabled"]) er duration kun et loft:
+    optagelsen stopper når EndOfAnswerDetector har hørt tale efterfulgt af stilhed.
+    Er report en dict udfyldes den med end_reason (silence/cap/error/stopped),
+    recorded_seconds, preroll_seconds, speech_seconds, speech_started, started_at
+    (time.monotonic() for første frame) og first_sound_seconds (sample-præcis onset).
+    Med SEGMENT_SETTINGS["enabled"] deles optagelsen undervejs i ytringer (se
+    segmenter.UtteranceSegmenter); report får så segments og segment_index.
+    """
+    if report is None:
+        report = {}
+    if capture is None:
+        capture = open_answer_capture(output_device_name)
+    if capture is None:
+        report["end_reason"] = END_ERROR
+        return None
 
-        print("\nVenter på at optagelsen afsluttes...")
-        sd.wait()  # Vent til optagelsen er færdig
+    recorder = None
+    detectors = (None, None, None)
+    end_reason = END_CAP
 
-        # Save the recording
-        sf.write(output_file, recording, samplerate)
+    try:
+        print("Optager... Tryk Ctrl+C for at stoppe før tid.")
+        recorder, detectors = _start_recording(capture, duration, output_dir, filename_prefix,
+                                               stop_on_silence, since)
+        try:
+            # Vis en simpel progress bar (ét tegn per sekund) mens writer-tråden skriver
+            while not recorder.wait(0.25):
+                seconds = min(int(recorder.recorded_seconds), duration)
+                sys.stdout.write(f"\r[{'#' * seconds}{' ' * (duration - seconds)}] {seconds}/{duration} sekunder")
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            print("\nOptagelse stoppet før tid.")
+        # Stopper kun hvis hverken loft eller VAD allerede har afsluttet optagelsen
+        output_file = recorder.stop(END_STOPPED)
+        end_reason = _end_reason(recorder)
+
+        print(f"\nOptagelse fuldført ({end_reason}).")
         print(f"✅ Optagelse gemt som {output_file}")
         return output_file
 
     except Exception as e:
         print(f"Fejl under optagelse: {e}")
-        print("Prøver alternativ optagelsesmetode...")
+        end_reason = END_ERROR
+        if recorder is not None:
+            try:
+                recorder.stop(END_ERROR)
+            except Exception:
+                pass
+        return None
 
-        try:
-            # Alternativ metode med manuel optagelse
-            recording = np.zeros((samplerate * duration, channels), dtype='float32')
-            with sd.InputStream(samplerate=samplerate, device=device_index,
-                              channels=channels, dtype='float32') as stream:
+    finally:
+        report.update(_recording_report(recorder, detectors, end_reason))
 
-                for i in range(duration):
-                    data, overflowed = stream.read(samplerate)
-                    start_idx = i * samplerate
-                    end_idx = min((i + 1) * samplerate, len(recording))
-                    recording[start_idx:end_idx] = data[:end_idx-start_idx]
 
-                    sys.stdout.write(f"\rOptager: {i+1}/{duration} sekunder")
-                    sys.stdout.flush()
+async def record_answer_from_device(capture, duration=10, output_dir="recordings", filename_prefix="recording",
+                                    stop_on_silence=None, report=None, since=None):
+    """
+    Awaitable udgave af record_audio_from_output for en allerede kørende capture-kilde.
 
-            print("\nOptagelse fuldført.")
+    Optagelsen drives af stream-callback'en og writer-tråden; her ventes kun på en
+    asyncio-future, så event loop'et (Playwright-events, andre sessioner) kører videre
+    mens svaret optages.
 
-            # Save the recording
-            sf.write(output_file, recording, samplerate)
-            print(f"✅ Optagelse gemt som {output_file}")
-            return output_file
+    Args:
+        capture: CaptureStream eller audio_engine.AudioEngine
+
+    Returns:
+        str: Sti til den gemte lydfil, eller None hvis optagelsen fejlede
+    """
+    if report is None:
+        report = {}
+    recorder = None
+    detectors = (None, None, None)
+    end_reason = END_CAP
+    try:
+        recorder, detectors = _start_recording(capture, duration, output_dir, filename_prefix,
+                                               stop_on_silence, since)
+        output_file = await recorder
+        end_reason = _end_reason(recorder)
+        print(f"✅ Optagelse gemt som {output_file} ({end_reason}, {recorder.recorded_seconds:.1f}s)")
+        return output_file
+    except asyncio.CancelledError:
+        end_reason = END_STOPPED
+        if recorder is not None:
+            await asyncio.to_thread(recorder.stop, END_STOPPED)
+        raise
+    except Exception as e:
+        print(f"Fejl under optagelse: {e}")
+        end_reason = END_ERROR
+        return None
+    finally:
+        report.update(_recording_report(recorder, detectors, end_reason))
+
+
+def _start_recording(capture, duration, output_dir, filename_prefix, stop_on_silence, since):
+    """Fælles start for sync og async optagelse: filnavn, VAD og en pointer i ringen"""
+    if stop_on_silence is None:
+        stop_on_silence = VAD_SETTINGS["enabled"]
+    # Ensure output directory exists
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Create output filename with timestamp
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = os.path.join(output_dir, f"{filename_prefix}_{timestamp}.wav")
+
+    # Start recording
+    if stop_on_silence:
+        print(f"🎙️ Optager fra '{capture.name}' indtil svaret er slut (højst {duration} sekunder)...")
+    else:
+        print(f"🎙️ Optager fra '{capture.name}' i {duration} sekunder...")
+    print(f"   Output fil: {output_file}")
 
-        except Exception as e2:
-            print(f"Alternativ metode fejlede også: {e2}")
-            return None
+    detector = EndOfAnswerDetector(capture.samplerate) if stop_on_silence else None
+    onset = OnsetDetector(capture.samplerate)
+    segmenter = (UtteranceSegmenter(output_file, capture.samplerate, capture.channels)
+                 if SEGMENT_SETTINGS["enabled"] else None)
+
+    def on_block(block):
+        onset.feed(block)
+        if segmenter:
+            segmenter.feed(block)
+        return detector.feed(block) if detector else False
+
+    # Kun en pointer-operation i ringen - streamen kører allerede
+    recorder = capture.record(output_file, since=since, max_seconds=duration, on_block=on_block)
+    return recorder, (detector, onset, segmenter)
+
+
+def _end_reason(recorder):
+    return {"callback": END_SILENCE, "cap": END_CAP}.get(recorder.stop_reason, recorder.stop_reason)
+
+
+def _recording_report(recorder, detectors, end_reason):
+    detector, onset, segmenter = detectors
+    report = {
+        "end_reason": end_reason,
+        "recorded_seconds": round(recorder.recorded_seconds, 3) if recorder else 0.0,
+        "preroll_seconds": round(recorder.preroll_seconds, 3) if recorder else 0.0,
+        "lost_frames": recorder.lost_frames if recorder else 0,
+        "speech_seconds": round(detector.speech_seconds, 3) if detector else None,
+        "speech_started": detector.speech_started if detector else None,
+        "started_at": recorder.started_at if recorder else None,
+        "first_sound_seconds": onset.onset_seconds if onset else None,
+    }
+    # Writer-tråden er færdig her, så den sidste ytring kan lukkes og indekset skrives
+    if segmenter is not None:
+        try:
+            report["segments"] = len(segmenter.finish())
+            report["segment_index"] = segmenter.index_file
+        except Exception as e:
+            print(f"⚠️ Kunne ikke skrive ytringsindeks: {e}")
+    return report
 
 def start_recording_after_playback(playback_function, playback_args=None,
                                   recording_duration=10,
@@ -204,23 +328,27 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
-    if args.command == "list":
-        list_audio_devices()
-    elif args.command == "record":
-        record_audio_from_output(
-            output_device_name=args.device,
-            duration=args.duration,
-            monitor=args.monitor
-        )
-    elif args.command == "playrecord":
-        start_recording_after_playback(
-            playback_function=play_audio_file,
-            playback_args=args.file,
-            recording_duration=args.duration,
-            delay_after_playback=args.delay,
-            monitor=args.monitor
-        )
-    else:
-        # Default behavior if no command is specified
-        list_audio_devices()
-        parser.print_help()
\ No newline at end of file
+    try:
+        if args.command == "list":
+            list_audio_devices()
+        elif args.command == "record":
+            record_audio_from_output(
+                output_device_name=args.device,
+                duration=args.duration,
+                monitor=args.monitor
+            )
+        elif args.command == "playrecord":
+            start_recording_after_playback(
+                playback_function=play_audio_file,
+                playback_args=args.file,
+                recording_duration=args.duration,
+                delay_after_playback=args.delay,
+                monitor=args.monitor
+            )
+        else:
+            # Default behavior if no command is specified
+            list_audio_devices()
+            parser.print_help()
+    finally:
+        # Capture-streamen holdes åben mellem optagelser; luk den før programmet slutter
+        close_capture_streams()
\ No newline at end of file
@@ -0,0 +1,356 @@
+import time
+from collections import deque
+import numpy as np
+import sounddevice as sd
+from config import CAPTURE_PREROLL_SECONDS, AUDIO_WORKER, RECORDING_SUBTYPE
+from audio import find_device_index
+from audio_format import negotiate_format
+from recorder import FrameRing, RingRecording, Completion
+from resampler import resample
+from stream_playback import FileBlockReader, map_channels
+from stream_health import get_stream_health
+
+
+class PlaybackRequest:
+    """
+    Et stykke lyd i kø til AudioEngine'ens output.
+
+    started_at og finished_at er time.monotonic() for første og sidste blok der blev
+    givet til PortAudio. wait() blokerer til lyden er spillet; `await request` gør det
+    samme uden at blokere event loop'et (løses fra output-callback'en). Sluttede
+    afspilningen for tidligt fordi lyden ikke kunne leveres (error), rejser begge fejlen.
+    """
+
+    error = None
+
+    def __init__(self, data):
+        data = np.asarray(data, dtype=np.float32)
+        self.data = data.reshape(-1, 1) if data.ndim == 1 else data
+        self.position = 0
+        self.started_at = None
+        self.finished_at = None
+        self.cancelled = False
+        self.done = Completion()
+
+    @property
+    def duration(self):
+        return len(self.data)
+
+    @property
+    def exhausted(self):
+        """Al lyd er givet videre til output"""
+        return self.position >= self.duration
+
+    def fill(self, out):
+        """Kopierer de næste frames ind i out med kanal-mapping; returnerer antal frames"""
+        count = min(len(out), self.duration - self.position)
+        map_channels(out[:count], self.data[self.position:self.position + count])
+        self.position += count
+        return count
+
+    def wait(self, timeout=None):
+        """Blokerer til lyden er spillet; True hvis den blev færdig inden timeout"""
+        finished = self.done.wait(timeout)
+        if finished and self.error is not None:
+            raise self.error
+        return finished
+
+    def __await__(self):
+        return self._wait_async().__await__()
+
+    async def _wait_async(self):
+        await self.done.wait_async()
+        if self.error is not None:
+            raise self.error
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class StreamedPlaybackRequest(PlaybackRequest):
+    """
+    En PlaybackRequest der læser filen blokvis mens den spilles (stream_playback.FileBlockReader).
+
+    Læsningen starter allerede når den oprettes, så første blok ligger klar når den
+    lægges i køen - uanset filens længde og uden at hele filen dekodes først.
+    """
+
+    def __init__(self, file_path, samplerate, gain=1.0):
+        self.reader = FileBlockReader(file_path, samplerate=samplerate, gain=gain)
+        self.position = 0
+        self.started_at = None
+        self.finished_at = None
+        self.cancelled = False
+        self.done = Completion()
+
+    @property
+    def duration(self):
+        return self.reader.frames
+
+    @property
+    def exhausted(self):
+        return self.reader.exhausted
+
+    @property
+    def error(self):
+        """Fejl i læse-tråden (f.eks. en afkortet eller ulæselig fil); filen blev ikke spillet færdig"""
+        return self.reader.error
+
+    def fill(self, out):
+        count = self.reader.fill(out)
+        self.position += count
+        return count
+
+    def cancel(self):
+        super().cancel()
+        self.reader.close()
+
+
+class AudioEngine:
+    """
+    Langlivet lyd-motor der holder playback og capture åbne for hele sessionen.
+
+    Har begge devices samme sample rate bruges én full-duplex sd.Stream; ellers et
+    par af InputStream/OutputStream. Afspilninger lægges i en kø som output-callback'en
+    spiller i rækkefølge (stilhed når køen er tom); capture-siden fylder en pre-roll
+    FrameRing som optagelser læser fra (samme record() som recorder.CaptureStream).
+    Der åbnes og lukkes altså ingen PortAudio-streams mellem interaktioner.
+
+    Args:
+        playback_device (str): Navn på output-device'en (None = ingen playback)
+        capture_device (str): Navn på input-device'en (None = ingen capture)
+        preroll_seconds (float): Historik i capture-ringen
+        block_size (int): Stream-blokstørrelse i frames (default 20 ms)
+        playback_samplerate (int): Spørgsmålenes sample rate; bruges som output-rate hvis
+            der ikke er capture og device'en understøtter den (så slipper de for resampling)
+    """
+
+    def __init__(self, playback_device=None, capture_device=None,
+                 preroll_seconds=CAPTURE_PREROLL_SECONDS, block_size=None, debug_mode=False,
+                 playback_samplerate=None):
+        self.debug_mode = debug_mode
+        self.output_index = None
+        self.input_index = None
+        self.name = capture_device or playback_device
+        self.queue = deque()
+        self.current = None
+        self._streams = []
+
+        self.ring = None
+        if capture_device is not None:
+            self.input_index = find_device_index(capture_device, kind="input")
+            if self.input_index is None:
+                raise RuntimeError(f"Could not find input device '{capture_device}'")
+            self.name = sd.query_devices(self.input_index)['name']
+            capture_format = negotiate_format(self.input_index, kind="input", debug_mode=debug_mode)
+            self.samplerate = capture_format["samplerate"]
+            self.channels = capture_format["channels"]
+            capacity = int((preroll_seconds + 5) * self.samplerate)
+            self.ring = self._make_ring(capacity, self.channels, self.samplerate)
+
+        if playback_device is not None:
+            self.output_index = find_device_index(playback_device, kind="output")
+            if self.output_index is None:
+                raise RuntimeError(f"Could not find output device '{playback_device}'")
+            # Output i capture-raten giver én duplex-stream; uden capture spørgsmålenes rate
+            preferred = self.samplerate if self.ring is not None else playback_samplerate
+            self.output_format = negotiate_format(self.output_index, preferred, kind="output",
+                                                  debug_mode=debug_mode)
+            self.output_samplerate = self.output_format["samplerate"]
+            self.output_channels = self.output_format["channels"]
+
+        rate = self.samplerate if self.ring is not None else self.output_samplerate
+        self.block_size = block_size or rate // 50
+
+        # Delte xrun-tællere; en duplex-stream er én stream og får én tæller
+        if self.duplex:
+            self.input_health = self.output_health = get_stream_health(
+                f"duplex:{self.input_index}/{self.output_index}")
+        else:
+            self.input_health = get_stream_health(f"capture:{self.input_index}") if self.ring is not None else None
+            self.output_health = (get_stream_health(f"playback:{self.output_index}")
+                                  if self.output_index is not None else None)
+
+    def _make_ring(self, capacity, channels, samplerate):
+        return FrameRing(capacity, channels, samplerate)
+
+    def health_snapshot(self):
+        """Snapshot af motorens stream-tællere, {navn: tællere}"""
+        healths = {h.name: h for h in (self.input_health, self.output_health) if h is not None}
+        return {name: health.snapshot() for name, health in healths.items()}
+
+    def health_since(self, snapshot):
+        """Xruns per stream siden et tidligere health_snapshot()"""
+        healths = {h.name: h for h in (self.input_health, self.output_health) if h is not None}
+        return {name: health.since(snapshot.get(name, {})) for name, health in healths.items()}
+
+    @property
+    def duplex(self):
+        return (self.output_index is not None and self.input_index is not None
+                and self.output_samplerate == self.samplerate)
+
+    @property
+    def playback_info(self):
+        """Output-formatet som prepare_question skal klargøre spørgsmål til"""
+        return {"default_samplerate": self.output_samplerate,
+                "max_output_channels": self.output_channels}
+
+    @property
+    def active(self):
+        return bool(self._streams) and all(stream.active for stream in self._streams)
+
+    def _complete(self, request):
+        request.finished_at = time.monotonic()
+        request.done.set()
+        self.current = None
+
+    def _fill_output(self, outdata, frames):
+        filled = 0
+        while filled < frames:
+            request = self.current
+            if request is None:
+                try:
+                    request = self.current = self.queue.popleft()
+                except IndexError:
+                    break
+                request.started_at = time.monotonic()
+            if request.cancelled:
+                self._complete(request)
+                continue
+
+            # Mono-spørgsmål broadcastes til alle output-kanaler uden ekstra kopi
+            count = request.fill(outdata[filled:frames])
+            filled += count
+            if request.exhausted:
+                self._complete(request)
+            elif count == 0:
+                # En streamet afspilning venter på næste blok fra filen; stilhed imens
+                break
+        outdata[filled:] = 0
+
+    def _duplex_callback(self, indata, outdata, frames, time_info, status):
+        self.input_health.record(status)
+        self.ring.write(indata)
+        self._fill_output(outdata, frames)
+
+    def _input_callback(self, indata, frames, time_info, status):
+        self.input_health.record(status)
+        self.ring.write(indata)
+
+    def _output_callback(self, outdata, frames, time_info, status):
+        self.output_health.record(status)
+        self._fill_output(outdata, frames)
+
+    def start(self):
+        """Åbner streams én gang; kaldes igen er det en no-op"""
+        if self._streams:
+            return self
+        if self.duplex:
+            self._streams.append(sd.Stream(
+                samplerate=self.samplerate, device=(self.input_index, self.output_index),
+                channels=(self.channels, self.output_channels), dtype='float32',
+                blocksize=self.block_size, callback=self._duplex_callback))
+        else:
+            if self.input_index is not None:
+                self._streams.append(sd.InputStream(
+                    samplerate=self.samplerate, device=self.input_index, channels=self.channels,
+                    dtype='float32', blocksize=self.block_size, callback=self._input_callback))
+            if self.output_index is not None:
+                self._streams.append(sd.OutputStream(
+                    samplerate=self.output_samplerate, device=self.output_index,
+                    channels=self.output_channels, dtype='float32',
+                    blocksize=self.output_samplerate // 50, callback=self._output_callback))
+        for stream in self._streams:
+            stream.start()
+        if self.debug_mode:
+            mode = "duplex" if self.duplex else "paired streams"
+            print(f"DEBUG: Audio engine started ({mode}), playback={self.output_index}, "
+                  f"capture={self.input_index}")
+        return self
+
+    def play(self, data, samplerate=None):
+        """
+        Lægger lyd i afspilningskøen og returnerer straks. Lyd i en anden sample rate
+        resamples først (resampler.resample).
+
+        Returns:
+            PlaybackRequest: `await engine.play(...)` i async kode, wait() i tråde
+        """
+        if self.output_index is None:
+            raise RuntimeError("Audio engine has no playback device")
+        if samplerate is not None and int(samplerate) != self.output_samplerate:
+            data = resample(data, samplerate, self.output_samplerate)
+        return self.enqueue(PlaybackRequest(data))
+
+    def prepare_file(self, file_path, gain=1.0):
+        """
+        Starter blokvis læsning af en fil i motorens output-format, uden at afspille den.
+
+        Returns:
+            StreamedPlaybackRequest: Lægges i køen med enqueue() når den skal spilles
+        """
+        if self.output_index is None:
+            raise RuntimeError("Audio engine has no playback device")
+        return StreamedPlaybackRequest(file_path, self.output_samplerate, gain)
+
+    def enqueue(self, request):
+        """Lægger en PlaybackRequest i afspilningskøen og returnerer den"""
+        self.queue.append(request)
+        return request
+
+    def record(self, output_file, since=None, max_seconds=None, on_block=None, subtype=RECORDING_SUBTYPE):
+        """
+        Starter en optagelse fra capture-ringen (se recorder.CaptureStream.record).
+
+        Returns:
+            RingRecording: `await engine.record(...)` venter til den er færdig og giver filen
+        """
+        if self.ring is None:
+            raise RuntimeError("Audio engine has no capture device")
+        start_frame = self.ring.written if since is None else self.ring.frame_at(since)
+        return RingRecording(self.ring, output_file, start_frame, max_seconds=max_seconds,
+                             on_block=on_block, subtype=subtype).start()
+
+    def close(self):
+        for request in list(self.queue) + ([self.current] if self.current else []):
+            request.cancel()
+            request.done.set()
+        self.queue.clear()
+        self.current = None
+        for stream in self._streams:
+            stream.stop()
+            stream.close()
+        self._streams = []
+
+
+_engines = {}
+
+
+def get_audio_engine(playback_device=None, capture_device=None, debug_mode=False, worker=AUDIO_WORKER,
+                     playback_samplerate=None):
+    """
+    Returnerer den kørende AudioEngine for et device-par, og starter den første gang.
+
+    Med worker=True kører streams i en separat proces (audio_worker.RemoteAudioEngine).
+    playback_samplerate bruges kun når motoren startes (se AudioEngine).
+    """
+    key = (playback_device, capture_device)
+    engine = _engines.get(key)
+    if engine is None or not engine.active:
+        if worker:
+            # audio_worker bygger på AudioEngine; importeres først når den skal bruges
+            from audio_worker import RemoteAudioEngine
+            engine_class = RemoteAudioEngine
+        else:
+            engine_class = AudioEngine
+        engine = engine_class(playback_device, capture_device, debug_mode=debug_mode,
+                              playback_samplerate=playback_samplerate).start()
+        _engines[key] = engine
+    return engine
+
+
+def close_audio_engines():
+    """Lukker alle lyd-motorer (ved programmets afslutning)"""
+    for engine in _engines.values():
+        engine.close()
+    _engines.clear()
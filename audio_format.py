@@ -0,0 +1,88 @@
+import sounddevice as sd
+
+# Sample rates der prøves efter kildens egen og device'ens default, i prioriteret rækkefølge
+COMMON_SAMPLERATES = (48000, 44100, 24000, 16000)
+# Alle streams i projektet er float32 (PortAudio konverterer selv til device'ens format),
+# så det er det eneste sample-format der forhandles om
+SAMPLE_FORMAT = "float32"
+
+# (kind, device, samplerate, channels, dtype) -> bool
+_supported = {}
+# (kind, device, ønsket samplerate, kanaler) -> valgt format
+_decisions = {}
+
+
+def is_supported(device, samplerate, channels, dtype=SAMPLE_FORMAT, kind="output"):
+    """Spørger PortAudio (check_output_settings/check_input_settings) én gang per kombination"""
+    key = (kind, device, int(samplerate), int(channels), dtype)
+    supported = _supported.get(key)
+    if supported is None:
+        check = sd.check_output_settings if kind == "output" else sd.check_input_settings
+        try:
+            check(device=device, samplerate=samplerate, channels=channels, dtype=dtype)
+            supported = True
+        except Exception:
+            # sd.PortAudioError ved ikke-understøttede formater, ValueError ved ugyldige værdier
+            supported = False
+        _supported[key] = supported
+    return supported
+
+
+def negotiate_format(device, samplerate=None, channels=None, kind="output", debug_mode=False):
+    """
+    Vælger den billigste float32 stream-opsætning for et device og lyd i et givent format.
+
+    Prøver først kildens egen sample rate (ingen resampling), så device'ens default og
+    til sidst COMMON_SAMPLERATES; for hver rate det ønskede antal kanaler før device'ens.
+    Første kombination PortAudio accepterer vælges, og valget caches per device og
+    kildeformat.
+
+    Args:
+        device (int): Device index
+        samplerate (int): Kildens sample rate (None = device'ens default)
+        channels (int): Ønsket antal kanaler (None = device'ens, max 2)
+        kind (str): "output" eller "input"
+
+    Returns:
+        dict: samplerate, channels, dtype (altid SAMPLE_FORMAT), resample (om kilden
+            skal resamples) samt default_samplerate/max_<kind>_channels, så det kan
+            bruges som device_info (f.eks. til audio_prep.prepare_question)
+    """
+    info = sd.query_devices(device)
+    channel_key = f"max_{kind}_channels"
+    max_channels = min(2, info[channel_key])
+    default_samplerate = int(info['default_samplerate'])
+    samplerate = int(samplerate or default_samplerate)
+    channels = min(int(channels or max_channels), max_channels)
+
+    key = (kind, device, samplerate, channels)
+    decision = _decisions.get(key)
+    if decision is not None:
+        return decision
+
+    rates = list(dict.fromkeys((samplerate, default_samplerate) + COMMON_SAMPLERATES))
+    channel_options = list(dict.fromkeys((channels, max_channels)))
+
+    chosen = next(((rate, count) for rate in rates for count in channel_options
+                   if is_supported(device, rate, count, SAMPLE_FORMAT, kind)), None)
+    checked = chosen is not None
+    if chosen is None:
+        # PortAudio afviser alt (eller kan ikke spørges) - brug device'ens default som før
+        chosen = (default_samplerate, max_channels)
+
+    rate, count = chosen
+    decision = {
+        "samplerate": rate,
+        "channels": count,
+        "dtype": SAMPLE_FORMAT,
+        "resample": rate != samplerate,
+        "checked": checked,
+        "default_samplerate": rate,
+        channel_key: count,
+    }
+    _decisions[key] = decision
+    if debug_mode:
+        action = f"resample {samplerate} -> {rate} Hz" if decision["resample"] else f"native {rate} Hz"
+        print(f"DEBUG: Format for {kind} device {device}: {action}, {count} ch, {SAMPLE_FORMAT}"
+              + ("" if checked else " (unchecked)"))
+    return decision
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+from resampler import resample
+from config import DEFAULT_GAIN, QUESTION_CACHE_DIR, QUESTION_CACHE_MAX_MB
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg")
+
+# Hæves når klargøringen giver et andet resultat, så gamle cache-filer ikke genbruges
+PREPARE_VERSION = 3
+
+
+class PreparedCache:
+    """
+    Disk-cache af klargjorte spørgsmål som .npy-filer der åbnes med mmap.
+
+    Nøglen er (sti, mtime, størrelse, sample rate, kanaler, gain, dtype), så en ændret
+    kildefil eller et andet device-format aldrig giver et forældet buffer. Et hit er en
+    enkelt np.load(mmap_mode='r') - ingen dekodning eller resampling. Filernes mtime
+    bruges som LRU-stempel; overstiger cachen max_bytes slettes de ældst brugte.
+
+    Args:
+        cache_dir (str): Mappe til .npy-filerne
+        max_bytes (int): Samlet størrelse cachen må fylde
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def path_for(self, tts_file, samplerate, channels, gain, dtype):
+        stat = os.stat(tts_file)
+        key = (PREPARE_VERSION, os.path.abspath(tts_file), stat.st_mtime_ns, stat.st_size, int(samplerate), int(channels),
+               float(gain), np.dtype(dtype).str)
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+        stem = os.path.splitext(os.path.basename(tts_file))[0]
+        return os.path.join(self.cache_dir, f"{stem}-{digest}.npy")
+
+    def load(self, path):
+        """Det cachede buffer som read-only memmap, eller None"""
+        try:
+            data = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Marker som senest brugt
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def store(self, path, data):
+        """Gemmer et buffer atomisk (skriv til .tmp, omdøb) og rydder op efter LRU"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(partial, "wb") as f:
+            np.save(f, data)
+        os.replace(partial, path)
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npy"):
+                    path = os.path.join(self.cache_dir, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    # Windows: filen er stadig mappet af en afspilning; prøv igen næste gang
+                    pass
+
+
+_cache = PreparedCache(QUESTION_CACHE_DIR, QUESTION_CACHE_MAX_MB * 1024 * 1024) if QUESTION_CACHE_DIR else None
+
+
+def prepare_question(tts_file, device_info, gain=DEFAULT_GAIN, debug_mode=False, dtype='float32', cache=True):
+    """
+    Indlæser og klargør en spørgsmålsfil til afspilning på en bestemt device.
+
+    Filen dekodes som float32, resamples til device'ens sample rate og får gain.
+    Flere kanaler end device'en har (max 2) skæres fra; mono forbliver mono (frames x 1)
+    og mappes først til output-kanalerne ved afspilning. Resultatet gemmes i
+    PreparedCache, så et gentaget spørgsmål bagefter kun koster en mmap.
+
+    Returns:
+        tuple: (data, samplerate) klar til afspilning
+    """
+    target_samplerate = int(device_info['default_samplerate'])
+    channels = min(2, device_info.get('max_output_channels', 2))
+    if not cache or _cache is None:
+        return _prepare(tts_file, device_info, gain, debug_mode, dtype), target_samplerate
+
+    path = _cache.path_for(tts_file, target_samplerate, channels, gain, dtype)
+    started = time.perf_counter()
+    data = _cache.load(path)
+    if data is None:
+        data = _prepare(tts_file, device_info, gain, debug_mode, dtype)
+        _cache.store(path, data)
+        if debug_mode:
+            print(f"DEBUG: Cached prepared question as {path}")
+    elif debug_mode:
+        print(f"DEBUG: Prepared question from cache ({(time.perf_counter() - started) * 1000:.1f} ms): {path}")
+    return data, target_samplerate
+
+
+def _prepare(tts_file, device_info, gain, debug_mode, dtype):
+    """Dekoder, resampler, gain og kanal-mapping - det cachen sparer"""
+    # float32 fra start og in-place derefter: ingen float64-mellemtrin og ingen
+    # fuld kopi per trin (gain, klipning, kanaler)
+    data, file_samplerate = sf.read(tts_file, dtype='float32', always_2d=True)
+    if debug_mode:
+        print(f"DEBUG: Audio file loaded: {tts_file}")
+        print(f"DEBUG: Sample rate: {file_samplerate} Hz")
+        print(f"DEBUG: Channels: {data.shape[1]}")
+        print(
+            f"DEBUG: Duration: {len(data)/file_samplerate:.2f} seconds")
+
+    # Kun de kanaler device'en kan spille (max 2) - et view, ikke en kopi. Mono forbliver
+    # mono; den broadcastes til alle output-kanaler ved afspilning (stream_playback.map_channels)
+    channels = min(2, device_info.get('max_output_channels', 2))
+    if data.shape[1] > channels:
+        data = data[:, :channels]
+
+    # Resample til device'ets sample rate hvis nødvendigt (polyfase, blokvis - se resampler.py)
+    target_samplerate = int(device_info['default_samplerate'])
+    if file_samplerate != target_samplerate:
+        if debug_mode:
+            print(
+                f"DEBUG: Resampling from {file_samplerate} Hz to {target_samplerate} Hz")
+        data = resample(data, file_samplerate, target_samplerate)
+        if debug_mode:
+            print(f"DEBUG: Resampled to {len(data)} samples")
+
+    # Anvend gain
+    data *= gain
+    np.clip(data, -1.0, 1.0, out=data)  # Undgå forvrængning
+
+    if np.dtype(dtype) == np.int16:
+        data *= 32767
+        data = data.astype(np.int16)
+    elif np.dtype(dtype) != data.dtype:
+        data = data.astype(dtype)
+
+    if debug_mode:
+        print(f"DEBUG: Prepared audio with gain {gain}, shape {data.shape}, {target_samplerate} Hz")
+
+    return data
+
+
+def question_samplerate(tts_file):
+    """Spørgsmålsfilens sample rate (kun headeren læses), eller None hvis den ikke kan læses"""
+    try:
+        return sf.info(tts_file).samplerate
+    except Exception:
+        return None
+
+
+def load_question_queue(source):
+    """
+    Returnerer listen af spørgsmålsfiler fra en mappe eller et manifest.
+
+    En mappe giver alle lydfiler i sorteret rækkefølge. Et manifest er enten en
+    JSON-liste af stier eller en tekstfil med én sti per linje (# er kommentarer).
+    Relative stier i et manifest er relative til manifestets mappe.
+    """
+    if os.path.isdir(source):
+        return [os.path.join(source, name) for name in sorted(os.listdir(source))
+                if name.lower().endswith(AUDIO_EXTENSIONS)]
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8") as f:
+        if source.lower().endswith(".json"):
+            entries = json.load(f)
+        else:
+            entries = [line.strip() for line in f
+                       if line.strip() and not line.strip().startswith("#")]
+
+    return [entry if os.path.isabs(entry) else os.path.join(base_dir, entry)
+            for entry in entries]
+
+
+class QuestionPrefetcher:
+    """
+    Klargør næste spørgsmål i en baggrundstråd mens det nuværende svar optages.
+
+    Dekodning, resampling, gain og kanal-mapping sker i en enkelt worker-tråd, så
+    næste spørgsmål ligger klar i hukommelsen når podcasten går i lyttemode.
+    """
+
+    def __init__(self, questions, device_info, gain=DEFAULT_GAIN, debug_mode=False, dtype='float32'):
+        self.questions = list(questions)
+        self.device_info = device_info
+        self.gain = gain
+        self.debug_mode = debug_mode
+        self.dtype = dtype
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-prefetch")
+        self._pending = {}
+
+    def prefetch(self, index):
+        """Starter klargøring af spørgsmål nummer index (no-op hvis allerede startet)"""
+        if 0 <= index < len(self.questions) and index not in self._pending:
+            self._pending[index] = self._executor.submit(
+                prepare_question, self.questions[index], self.device_info,
+                self.gain, self.debug_mode, self.dtype)
+
+    async def get(self, index):
+        """Venter på det klargjorte spørgsmål og starter straks klargøring af det næste"""
+        self.prefetch(index)
+        future = self._pending.pop(index)
+        self.prefetch(index + 1)
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        for future in self._pending.values():
+            future.cancel()
+        self._executor.shutdown(wait=False)
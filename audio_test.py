@@ -6,6 +6,8 @@ import numpy as np
 import sys
 import time
 import os
+from stream_health import get_stream_health
+from stream_playback import play_buffer, play_file_streamed, read_scaled
 
 def list_audio_devices():
     """List all available audio devices with their indices."""
@@ -24,7 +26,7 @@ def list_audio_devices():
     print("-" * 80)
     return devices
 
-def play_audio_file(file_path, device_index=None, gain=3.0, monitor=False, debug=False):
+def play_audio_file(file_path, device_index=None, gain=3.0, monitor=False, debug=False, stream=False):
     """
     Play an audio file to a specific output device with gain control and level monitoring.
 
@@ -34,13 +36,23 @@ def play_audio_file(file_path, device_index=None, gain=3.0, monitor=False, debug
         gain (float): Volume multiplier (1.0 = original volume)
         monitor (bool): Whether to show real-time level monitoring
         debug (bool): Whether to print debug information
+        stream (bool): Read the file block by block while playing instead of loading it first
 
     Returns:
         bool: True if playback was successful, False otherwise
     """
     try:
-        # Load the audio file
-        data, samplerate = sf.read(file_path)
+        if stream and device_index is not None:
+            # Gain and channel mapping per block; playback starts after the first block
+            reader = play_file_streamed(file_path, device_index, gain=gain, monitor=monitor, debug=debug)
+            print(get_stream_health(f"playback:{device_index}"))
+            if debug:
+                print(f"Audio playback completed ({reader.delivered} frames, "
+                      f"prefetch queue empty {reader.starved} times)")
+            return True
+
+        # Load the audio file as float32, gain applied in place
+        data, samplerate = read_scaled(file_path, gain)
 
         # Find the device
         devices = sd.query_devices()
@@ -50,48 +62,17 @@ def play_audio_file(file_path, device_index=None, gain=3.0, monitor=False, debug
             list_audio_devices()
             return False
 
-        # Get the device's channel count
+        # Get the device's channel count; mono is mapped to all of them during playback
         max_channels = devices[device_index].get('max_output_channels', 2)
 
-        # Convert mono to stereo if needed
-        if data.ndim == 1 and max_channels > 1:
-            data = np.tile(data.reshape(-1, 1), (1, max_channels))
-
-        # Apply gain to increase volume
-        data = data * gain
-        data = np.clip(data, -1.0, 1.0)  # Prevent distortion
-
         if debug:
             print(f"Playing audio to device {device_index}: {devices[device_index]['name']}")
             print(f"Sample rate: {samplerate}, Duration: {len(data)/samplerate:.2f}s")
-            print(f"Channels: {data.shape[1] if data.ndim > 1 else 1}, Gain: {gain}x")
+            print(f"Channels: {data.shape[1]} -> {max_channels}, Gain: {gain}x")
 
-        # Create a callback for level monitoring if requested
+        play_buffer(data, samplerate, device_index, channels=max_channels, monitor=monitor)
         if monitor:
-            def callback(outdata, frames, time, status):
-                if status:
-                    print(f"Status: {status}")
-
-                # Calculate RMS level for monitoring
-                if outdata.size > 0:
-                    level = np.sqrt(np.mean(outdata**2))
-                    bars = int(level * 50)
-                    sys.stdout.write('\r[' + '█' * bars + ' ' * (50 - bars) + f'] {level:.3f}')
-                    sys.stdout.flush()
-
-            # Start the stream with callback
-            with sd.OutputStream(
-                samplerate=samplerate,
-                device=device_index,
-                channels=max_channels,
-                callback=callback
-            ):
-                sd.play(data, samplerate, device=device_index, blocking=True)
-                sys.stdout.write('\n')  # New line after level display
-        else:
-            # Simple playback without monitoring
-            sd.play(data, samplerate, device=device_index)
-            sd.wait()
+            print(get_stream_health(f"playback:{device_index}"))
 
         if debug:
             print("Audio playback completed")
@@ -108,8 +89,9 @@ def generate_test_tone(frequency=440, duration=3, device_index=None, gain=1.0):
     try:
         # Create a sine wave test tone
         sample_rate = 44100
-        t = np.linspace(0, duration, int(sample_rate * duration), False)
-        tone = 0.5 * np.sin(2 * np.pi * frequency * t)
+        t = np.arange(int(sample_rate * duration), dtype=np.float32) / sample_rate
+        tone = np.sin(2 * np.pi * frequency * t)
+        tone *= 0.5 * gain
 
         # Find the device
         devices = sd.query_devices()
@@ -119,21 +101,13 @@ def generate_test_tone(frequency=440, duration=3, device_index=None, gain=1.0):
             list_audio_devices()
             return False
 
-        # Get the device's channel count
+        # Get the device's channel count; the mono tone is mapped to all of them
         max_channels = devices[device_index].get('max_output_channels', 2)
 
-        # Convert mono to stereo if needed
-        if tone.ndim == 1 and max_channels > 1:
-            tone = np.tile(tone.reshape(-1, 1), (1, max_channels))
-
-        # Apply gain
-        tone = tone * gain
-
         print(f"Playing {frequency}Hz test tone to device {device_index}: {devices[device_index]['name']}")
 
         # Play the tone
-        sd.play(tone, sample_rate, device=device_index)
-        sd.wait()
+        play_buffer(tone, sample_rate, device_index, channels=max_channels)
         print("Test tone playback completed")
         return True
 
@@ -168,8 +142,10 @@ def record_audio(device_index=None, duration=10, output_file=None, monitor=False
         if monitor:
             # Create a buffer to store the recording
             frames = []
+            health = get_stream_health(f"capture:{device_index}")
 
             def callback(indata, frame_count, time_info, status):
+                health.record(status)
                 if status:
                     print(f"Status: {status}")
 
@@ -192,6 +168,7 @@ def record_audio(device_index=None, duration=10, output_file=None, monitor=False
 
             # Combine all frames into a single array
             recording = np.concatenate(frames, axis=0)
+            print(health)
         else:
             # Simple recording without monitoring
             recording = sd.rec(int(duration * samplerate), samplerate=samplerate, 
@@ -229,20 +206,12 @@ def test_audio_chain(playback_device=None, recording_device=None, test_file=None
             test_file = "test_tone.wav"
             sf.write(test_file, tone, sample_rate)
 
-        # Load the audio file
-        data, samplerate = sf.read(test_file)
+        # Load the audio file as float32, gain applied in place
+        data, samplerate = read_scaled(test_file, gain)
 
-        # Get the playback device's channel count
+        # Get the playback device's channel count; mono is mapped to all of them
         max_channels = devices[playback_device].get('max_output_channels', 2)
 
-        # Convert mono to stereo if needed
-        if data.ndim == 1 and max_channels > 1:
-            data = np.tile(data.reshape(-1, 1), (1, max_channels))
-
-        # Apply gain
-        data = data * gain
-        data = np.clip(data, -1.0, 1.0)  # Prevent distortion
-
         # Get the recording device's sample rate and channel count
         rec_samplerate = int(devices[recording_device]['default_samplerate'])
         rec_channels = min(2, devices[recording_device]['max_input_channels'])
@@ -253,9 +222,11 @@ def test_audio_chain(playback_device=None, recording_device=None, test_file=None
 
         # Create buffers for recording
         frames = []
+        health = get_stream_health(f"capture:{recording_device}")
 
         # Create callbacks
         def input_callback(indata, frame_count, time_info, status):
+            health.record(status)
             if status:
                 print(f"Input status: {status}")
             frames.append(indata.copy())
@@ -277,8 +248,7 @@ def test_audio_chain(playback_device=None, recording_device=None, test_file=None
 
             # Play the audio
             print(f"Playing to device {playback_device}: {devices[playback_device]['name']}")
-            sd.play(data, samplerate, device=playback_device)
-            sd.wait()
+            play_buffer(data, samplerate, playback_device, channels=max_channels)
 
             # Continue recording for a bit after playback
             print("Continuing to record...")
@@ -291,6 +261,7 @@ def test_audio_chain(playback_device=None, recording_device=None, test_file=None
         # Save the recording
         sf.write(output_file, recording, rec_samplerate)
         print(f"Test recording saved to: {output_file}")
+        print(health)
         return True
 
     except Exception as e:
@@ -313,6 +284,7 @@ if __name__ == "__main__":
     play_parser.add_argument("--gain", type=float, default=3.0, help="Volume multiplier")
     play_parser.add_argument("--monitor", action="store_true", help="Show level monitoring")
     play_parser.add_argument("--debug", action="store_true", help="Show debug information")
+    play_parser.add_argument("--stream", action="store_true", help="Stream the file block by block")
 
     # Test tone command
     tone_parser = subparsers.add_parser("tone", help="Play a test tone")
@@ -346,7 +318,8 @@ if __name__ == "__main__":
             device_index=args.device,
             gain=args.gain,
             monitor=args.monitor,
-            debug=args.debug
+            debug=args.debug,
+            stream=args.stream
         )
     elif args.command == "tone":
         generate_test_tone(
@@ -0,0 +1,394 @@
+import time
+import threading
+import multiprocessing
+from collections import deque
+from multiprocessing import shared_memory
+import numpy as np
+import sounddevice as sd
+from recorder import FrameRing
+from stream_health import StreamHealth
+from audio_engine import AudioEngine
+
+# Header foran samples i delt hukommelse (int64):
+# [written-sekvens, written, written_at_ns, consumed-sekvens, consumed, consumed_at_ns, reserveret...]
+# Hvert par har sin egen sekvens-tæller og dermed præcis én skriver (producent hhv. læser)
+_HEADER_SLOTS = 8
+_WRITTEN_SEQ, _WRITTEN, _WRITTEN_AT, _CONSUMED_SEQ, _CONSUMED, _CONSUMED_AT = range(6)
+
+# Så længe venter en læser højst på en skrivning i gang (skriveren kan være død midt i den)
+SEQLOCK_TIMEOUT = 0.05
+
+READY_TIMEOUT = 10.0
+
+
+class SharedFrameRing(FrameRing):
+    """
+    FrameRing i multiprocessing.shared_memory, så to processer kan dele den.
+
+    Samme semantik som FrameRing - én producent, vilkårligt mange læsere med absolutte
+    positioner - men `written` og `clock` ligger i en header i den delte blok. written
+    ændres kun sammen med sit tidsstempel under en sekvens-tæller (seqlock), så en
+    læser i den anden proces aldrig ser written og tidsstempel fra hver sin blok. consumed/consumed_clock bruges når
+    ringen går den anden vej (playback): læseren tæller op hvor langt den er nået.
+    De to par har hver sin sekvens-tæller, da de skrives fra hver sin proces.
+
+    Args:
+        name (str): Navn på en eksisterende blok der skal åbnes (None = opret ny)
+    """
+
+    def __init__(self, capacity, channels, samplerate, name=None, dtype='float32'):
+        self.capacity = capacity
+        self.channels = channels
+        self.samplerate = samplerate
+        self._owner = name is None
+        header_bytes = _HEADER_SLOTS * 8
+        size = header_bytes + capacity * channels * np.dtype(dtype).itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=self._owner, size=size if self._owner else 0)
+        self._header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=self.shm.buf)
+        self.buffer = np.ndarray((capacity, channels), dtype=dtype, buffer=self.shm.buf, offset=header_bytes)
+        if self._owner:
+            self._header[:] = 0
+            self._header[_WRITTEN_AT] = self._header[_CONSUMED_AT] = time.monotonic_ns()
+            self.buffer[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def written(self):
+        return int(self._header[_WRITTEN])
+
+    def _read_pair(self, seq_slot, value_slot, time_slot):
+        header = self._header
+        deadline = None
+        while True:
+            sequence = int(header[seq_slot])
+            value, at = int(header[value_slot]), int(header[time_slot])
+            # Ulige sekvens = skrivning i gang; ændret sekvens = læst på tværs af to skrivninger
+            if sequence % 2 == 0 and header[seq_slot] == sequence:
+                return value, at / 1e9
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + SEQLOCK_TIMEOUT
+            elif now > deadline:
+                # Skriveren er gået i stå midt i en skrivning; seneste læste værdier er bedste bud
+                return value, at / 1e9
+            time.sleep(0)
+
+    def _write_pair(self, seq_slot, value_slot, time_slot, value, at):
+        # Kun én skriver per sekvens-tæller, så += er sikkert her
+        header = self._header
+        header[seq_slot] += 1
+        header[value_slot] = value
+        header[time_slot] = int(at * 1e9)
+        header[seq_slot] += 1
+
+    @property
+    def clock(self):
+        return self._read_pair(_WRITTEN_SEQ, _WRITTEN, _WRITTEN_AT)
+
+    def _publish(self, written):
+        # written må kun ændres under seqlock'en, sammen med sit tidsstempel
+        self._write_pair(_WRITTEN_SEQ, _WRITTEN, _WRITTEN_AT, written, time.monotonic())
+
+    @property
+    def consumed_clock(self):
+        """(consumed, time.monotonic()) efter læserens seneste blok"""
+        return self._read_pair(_CONSUMED_SEQ, _CONSUMED, _CONSUMED_AT)
+
+    def read_into(self, out):
+        """
+        Kopierer de næste ulæste frames direkte ind i out (uden allokering) og tæller
+        consumed op. Resten af out nulstilles; returnerer antal kopierede frames.
+        """
+        consumed = int(self._header[_CONSUMED])
+        frames = min(len(out), self.written - consumed)
+        position = consumed % self.capacity
+        first = min(frames, self.capacity - position)
+        out[:first] = self.buffer[position:position + first]
+        if first < frames:
+            out[first:frames] = self.buffer[:frames - first]
+        out[frames:] = 0
+        if frames:
+            self._write_pair(_CONSUMED_SEQ, _CONSUMED, _CONSUMED_AT, consumed + frames, time.monotonic())
+        return frames
+
+    def close(self):
+        # Views skal slippes før blokken kan lukkes
+        self.buffer = None
+        self._header = None
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+def _worker_main(conn, settings):
+    """
+    Worker-processens hovedløkke: ejer PortAudio-streams og kun dem.
+
+    Callbacks kopierer samples mellem streams og de delte ringe og tæller xruns - intet
+    andet - så Playwright og event loop'et i controller-processen ikke kan give xruns.
+    Kontrolbeskeder (health, close) kommer over pipen.
+    """
+    streams = []
+    rings = []
+    try:
+        capture_ring = playback_ring = None
+        if settings["capture"]:
+            capture_ring = SharedFrameRing(*settings["capture"])
+            rings.append(capture_ring)
+        if settings["playback"]:
+            playback_ring = SharedFrameRing(*settings["playback"])
+            rings.append(playback_ring)
+        health = {name: StreamHealth(name) for name in settings["health"]}
+        input_health = health.get(settings["input_health"])
+        output_health = health.get(settings["output_health"])
+
+        def duplex_callback(indata, outdata, frames, time_info, status):
+            input_health.record(status)
+            capture_ring.write(indata)
+            playback_ring.read_into(outdata)
+
+        def input_callback(indata, frames, time_info, status):
+            input_health.record(status)
+            capture_ring.write(indata)
+
+        def output_callback(outdata, frames, time_info, status):
+            output_health.record(status)
+            playback_ring.read_into(outdata)
+
+        if settings["duplex"]:
+            streams.append(sd.Stream(
+                samplerate=settings["samplerate"], device=(settings["input_index"], settings["output_index"]),
+                channels=(capture_ring.channels, playback_ring.channels), dtype='float32',
+                blocksize=settings["block_size"], callback=duplex_callback))
+        else:
+            if capture_ring is not None:
+                streams.append(sd.InputStream(
+                    samplerate=capture_ring.samplerate, device=settings["input_index"],
+                    channels=capture_ring.channels, dtype='float32',
+                    blocksize=settings["block_size"], callback=input_callback))
+            if playback_ring is not None:
+                streams.append(sd.OutputStream(
+                    samplerate=playback_ring.samplerate, device=settings["output_index"],
+                    channels=playback_ring.channels, dtype='float32',
+                    blocksize=playback_ring.samplerate // 50, callback=output_callback))
+        for stream in streams:
+            stream.start()
+        conn.send(("ready", None))
+
+        while True:
+            command = conn.recv()
+            if command == "health":
+                conn.send(("health", {name: h.snapshot() for name, h in health.items()}))
+            elif command == "close":
+                break
+    except (EOFError, KeyboardInterrupt):
+        # Controlleren er væk; luk stille ned
+        pass
+    except Exception as e:
+        try:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+        except (OSError, EOFError):
+            pass
+    finally:
+        for stream in streams:
+            stream.stop()
+            stream.close()
+        for ring in rings:
+            ring.close()
+        conn.close()
+
+
+class RemoteAudioEngine(AudioEngine):
+    """
+    AudioEngine hvis PortAudio-streams kører i en separat worker-proces.
+
+    Capture- og playback-ringene ligger i delt hukommelse (SharedFrameRing); worker'en
+    skriver capture-ringen og læser playback-ringen fra sine callbacks, og controlleren
+    læser/skriver dem fra almindelige tråde. Kontrol går over en multiprocessing-pipe.
+    Udadtil er den en AudioEngine: play() giver en PlaybackRequest, record() en
+    RingRecording, og xrun-tællerne spejles ind i stream_health-registret.
+
+    Args:
+        playback_seconds (float): Hvor meget lyd der kan ligge klar i playback-ringen
+    """
+
+    def __init__(self, playback_device=None, capture_device=None, playback_seconds=2.0, **kwargs):
+        super().__init__(playback_device, capture_device, **kwargs)
+        self.playback_ring = None
+        if self.output_index is not None:
+            self.playback_ring = SharedFrameRing(int(playback_seconds * self.output_samplerate),
+                                                 self.output_channels, self.output_samplerate)
+        self._process = None
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self._feeder = None
+        self._closing = threading.Event()
+        self._wake = threading.Event()
+
+    def _make_ring(self, capacity, channels, samplerate):
+        return SharedFrameRing(capacity, channels, samplerate)
+
+    @property
+    def active(self):
+        return self._process is not None and self._process.is_alive()
+
+    def _request(self, command):
+        with self._conn_lock:
+            self._conn.send(command)
+            kind, payload = self._conn.recv()
+        if kind == "error":
+            raise RuntimeError(f"Audio worker failed: {payload}")
+        return payload
+
+    def _sync_health(self):
+        """Henter worker'ens xrun-tællere og spejler dem i de lokale StreamHealth-objekter"""
+        if not self.active:
+            return
+        try:
+            snapshots = self._request("health")
+        except (OSError, EOFError, RuntimeError):
+            return
+        for health in {self.input_health, self.output_health} - {None}:
+            snapshot = snapshots.get(health.name)
+            if snapshot:
+                health.callbacks = snapshot["callbacks"]
+                health.counts.update({k: v for k, v in snapshot.items() if k in health.counts})
+
+    def health_snapshot(self):
+        self._sync_health()
+        return super().health_snapshot()
+
+    def health_since(self, snapshot):
+        self._sync_health()
+        return super().health_since(snapshot)
+
+    def start(self):
+        if self._process is not None:
+            return self
+        settings = {
+            "duplex": self.duplex,
+            "input_index": self.input_index,
+            "output_index": self.output_index,
+            "samplerate": self.samplerate if self.ring is not None else self.output_samplerate,
+            "block_size": self.block_size,
+            "capture": ((self.ring.capacity, self.ring.channels, self.ring.samplerate, self.ring.name)
+                        if self.ring is not None else None),
+            "playback": ((self.playback_ring.capacity, self.playback_ring.channels,
+                          self.playback_ring.samplerate, self.playback_ring.name)
+                         if self.playback_ring is not None else None),
+            "health": [h.name for h in {self.input_health, self.output_health} - {None}],
+            "input_health": self.input_health.name if self.input_health else None,
+            "output_health": self.output_health.name if self.output_health else None,
+        }
+        # spawn på alle platforme: worker'en må ikke arve Playwright-tråde via fork
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_worker_main, args=(child_conn, settings),
+                                        name="audio-worker", daemon=True)
+        self._process.start()
+        child_conn.close()
+
+        if not self._conn.poll(READY_TIMEOUT):
+            self.close()
+            raise RuntimeError("Audio worker did not start")
+        kind, payload = self._conn.recv()
+        if kind != "ready":
+            self.close()
+            raise RuntimeError(f"Audio worker failed: {payload}")
+
+        if self.playback_ring is not None:
+            self._feeder = threading.Thread(target=self._feed_loop, name="audio-worker-feeder", daemon=True)
+            self._feeder.start()
+        if self.debug_mode:
+            mode = "duplex" if self.duplex else "paired streams"
+            print(f"DEBUG: Audio worker started (pid {self._process.pid}, {mode}), "
+                  f"playback={self.output_index}, capture={self.input_index}")
+        return self
+
+    def enqueue(self, request):
+        super().enqueue(request)
+        self._wake.set()
+        return request
+
+    def _feed_loop(self):
+        """
+        Fylder playback-ringen fra køen og løser PlaybackRequests når worker'en har
+        spillet dem. Tidsstemplerne regnes ud fra ringens consumed-ur, ikke fra polling.
+        """
+        ring = self.playback_ring
+        poll = 0.005
+        pending = deque()  # (request, første frame, sidste frame) i ringen
+        chunk = np.empty((self.block_size * 4, ring.channels), dtype=np.float32)
+        while not self._closing.is_set():
+            consumed, at = ring.consumed_clock
+            while pending and consumed > pending[0][1]:
+                request, first, last = pending[0]
+                if request.started_at is None:
+                    request.started_at = at - (consumed - first) / ring.samplerate
+                if last is None or consumed < last:
+                    break
+                request.finished_at = at - (consumed - last) / ring.samplerate
+                request.done.set()
+                pending.popleft()
+
+            request = self.current
+            if request is None and self.queue:
+                request = self.current = self.queue.popleft()
+                pending.append([request, ring.written, None])
+            if request is None:
+                # Intet at fylde; vent på play() eller næste blok fra worker'en
+                self._wake.wait(poll if pending else 0.1)
+                self._wake.clear()
+                continue
+
+            space = min(ring.capacity - (ring.written - consumed), len(chunk))
+            count = 0
+            if space > 0 and not request.cancelled:
+                # Kanal-mappingen sker i fill(); ringen har altid output-kanalerne
+                count = request.fill(chunk[:space])
+                if count:
+                    ring.write(chunk[:count])
+            if request.cancelled or request.exhausted:
+                pending[-1][2] = ring.written
+                # En tom/annulleret anmodning har intet worker'en skal spille
+                if pending[-1][1] == pending[-1][2]:
+                    request.started_at = request.finished_at = time.monotonic()
+                    request.done.set()
+                    pending.pop()
+                self.current = None
+            elif count <= 0:
+                time.sleep(poll)
+        # Lukkes motoren, spilles det der står i ringen aldrig færdigt
+        for request, _, _ in pending:
+            request.done.set()
+
+    def close(self):
+        self._sync_health()
+        self._closing.set()
+        self._wake.set()
+        if self._feeder is not None:
+            self._feeder.join()
+            self._feeder = None
+        # Feeder-tråden har løst det der var i ringen; resten spilles aldrig
+        for request in list(self.queue) + ([self.current] if self.current else []):
+            request.cancel()
+            request.done.set()
+        self.queue.clear()
+        self.current = None
+        if self._process is not None:
+            try:
+                with self._conn_lock:
+                    self._conn.send("close")
+            except (OSError, EOFError):
+                pass
+            self._process.join(timeout=5)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._conn.close()
+            self._process = None
+        for ring in (self.ring, self.playback_ring):
+            if ring is not None and ring.buffer is not None:
+                ring.close()
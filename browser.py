@@ -1,23 +1,38 @@
 import os
-import json
+import atexit
+import shutil
 import asyncio
+import tempfile
 import time
 import threading
 import traceback
+from urllib.parse import urlparse
 import numpy as np
 import sounddevice as sd
 import soundfile as sf
-from config import TTS_FILE_PATH, MAX_LISTEN_ATTEMPTS, LISTEN_TIMEOUT_SECONDS, NOTEBOOK_URL, PODCAST_NAME, RECORDING_DIR, DEFAULT_GAIN, AUDIO_DEVICE_INDEX, TTS_OUTPUT_DEVICE, AUDIO_INPUT_DEVICE
-from audio_capture import record_audio_from_output
+from config import TTS_FILE_PATH, MAX_LISTEN_ATTEMPTS, LISTEN_TIMEOUT_SECONDS, NOTEBOOK_URL, PODCAST_NAME, RECORDING_DIR, RECORDING_DURATION, DEFAULT_GAIN, AUDIO_DEVICE_INDEX, TTS_OUTPUT_DEVICE, AUDIO_INPUT_DEVICE, QUESTION_INJECTION, ANSWER_CAPTURE, ANSWER_PREROLL_SECONDS, STREAMED_PLAYBACK, KEEP_SOURCE_WAV
+from audio_capture import record_answer_from_device
 from audio import list_audio_devices
+from audio_engine import get_audio_engine
+from audio_prep import prepare_question, question_samplerate, QuestionPrefetcher
+from page_audio import (PAGE_AUDIO_FORMAT, PAGE_AUDIO_DTYPE, INJECTION_CHROMIUM_ARGS, install_question_injector, inject_question,
+                        attach_answer_capture, record_answer_from_page)
+from browser_session import BrowserSession, load_storage_state, check_cookie_expiry, is_in_interactive_mode
+from setup_flow import run_setup_sequence
+from request_policy import RequestPolicy
+from metrics import InteractionMetrics, monotonic_from_browser
+from stream_health import print_stream_health_summary
+from encoder import get_encoder_pool
+from podcast_state import attach_podcast_state, LISTEN, ANSWER
 
 
 async def wait_for_listen_mode(page, timeout=30, debug_mode=False):
     """Venter på at podcasten går i lyttemode (animation vises)"""
     try:
+        state = await attach_podcast_state(page, debug_mode=debug_mode)
         if debug_mode:
             print("DEBUG: Venter på at podcasten går i lyttemode...")
-        await page.wait_for_selector('.user-speaking-animation[style*="display: block"]', timeout=timeout*1000)
+        await state.wait_for(LISTEN, timeout=timeout)
         if debug_mode:
             print("DEBUG: 🎤 Podcasten er i lyttemode!")
         return True
@@ -31,9 +46,8 @@ async def wait_for_listen_mode(page, timeout=30, debug_mode=False):
 async def wait_for_answer_mode(page, timeout=30, debug_mode=False):
     """Venter på at podcasten går i svarmode (animation skjules)"""
     try:
-        # First check if it's already in answer mode
-        is_already_answering = await page.query_selector('.user-speaking-animation[style*="display: none"]') is not None
-        if is_already_answering:
+        state = await attach_podcast_state(page, debug_mode=debug_mode)
+        if state.mode == ANSWER:
             if debug_mode:
                 print("DEBUG: 🤖 Podcasten er allerede i svarmode!")
             return True
@@ -41,17 +55,11 @@ async def wait_for_answer_mode(page, timeout=30, debug_mode=False):
         if debug_mode:
             print("DEBUG: Venter på at podcasten begynder at svare...")
 
-        # Use a polling approach with shorter intervals
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            is_answering = await page.query_selector('.user-speaking-animation[style*="display: none"]') is not None
-            if is_answering:
-                if debug_mode:
-                    print("DEBUG: 🤖 Podcasten er i svarmode!")
-                return True
-            await asyncio.sleep(0.5)  # Check every 500ms
-
-        raise TimeoutError(f"Timeout after {timeout} seconds")
+        # Observeren i siden skubber skiftet til os - ingen polling
+        await state.wait_for(ANSWER, timeout=timeout)
+        if debug_mode:
+            print("DEBUG: 🤖 Podcasten er i svarmode!")
+        return True
     except Exception as e:
         if debug_mode:
             print(
@@ -59,118 +67,159 @@ async def wait_for_answer_mode(page, timeout=30, debug_mode=False):
         return False
 
 
-async def interactive_flow(page, tts_file, record_duration=60, monitor=True, debug_mode=False):
-    """Håndterer det komplette flow med afspilning og optagelse, synkroniseret med podcast-tilstand"""
+def _transition_at(transition):
+    """
+    time.monotonic()-tidspunkt for et tilstandsskift.
+
+    Bruger sidens eget tidsstempel for skiftet (performance.timeOrigin + now), så
+    forsinkelsen fra MutationObserver til Python ikke tælles med.
+    """
+    if not transition:
+        return time.monotonic()
+    if transition.get("browser_timestamp"):
+        return monotonic_from_browser(transition["browser_timestamp"])
+    return transition["received_at"]
+
+
+async def _encode_recording(wav_file, index_file, metrics, debug_mode):
+    """
+    Lægger optagelsen og dens ytringer i kø i encoder-puljen uden at vente på kodningen.
+
+    Metrics holdes tilbage til filerne er kodet, så record'en peger på filer der findes.
+    """
+    def encoded(target, segments):
+        values = {"recording": target}
+        if target != wav_file and KEEP_SOURCE_WAV:
+            values["wav_file"] = wav_file
+        if segments:
+            values["segments"] = segments
+        metrics.release(**values)
+
+    metrics.hold()
+    queued = False
     try:
-        if debug_mode:
-            print("DEBUG: Starting interactive_flow")
+        await get_encoder_pool(debug_mode).encode_recording(wav_file, index_file, on_done=encoded)
+        queued = True
+    except Exception as e:
+        print(f"⚠️ Could not queue {wav_file} for encoding: {e}")
+    finally:
+        if not queued:
+            metrics.release()
+
+
+async def interactive_flow(page, tts_file, record_duration=60, monitor=True, debug_mode=False,
+                           playback_device=TTS_OUTPUT_DEVICE, capture_device=AUDIO_INPUT_DEVICE,
+                           session_name=None, prepared=None, injection=QUESTION_INJECTION,
+                           capture=ANSWER_CAPTURE):
+    """
+    Håndterer det komplette flow med afspilning og optagelse, synkroniseret med podcast-tilstand.
+
+    playback_device/capture_device vælger sessionens device-par; afspilning og optagelse
+    er awaitables drevet af sessionens AudioEngine-callbacks, så event loop'et (og
+    andre sessioner) aldrig fryser mens der spilles eller optages.
+    prepared er et allerede klargjort (data, samplerate) fra prepare_question/QuestionPrefetcher;
+    ellers klargøres tts_file før der ventes på lyttemode.
+    Med injection="webaudio" afspilles spørgsmålet direkte ind i sidens mikrofon-stream
+    (se page_audio) i stedet for via playback_device, og med capture="page" optages svaret
+    direkte fra sidens lyd i stedet for fra capture_device.
+    Hver interaktion skrives som én JSON-linje med fase-latenser til METRICS_FILE ved
+    siden af RECORDING_DIR (se metrics.InteractionMetrics).
+    """
+    # Fasegrænser for latens-målingen; skrives som én JSON-linje når flowet slutter
+    metrics = InteractionMetrics(session=session_name, question=tts_file)
+    metrics.set(injection=injection, capture=capture, outcome="error")
+    try:
+        return await _interactive_flow(page, tts_file, metrics, record_duration, debug_mode,
+                                       playback_device, capture_device, session_name, prepared,
+                                       injection, capture)
+    finally:
+        metrics.finish(debug_mode=debug_mode)
 
-        # 1. Vent på lyttemode
-        if debug_mode:
-            print("DEBUG: Waiting for listen mode")
-        if not await wait_for_listen_mode(page, debug_mode=debug_mode):
-            if debug_mode:
-                print("DEBUG: Could not continue, podcast did not enter listen mode")
-            return None
 
-        # 2. Afspil TTS-lydfil (spørgsmål) direkte med sounddevice
+async def _interactive_flow(page, tts_file, metrics, record_duration, debug_mode, playback_device,
+                            capture_device, session_name, prepared, injection, capture):
+    try:
         if debug_mode:
-            print("DEBUG: About to play audio file directly")
-            print(f"DEBUG: Audio file path: {tts_file}")
-
-        # Find CABLE Input device
-        devices = sd.query_devices()
-        cable_input_index = None
-
-        for i, device in enumerate(devices):
-            if "CABLE Input" in device['name'] and device.get('max_output_channels', 0) > 0:
-                cable_input_index = i
-                if debug_mode:
-                    print(f"DEBUG: Found CABLE Input at device index {i}")
-                break
-
-        if cable_input_index is None:
-            if debug_mode:
-                print("DEBUG: Could not find CABLE Input device")
-            return None
+            print("DEBUG: Starting interactive_flow")
 
-        # Afspil direkte til CABLE Input med korrekt sample rate
-        device_info = sd.query_devices(cable_input_index)
+        state = await attach_podcast_state(page, debug_mode=debug_mode)
 
-        if debug_mode:
-            print(
-                f"DEBUG: Using device #{cable_input_index}: {device_info['name']}")
-            print(
-                f"DEBUG: Max output channels: {device_info['max_output_channels']}")
-            print(
-                f"DEBUG: Default sample rate: {device_info['default_samplerate']} Hz")
+        # Sessionens lyd-motor holder playback- og capture-streams åbne mellem
+        # interaktionerne; første gang åbnes de her, så pre-roll ringen er fyldt
+        # når svaret starter. Devices der ikke bruges (webaudio/page) åbnes ikke.
+        engine_playback = None if injection == "webaudio" else playback_device
+        engine_capture = None if capture == "page" else capture_device
+        engine = None
+        if engine_playback or engine_capture:
+            try:
+                engine = await asyncio.to_thread(get_audio_engine, engine_playback, engine_capture,
+                                                 debug_mode, playback_samplerate=question_samplerate(tts_file))
+            except Exception as e:
+                print(f"Could not open audio devices: {e}")
+                return None
+            metrics.track_stream_health(engine)
 
-        # Indlæs lydfilen
+        streamed = None
         try:
-            # Brug samme metode som i test_audio_simple.py
-            data, file_samplerate = sf.read(tts_file)
-            if debug_mode:
-                print(f"DEBUG: Audio file loaded: {tts_file}")
-                print(f"DEBUG: Sample rate: {file_samplerate} Hz")
-                print(
-                    f"DEBUG: Channels: {data.shape[1] if len(data.shape) > 1 else 1}")
-                print(
-                    f"DEBUG: Duration: {len(data)/file_samplerate:.2f} seconds")
-
-            # Resample til device'ets sample rate hvis nødvendigt
-            target_samplerate = int(device_info['default_samplerate'])
-            if file_samplerate != target_samplerate:
+            # Klargør spørgsmålet før lyttemode, så det kan afspilles med det samme. Via
+            # motoren streames filen blokvis; første blok læses nu, resten under afspilning
+            if prepared is None and engine_playback is not None and STREAMED_PLAYBACK:
                 if debug_mode:
-                    print(
-                        f"DEBUG: Resampling from {file_samplerate} Hz to {target_samplerate} Hz")
-                try:
-                    import scipy.signal
-                    # Beregn antal samples i den nye sample rate
-                    num_samples = int(
-                        len(data) * target_samplerate / file_samplerate)
-                    # Resample data
-                    if len(data.shape) > 1:  # Hvis stereo eller flere kanaler
-                        resampled_data = np.zeros((num_samples, data.shape[1]))
-                        for channel in range(data.shape[1]):
-                            resampled_data[:, channel] = scipy.signal.resample(
-                                data[:, channel], num_samples)
-                        data = resampled_data
-                    else:  # Hvis mono
-                        data = scipy.signal.resample(data, num_samples)
-                    if debug_mode:
-                        print(f"DEBUG: Resampled to {len(data)} samples")
-                except ImportError:
+                    print(f"DEBUG: Streaming audio file: {tts_file}")
+                streamed = await asyncio.to_thread(engine.prepare_file, tts_file, DEFAULT_GAIN)
+                data, target_samplerate = None, engine.output_samplerate
+            else:
+                if prepared is None:
                     if debug_mode:
-                        print("DEBUG: scipy not installed, skipping resampling")
-                        print(
-                            "WARNING: Sample rate mismatch may cause issues. Install scipy for resampling.")
-
-            # Anvend gain
-            gain = DEFAULT_GAIN
-            data = data * gain
-            data = np.clip(data, -1.0, 1.0)  # Undgå forvrængning
+                        print(f"DEBUG: Preparing audio file: {tts_file}")
+                    device_info = PAGE_AUDIO_FORMAT if engine_playback is None else engine.playback_info
+                    dtype = PAGE_AUDIO_DTYPE if engine_playback is None else 'float32'
+                    prepared = await asyncio.to_thread(
+                        prepare_question, tts_file, device_info, DEFAULT_GAIN, debug_mode, dtype)
+                data, target_samplerate = prepared
 
-            # Konverter til stereo hvis nødvendigt (begrænset til max 2 kanaler)
-            channels = min(2, device_info.get('max_output_channels', 2))
-            if len(data.shape) == 1 and channels > 1:
-                data = np.tile(data.reshape(-1, 1), (1, channels))
-            elif len(data.shape) > 1 and data.shape[1] > channels:
-                data = data[:, :channels]
+            # 1. Vent på lyttemode
+            if debug_mode:
+                print("DEBUG: Waiting for listen mode")
+            if not await wait_for_listen_mode(page, debug_mode=debug_mode):
+                if debug_mode:
+                    print("DEBUG: Could not continue, podcast did not enter listen mode")
+                metrics.set(outcome="no_listen_mode")
+                return None
+            listen_transition = state.last_transition()
+            metrics.mark("listen", _transition_at(listen_transition))
 
+            # 2. Afspil TTS-lydfil (spørgsmål) direkte med sounddevice
             if debug_mode:
-                print(f"DEBUG: Playing audio with gain {gain}...")
-                print(f"DEBUG: Final audio shape: {data.shape}")
-                print(f"DEBUG: Using sample rate: {target_samplerate} Hz")
+                shape = "streamed" if streamed is not None else f"shape {data.shape}"
+                print(f"DEBUG: Playing {tts_file}, {shape}, {target_samplerate} Hz")
 
-            # Afspil lyden direkte med korrekt sample rate
-            sd.play(data, target_samplerate, device=cable_input_index)
-            sd.wait()  # Vent til afspilningen er færdig
+            if engine_playback is None:
+                # Direkte ind i sidens getUserMedia-stream - ingen virtuelt kabel
+                played = await inject_question(page, data, target_samplerate)
+                metrics.mark("playback_start", monotonic_from_browser(played["startedAt"]))
+                metrics.mark("playback_end", monotonic_from_browser(played["endedAt"]))
+            else:
+                # Læg lyden i motorens afspilningskø; output-callback'en løser future'en
+                # når sidste blok er spillet, så event loop'et kører videre imens
+                if streamed is not None:
+                    playback = engine.enqueue(streamed)
+                    streamed = None
+                else:
+                    playback = engine.play(data, target_samplerate)
+                try:
+                    await playback
+                except Exception as e:
+                    # F.eks. en streamet fil der ikke kunne læses færdig - spørgsmålet er ikke stillet
+                    print(f"❌ Playback of {tts_file} failed: {e}")
+                    metrics.set(outcome="playback_failed")
+                    return None
+                metrics.mark("playback_start", playback.started_at)
+                metrics.mark("playback_end", playback.finished_at)
 
             if debug_mode:
                 print("DEBUG: Audio playback completed")
 
-            # No delay after audio playback - removed the 2-second wait
-
             # 3. Vent på at podcasten går i svarmode (dvs. har modtaget input)
             if debug_mode:
                 print("DEBUG: Waiting for answer mode")
@@ -178,19 +227,55 @@ async def interactive_flow(page, tts_file, record_duration=60, monitor=True, deb
                 if debug_mode:
                     print(
                         "DEBUG: Could not continue, podcast did not enter answer mode")
+                metrics.set(outcome="no_answer_mode")
                 return None
+            answer_transition = state.last_transition()
+            metrics.mark("answer", _transition_at(answer_transition))
+            if debug_mode and listen_transition and answer_transition:
+                turn_ms = answer_transition['browser_timestamp'] - listen_transition['browser_timestamp']
+                print(f"DEBUG: Listen -> answer took {turn_ms:.1f} ms (browser clock)")
 
             # 4. Start optagelse af hostens svar
             if debug_mode:
                 print("DEBUG: Starting recording")
-            output_file = record_audio_from_output(
-                output_device_name=AUDIO_INPUT_DEVICE,
-                duration=record_duration,
-                output_dir=RECORDING_DIR,
-                monitor=monitor
-            )
-            if debug_mode:
-                print(f"DEBUG: Recording completed, output_file={output_file}")
+            filename_prefix = f"recording_{session_name}" if session_name else "recording"
+            # record_duration er et loft; optagelsen stopper når svaret er slut
+            record_report = {}
+            since = metrics.marks["answer"] - ANSWER_PREROLL_SECONDS
+            if capture == "page":
+                output_file = await record_answer_from_page(
+                    page,
+                    duration=record_duration,
+                    output_dir=RECORDING_DIR,
+                    filename_prefix=filename_prefix,
+                    debug_mode=debug_mode,
+                    report=record_report
+                )
+            else:
+                output_file = await record_answer_from_device(
+                    engine,
+                    duration=record_duration,
+                    output_dir=RECORDING_DIR,
+                    filename_prefix=filename_prefix,
+                    report=record_report,
+                    since=since
+                )
+            metrics.mark("recording_end")
+            if record_report.get("started_at") is not None and record_report.get("first_sound_seconds") is not None:
+                metrics.mark("first_sound", record_report["started_at"] + record_report["first_sound_seconds"])
+            metrics.set(outcome="recorded" if output_file else "recording_failed", recording=output_file,
+                        end_reason=record_report.get("end_reason"),
+                        recorded_seconds=record_report.get("recorded_seconds"),
+                        speech_seconds=record_report.get("speech_seconds"),
+                        lost_frames=record_report.get("lost_frames"),
+                        segments=record_report.get("segments"))
+            if output_file:
+                await _encode_recording(output_file, record_report.get("segment_index"), metrics, debug_mode)
+            if debug_mode:
+                print(f"DEBUG: Recording completed, output_file={output_file}, "
+                      f"end_reason={record_report.get('end_reason')}, "
+                      f"recorded={record_report.get('recorded_seconds')}s, "
+                      f"speech={record_report.get('speech_seconds')}s")
 
             if debug_mode:
                 print(f"DEBUG: ✅ Optagelse gemt som: {output_file}")
@@ -204,6 +289,10 @@ async def interactive_flow(page, tts_file, record_duration=60, monitor=True, deb
                 import traceback
                 traceback.print_exc()
             return None
+        finally:
+            # En streamet fil der aldrig kom i køen (f.eks. ingen lyttemode) skal stoppe sin læsning
+            if streamed is not None:
+                streamed.cancel()
 
     except Exception as e:
         if debug_mode:
@@ -214,8 +303,76 @@ async def interactive_flow(page, tts_file, record_duration=60, monitor=True, deb
         return None
 
 
-async def launch_browser_with_auth(debug_mode=False):
-    """Launch browser with authentication and navigate to NotebookLM"""
+async def run_batch(page, questions, record_duration=60, debug_mode=False,
+                    playback_device=TTS_OUTPUT_DEVICE, capture_device=AUDIO_INPUT_DEVICE,
+                    injection=QUESTION_INJECTION, capture=ANSWER_CAPTURE):
+    """
+    Stiller en kø af spørgsmål i rækkefølge på samme side.
+
+    Mens et svar optages klargøres næste spørgsmål i baggrunden af QuestionPrefetcher.
+
+    Returns:
+        list: (spørgsmål, optagelse) per spørgsmål; optagelse er None hvis det fejlede
+    """
+    dtype = 'float32'
+    if injection == "webaudio":
+        device_info, dtype = PAGE_AUDIO_FORMAT, PAGE_AUDIO_DTYPE
+    else:
+        # Samme motor som interactive_flow bruger; åbnes her én gang for hele batchen
+        try:
+            engine = await asyncio.to_thread(get_audio_engine, playback_device,
+                                             None if capture == "page" else capture_device, debug_mode,
+                                             playback_samplerate=question_samplerate(questions[0]) if questions else None)
+        except Exception as e:
+            print(f"Could not open audio devices: {e}")
+            return []
+        device_info = engine.playback_info
+
+    prefetcher = QuestionPrefetcher(questions, device_info, gain=DEFAULT_GAIN, debug_mode=debug_mode,
+                                    dtype=dtype)
+    results = []
+    try:
+        for index, tts_file in enumerate(questions):
+            print(f"\n=== Spørgsmål {index + 1}/{len(questions)}: {tts_file} ===")
+            try:
+                prepared = await prefetcher.get(index)
+            except Exception as e:
+                print(f"Could not prepare {tts_file}: {e}")
+                results.append((tts_file, None))
+                continue
+
+            recording_file = await interactive_flow(
+                page, tts_file, record_duration=record_duration, debug_mode=debug_mode,
+                playback_device=playback_device, capture_device=capture_device,
+                prepared=prepared, injection=injection, capture=capture)
+            results.append((tts_file, recording_file))
+    finally:
+        prefetcher.close()
+
+    answered = sum(1 for _, recording_file in results if recording_file)
+    print(f"\n=== Batch færdig: {answered}/{len(questions)} spørgsmål besvaret ===")
+    print_stream_health_summary()
+    return results
+
+
+async def launch_browser_with_auth(debug_mode=False, reuse_session=True, questions=None,
+                                   headless=False, notebook_url=NOTEBOOK_URL,
+                                   injection=QUESTION_INJECTION, capture=ANSWER_CAPTURE,
+                                   block_requests=None, temporary_profile=False):
+    """
+    Launch browser with authentication and navigate to NotebookLM.
+
+    Med reuse_session=True bruges en langlivet, ejet Chromium-proces via CDP; er siden
+    allerede i Interactive mode springes opsætningen over og interactive_flow starter direkte.
+    Med questions køres spørgsmålene som batch (se run_batch) i stedet for Enter-løkken.
+    Med headless=True kører alt uden vindue og uden at vente på brugerinput, f.eks. mod
+    den lokale mock (notebook_url fra mock_server.start_mock_server).
+    block_requests styrer REQUEST_POLICY (None = config); med False måles kun hvad
+    der ville være blokeret.
+    Med temporary_profile=True (kun uden reuse_session) bruges en midlertidig, tom
+    profil uden auth.json - til offline-kørsler mod mocken, der hverken må røre den
+    ejede sessions profil eller få de rigtige login-cookies.
+    """
     from playwright.async_api import async_playwright
 
     if debug_mode:
@@ -226,7 +383,7 @@ async def launch_browser_with_auth(debug_mode=False):
         print("DEBUG: Checking audio devices...")
     else:
         print("Checking audio devices...")
-    devices = list_audio_devices()
+    devices = list_audio_devices() if injection != "webaudio" or capture != "page" else []
 
     # Check if CABLE Input and Output are available
     cable_input_found = False
@@ -246,7 +403,10 @@ async def launch_browser_with_auth(debug_mode=False):
             else:
                 print(f"Found {AUDIO_INPUT_DEVICE} at device index {i}")
 
-    if not cable_input_found or not cable_output_found:
+    # Med Web Audio-injektion og side-optagelse bruges ingen lyd-devices
+    needs_playback = injection != "webaudio"
+    needs_capture = capture != "page"
+    if (needs_playback and not cable_input_found) or (needs_capture and not cable_output_found):
         if debug_mode:
             print(
                 "DEBUG: WARNING: Required audio devices not found. Audio routing may not work correctly.")
@@ -256,164 +416,120 @@ async def launch_browser_with_auth(debug_mode=False):
                 "WARNING: Required audio devices not found. Audio routing may not work correctly.")
             print("Please ensure VB-Cable is properly installed and configured.")
 
-    async with async_playwright() as p:
-        if debug_mode:
-            print("DEBUG: Launching browser with Playwright")
-
-        # Launch Chromium with specific arguments for microphone access
-        browser = await p.chromium.launch(
-            headless=False,
-            args=[
-                "--use-fake-ui-for-media-stream",  # Automatically accept microphone permissions
-                "--autoplay-policy=no-user-gesture-required",
-            ]
-        )
+    # Med Web Audio-injektion har siden ikke brug for rigtige lyd-devices
+    extra_args = list(INJECTION_CHROMIUM_ARGS) if injection == "webaudio" else []
 
-        if debug_mode:
-            print("DEBUG: Browser launched")
-
-        # Create a new context with explicit microphone permissions
-        context = await browser.new_context(
-            permissions=["microphone"],
-        )
-
-        if debug_mode:
-            print("DEBUG: Browser context created with microphone permissions")
-
-        # Load cookies from auth.json if it exists
-        if os.path.exists("auth.json"):
-            try:
-                if debug_mode:
-                    print("DEBUG: Loading auth.json")
-                with open("auth.json", "r") as f:
-                    auth_data = json.load(f)
-
-                cookies = auth_data.get("cookies", [])
-                if cookies:
-                    await context.add_cookies(cookies)
-                    if debug_mode:
-                        print("DEBUG: Loaded authentication cookies from auth.json")
-                    else:
-                        print("Loaded authentication cookies from auth.json")
-                else:
-                    if debug_mode:
-                        print("DEBUG: Warning: auth.json contains no cookies")
-                    else:
-                        print("Warning: auth.json contains no cookies")
-            except Exception as e:
-                if debug_mode:
-                    print(f"DEBUG: Error loading auth.json: {e}")
-                else:
-                    print(f"Error loading auth.json: {e}")
+    async with async_playwright() as p:
+        already_interactive = False
+
+        if reuse_session:
+            # Genbrug (eller start) den ejede Chromium-proces via CDP
+            session = BrowserSession(debug_mode=debug_mode)
+            session_args = extra_args + (["--headless=new"] if headless else [])
+            browser, context, page, reused = await session.connect(
+                p, extra_args=session_args, notebook_url=notebook_url)
+            if reused:
+                already_interactive = await is_in_interactive_mode(page)
         else:
             if debug_mode:
-                print("DEBUG: Warning: auth.json not found - login will be required")
-            else:
-                print("Warning: auth.json not found - login will be required")
-
-        # Create a new page
-        page = await context.new_page()
-
-        if debug_mode:
-            print("DEBUG: Browser page created")
-
-        try:
-            # Set microphone permissions directly for the page
-            if debug_mode:
-                print("DEBUG: Setting microphone permissions for notebooklm.google.com")
-            await context.grant_permissions(["microphone"], origin="https://notebooklm.google.com")
+                print("DEBUG: Launching browser with Playwright")
 
-            # I browser.py, når vi instruerer brugeren:
-            print("\n*** VIGTIGT: Mikrofonindstillinger i Chromium ***")
-            print(
-                "1. Åbn Chromium's indstillinger manuelt (tre prikker øverst til højre)")
-            print("2. Gå til Indstillinger > Webstedstilladelser > Mikrofon")
-            print("3. Vælg 'CABLE Output (VB-Audio Virtual Cable)' fra dropdown-menuen")
-            print("   Dette gør at NotebookML modtager lyd FRA dit program via VB-Cable")
-            print("4. Scriptet fortsætter om 15 sekunder...")
-            await asyncio.sleep(3)
-
-            # Navigate to NotebookLM and set up Dr. Farsight Podcast
-            if debug_mode:
-                print("DEBUG: Navigating to NotebookLM...")
+            session = BrowserSession(debug_mode=debug_mode)
+            if temporary_profile:
+                # Tom profil der slettes når programmet slutter
+                profile_dir = tempfile.mkdtemp(prefix="notebooklm-profile-")
+                atexit.register(shutil.rmtree, profile_dir, True)
             else:
-                print("Navigating to NotebookLM...")
-            await page.goto('https://notebooklm.google.com/')
-
-            if debug_mode:
-                print("DEBUG: Navigation to NotebookLM completed")
-
-            # Wait a bit to ensure the page is loaded
-            await asyncio.sleep(2)
+                # Samme persistente profil som den ejede session: HTTP-cache og
+                # localStorage er varme, og auth.json anvendes kun når den er ny
+                profile_dir = session.profile_dir
+                if session.is_running():
+                    raise RuntimeError("The managed browser session is using the profile - "
+                                       "run with --fresh first or drop --no-reuse")
+                check_cookie_expiry(load_storage_state(session.auth_file), debug_mode=debug_mode)
+
+            # Launch Chromium with specific arguments for microphone access
+            context = await p.chromium.launch_persistent_context(
+                profile_dir,
+                headless=headless,
+                permissions=["microphone"],
+                args=[
+                    "--use-fake-ui-for-media-stream",  # Automatically accept microphone permissions
+                    "--autoplay-policy=no-user-gesture-required",
+                    *extra_args,
+                ]
+            )
 
             if debug_mode:
-                print("DEBUG: Clicking on Dr. Farsight Podcast...")
-            else:
-                print("Clicking on Dr. Farsight Podcast...")
-            await page.click('text=Dr. Farsight Podcast')
+                print(f"DEBUG: Browser launched with profile {profile_dir}")
 
-            if debug_mode:
-                print("DEBUG: Clicked on Dr. Farsight Podcast")
+            # Anvend auth.json (cookies og localStorage) hvis profilen ikke allerede har den
+            if not temporary_profile:
+                await session.apply_auth(context)
 
-            # Wait for the podcast page to load
-            await asyncio.sleep(3)
+            # Create a new page
+            page = context.pages[0] if context.pages else await context.new_page()
 
             if debug_mode:
-                print("DEBUG: Waiting for Interactive mode option...")
-            else:
-                print("Waiting for Interactive mode option...")
-            await page.wait_for_selector('text=Interactive mode', timeout=30000)
+                print("DEBUG: Browser page created")
 
-            if debug_mode:
-                print("DEBUG: Interactive mode option found")
+        # Bloker billeder, fonte og telemetri før første navigation
+        request_policy = RequestPolicy.from_config(enabled=block_requests, debug_mode=debug_mode)
+        await request_policy.attach(context)
 
-            if debug_mode:
-                print("DEBUG: Clicking on Interactive mode...")
-            else:
-                print("Clicking on Interactive mode...")
-            await page.click('text=Interactive mode')
+        # Installer observeren før navigation, så init-scriptet fanger første dokument
+        await attach_podcast_state(page, debug_mode=debug_mode)
+        if injection == "webaudio":
+            await install_question_injector(page)
+        if capture == "page":
+            await attach_answer_capture(page, debug_mode=debug_mode)
 
+        try:
+            # Set microphone permissions directly for the page
+            parsed_url = urlparse(notebook_url)
+            origin = f"{parsed_url.scheme}://{parsed_url.netloc}"
             if debug_mode:
-                print("DEBUG: Clicked on Interactive mode")
-
-            # Wait a bit after clicking on Interactive mode
-            await asyncio.sleep(2)
+                print(f"DEBUG: Setting microphone permissions for {origin}")
+            await context.grant_permissions(["microphone"], origin=origin)
 
-            if debug_mode:
-                print("DEBUG: Clicking Play audio button...")
+            if already_interactive:
+                # Siden fra en tidligere kørsel er allerede i Interactive mode
+                if debug_mode:
+                    print("DEBUG: Page is already in Interactive Mode - skipping setup")
+                else:
+                    print("Page is already in Interactive Mode - skipping setup")
             else:
-                print("Clicking Play audio button...")
-            await page.click('button[aria-label="Play audio"]')
-
-            if debug_mode:
-                print("DEBUG: Clicked Play audio button")
+                if injection == "webaudio":
+                    print("Question audio is injected into the page - no microphone setup needed")
+                else:
+                    # I browser.py, når vi instruerer brugeren:
+                    print("\n*** VIGTIGT: Mikrofonindstillinger i Chromium ***")
+                    print(
+                        "1. Åbn Chromium's indstillinger manuelt (tre prikker øverst til højre)")
+                    print("2. Gå til Indstillinger > Webstedstilladelser > Mikrofon")
+                    print("3. Vælg 'CABLE Output (VB-Audio Virtual Cable)' fra dropdown-menuen")
+                    print("   Dette gør at NotebookML modtager lyd FRA dit program via VB-Cable")
 
-            # Wait for the Join button to be enabled
-            if debug_mode:
-                print("DEBUG: Waiting for Join button to be enabled...")
-            else:
-                print("Waiting for Join button to be enabled...")
-            await page.wait_for_selector('button:has-text("Join"):not([disabled])', timeout=30000)
+                # Opsætningen venter på konkrete readiness-betingelser i stedet for faste pauser
+                await run_setup_sequence(page, debug_mode=debug_mode, url=notebook_url)
 
-            if debug_mode:
-                print("DEBUG: Join button is enabled")
+                if debug_mode:
+                    print("DEBUG: Successfully set up NotebookLM in Interactive Mode")
+                else:
+                    print("Successfully set up NotebookLM in Interactive Mode")
 
-            if debug_mode:
-                print("DEBUG: Clicking Join button...")
-            else:
-                print("Clicking Join button...")
-            await page.click('button:has-text("Join")')
+            request_policy.print_summary()
 
-            if debug_mode:
-                print("DEBUG: Clicked Join button")
-                print("DEBUG: Successfully set up NotebookLM in Interactive Mode")
-            else:
-                print("Successfully set up NotebookLM in Interactive Mode")
+            if questions:
+                await run_batch(page, questions, record_duration=RECORDING_DURATION, debug_mode=debug_mode,
+                                injection=injection, capture=capture)
+                return
 
             # Kør det synkroniserede flow for afspilning og optagelse
             if debug_mode:
                 print("DEBUG: Starting interactive flow")
-            recording_file = await interactive_flow(page, TTS_FILE_PATH, record_duration=60, debug_mode=debug_mode)
+            recording_file = await interactive_flow(page, TTS_FILE_PATH, record_duration=60, debug_mode=debug_mode,
+                                                    injection=injection, capture=capture)
 
             if recording_file:
                 if debug_mode:
@@ -428,6 +544,12 @@ async def launch_browser_with_auth(debug_mode=False):
                 else:
                     print("Interaktionen kunne ikke gennemføres korrekt.")
 
+            print_stream_health_summary()
+
+            # Uden vindue er der ingen bruger der kan trykke Enter
+            if headless:
+                return recording_file
+
             # Keep the browser open
             if debug_mode:
                 print(
@@ -449,7 +571,8 @@ async def launch_browser_with_auth(debug_mode=False):
                     print("DEBUG: Starting a new interaction")
 
                 # Kør en ny interaktion
-                recording_file = await interactive_flow(page, TTS_FILE_PATH, record_duration=60, debug_mode=debug_mode)
+                recording_file = await interactive_flow(page, TTS_FILE_PATH, record_duration=60, debug_mode=debug_mode,
+                                                        injection=injection, capture=capture)
 
                 if recording_file:
                     if debug_mode:
@@ -489,6 +612,9 @@ async def launch_browser_with_auth(debug_mode=False):
                 else:
                     print(f"Error taking screenshot: {screenshot_error}")
 
+            if headless:
+                raise
+
             # Wait for the user to terminate the program
             if debug_mode:
                 print(
@@ -0,0 +1,365 @@
+import os
+import json
+import time
+import signal
+import asyncio
+import platform
+import subprocess
+import urllib.request
+from config import NOTEBOOK_URL, BROWSER_SESSION_FILE, BROWSER_PROFILE_DIR, CDP_PORT
+
+CHROMIUM_ARGS = [
+    "--use-fake-ui-for-media-stream",  # Automatically accept microphone permissions
+    "--autoplay-policy=no-user-gesture-required",
+    "--no-first-run",
+    "--no-default-browser-check",
+]
+
+
+# Googles login-cookies; udløber én af dem skal login_playwright.py køres igen
+AUTH_COOKIE_NAMES = ("SID", "HSID", "SSID", "APISID", "SAPISID",
+                     "__Secure-1PSID", "__Secure-3PSID")
+
+# Markør i profilmappen: mtime på den auth.json der sidst blev anvendt på profilen
+AUTH_MARKER_FILE = ".auth_applied"
+
+
+def load_storage_state(auth_file="auth.json"):
+    """Indlæser Playwrights storage_state (cookies og localStorage), eller None"""
+    if not os.path.exists(auth_file):
+        return None
+    try:
+        with open(auth_file, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading {auth_file}: {e}")
+        return None
+
+
+def check_cookie_expiry(storage_state, margin_seconds=3600, debug_mode=False):
+    """
+    Tjekker login-cookies i en storage_state før browseren startes.
+
+    Returns:
+        bool: False hvis en login-cookie er udløbet eller udløber inden for margin_seconds
+    """
+    if not storage_state:
+        return False
+
+    cookies = storage_state.get("cookies", [])
+    auth_cookies = [c for c in cookies if c.get("name") in AUTH_COOKIE_NAMES] or cookies
+    now = time.time()
+    # Session-cookies har expires = -1 og udløber ikke på tid
+    expiring = [c for c in auth_cookies if c.get("expires", -1) > 0
+                and c["expires"] < now + margin_seconds]
+
+    if expiring:
+        first = min(expiring, key=lambda c: c["expires"])
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(first["expires"]))
+        print(f"⚠️ Login cookie '{first['name']}' expires {when} - "
+              f"run login_playwright.py to refresh auth.json")
+        return False
+
+    if debug_mode and auth_cookies:
+        expiries = [c["expires"] for c in auth_cookies if c.get("expires", -1) > 0]
+        if expiries:
+            days = (min(expiries) - now) / 86400
+            print(f"DEBUG: Login cookies valid for another {days:.1f} days")
+    return True
+
+
+async def apply_storage_state(context, storage_state, debug_mode=False):
+    """
+    Anvender en fuld storage_state (cookies og localStorage) på en eksisterende context.
+
+    Persistente contexts tager ikke imod storage_state ved oprettelse, så localStorage
+    skrives per origin fra en midlertidig side, hvor originens dokument besvares lokalt
+    med en tom side - der hentes intet fra nettet.
+    """
+    cookies = storage_state.get("cookies", [])
+    if cookies:
+        await context.add_cookies(cookies)
+
+    origins = [o for o in storage_state.get("origins", []) if o.get("localStorage")]
+    if origins:
+        page = await context.new_page()
+        try:
+            for origin in origins:
+                url = origin["origin"].rstrip("/") + "/"
+                await page.route(url, lambda route: route.fulfill(
+                    status=200, content_type="text/html", body="<html></html>"))
+                await page.goto(url)
+                await page.evaluate(
+                    "(items) => items.forEach(({name, value}) => localStorage.setItem(name, value))",
+                    origin["localStorage"])
+                await page.unroute(url)
+        finally:
+            await page.close()
+
+    if debug_mode:
+        print(f"DEBUG: Applied storage state: {len(cookies)} cookies, "
+              f"{len(origins)} localStorage origins")
+
+
+async def is_in_interactive_mode(page):
+    """Returnerer True hvis siden allerede har joinet Interactive mode"""
+    try:
+        return await page.query_selector(".user-speaking-animation") is not None
+    except Exception:
+        return False
+
+
+def _pid_alive(pid):
+    """Tjekker om en proces med det givne pid stadig kører"""
+    if pid is None:
+        return False
+    if platform.system() == "Windows":
+        result = subprocess.run(["tasklist", "/FI", f"PID eq {pid}", "/NH"],
+                                capture_output=True, text=True)
+        return str(pid) in result.stdout
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_cmdline(pid):
+    """Kommandolinjen for en kørende proces som én streng, eller None hvis den ikke kan læses"""
+    try:
+        if platform.system() == "Windows":
+            result = subprocess.run(["powershell", "-NoProfile", "-Command",
+                                     f"(Get-CimInstance Win32_Process -Filter 'ProcessId={pid}').CommandLine"],
+                                    capture_output=True, text=True)
+            return result.stdout.strip() or None
+        if os.path.exists(f"/proc/{pid}/cmdline"):
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                return f.read().replace(b"\0", b" ").decode(errors="replace").strip() or None
+        result = subprocess.run(["ps", "-o", "command=", "-p", str(pid)], capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+class BrowserSession:
+    """
+    Ejer en langlivet Chromium-proces som senere kørsler genbruger via CDP.
+
+    Processen startes løsrevet fra scriptet med --remote-debugging-port og en egen
+    profilmappe. pid og port gemmes i en state-fil, så næste kørsel kan forbinde med
+    connect_over_cdp i stedet for at starte og logge ind forfra. Kun den proces
+    sessionen selv har startet bliver nogensinde stoppet.
+
+    Profilmappen bevares mellem processer, så HTTP-cache, service workers og
+    localStorage er varme ved næste start. auth.json anvendes kun når den er nyere
+    end det profilen sidst fik.
+    """
+
+    def __init__(self, state_file=BROWSER_SESSION_FILE, profile_dir=BROWSER_PROFILE_DIR,
+                 port=CDP_PORT, auth_file="auth.json", debug_mode=False):
+        self.state_file = state_file
+        self.auth_file = auth_file
+        self.profile_dir = os.path.abspath(profile_dir)
+        self.port = port
+        self.debug_mode = debug_mode
+
+    @property
+    def cdp_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return None
+        try:
+            with open(self.state_file, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            if self.debug_mode:
+                print(f"DEBUG: Could not read {self.state_file}: {e}")
+            return None
+
+    def _save_state(self, pid, extra_args):
+        with open(self.state_file, "w") as f:
+            json.dump({"pid": pid, "port": self.port, "profile_dir": self.profile_dir,
+                       "args": list(extra_args), "started": time.time()}, f, indent=2)
+
+    def _cdp_reachable(self):
+        try:
+            with urllib.request.urlopen(f"{self.cdp_url}/json/version", timeout=1) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    def _owns_process(self, state):
+        """
+        True hvis state-filens pid stadig er den Chromium sessionen startede.
+
+        Efter en genstart af maskinen kan pid'et være genbrugt af en helt anden proces,
+        så det er ikke nok at pid'et findes: kommandolinjen skal indeholde profilmappen
+        (--user-data-dir). Kan den ikke læses, skal CDP svare på den gemte port.
+        """
+        pid = state.get("pid")
+        if not _pid_alive(pid):
+            return False
+        cmdline = _process_cmdline(pid)
+        if cmdline is not None:
+            return f"--user-data-dir={state.get('profile_dir', self.profile_dir)}" in cmdline
+        return self._cdp_reachable()
+
+    def is_running(self):
+        """True hvis den ejede Chromium-proces kører og svarer på CDP-porten"""
+        state = self._load_state()
+        if not state:
+            return False
+        self.port = state.get("port", self.port)
+        return self._owns_process(state) and self._cdp_reachable()
+
+    def _spawn(self, executable_path, extra_args=None):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        args = [
+            executable_path,
+            f"--remote-debugging-port={self.port}",
+            f"--user-data-dir={self.profile_dir}",
+            *CHROMIUM_ARGS,
+            *(extra_args or []),
+            "about:blank",
+        ]
+        if self.debug_mode:
+            print(f"DEBUG: Starting managed Chromium: {' '.join(args)}")
+
+        popen_kwargs = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+        if platform.system() == "Windows":
+            popen_kwargs["creationflags"] = (subprocess.DETACHED_PROCESS
+                                             | subprocess.CREATE_NEW_PROCESS_GROUP)
+        else:
+            popen_kwargs["start_new_session"] = True
+        process = subprocess.Popen(args, **popen_kwargs)
+        self._save_state(process.pid, extra_args or [])
+        return process.pid
+
+    async def apply_auth(self, context):
+        """Anvender auth.json (fuld storage_state) på profilen hvis den er ny siden sidst"""
+        if not os.path.exists(self.auth_file):
+            print(f"Warning: {self.auth_file} not found - login will be required")
+            return False
+
+        marker = os.path.join(self.profile_dir, AUTH_MARKER_FILE)
+        auth_mtime = os.path.getmtime(self.auth_file)
+        try:
+            with open(marker, "r") as f:
+                applied_mtime = float(f.read().strip())
+        except (OSError, ValueError):
+            applied_mtime = None
+
+        if applied_mtime == auth_mtime:
+            if self.debug_mode:
+                print(f"DEBUG: Profile already has {self.auth_file} applied")
+            return True
+
+        storage_state = load_storage_state(self.auth_file)
+        if not storage_state:
+            return False
+        await apply_storage_state(context, storage_state, debug_mode=self.debug_mode)
+        with open(marker, "w") as f:
+            f.write(str(auth_mtime))
+        print(f"Applied {self.auth_file} to browser profile")
+        return True
+
+    async def _wait_for_cdp(self, timeout=30):
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if await loop.run_in_executor(None, self._cdp_reachable):
+                return True
+            await asyncio.sleep(0.1)
+        return False
+
+    async def connect(self, playwright, extra_args=None, notebook_url=NOTEBOOK_URL):
+        """
+        Forbinder til den ejede Chromium, og starter den først hvis den ikke kører.
+
+        Kører den med andre extra_args end ønsket (f.eks. med vindue når der bedes om
+        --headless=new, eller uden de falske medie-flag), genstartes den med de nye.
+
+        Returns:
+            tuple: (browser, context, page, reused) hvor reused er True hvis en
+            allerede kørende proces blev genbrugt
+        """
+        loop = asyncio.get_running_loop()
+        reused = await loop.run_in_executor(None, self.is_running)
+        extra_args = list(extra_args or [])
+        if reused:
+            running_args = (self._load_state() or {}).get("args", [])
+            if sorted(running_args) != sorted(extra_args):
+                print(f"Running browser session was started with {running_args or 'no extra args'}, "
+                      f"this run needs {extra_args or 'none'} - restarting it")
+                await loop.run_in_executor(None, self.stop)
+                # Den gamle proces skal have sluppet CDP-porten før den nye startes
+                deadline = time.monotonic() + 10
+                while time.monotonic() < deadline and await loop.run_in_executor(None, self._cdp_reachable):
+                    await asyncio.sleep(0.1)
+                reused = False
+
+        if reused:
+            if self.debug_mode:
+                print(f"DEBUG: Reusing managed Chromium on {self.cdp_url}")
+            else:
+                print("Reusing running browser session")
+        else:
+            print("Starting managed browser session...")
+            check_cookie_expiry(load_storage_state(self.auth_file), debug_mode=self.debug_mode)
+            self._spawn(playwright.chromium.executable_path, extra_args)
+            if not await self._wait_for_cdp():
+                raise TimeoutError(f"Managed Chromium did not open CDP on {self.cdp_url}")
+
+        browser = await playwright.chromium.connect_over_cdp(self.cdp_url)
+        context = browser.contexts[0] if browser.contexts else await browser.new_context()
+
+        if not reused:
+            await self.apply_auth(context)
+
+        # Genbrug NotebookLM-fanen fra en tidligere kørsel hvis den findes
+        page = None
+        for candidate in context.pages:
+            if candidate.url.startswith(notebook_url.split("?")[0]):
+                page = candidate
+                break
+        if page is None:
+            page = context.pages[0] if context.pages else await context.new_page()
+
+        if self.debug_mode:
+            print(f"DEBUG: Connected over CDP, page url: {page.url}")
+        return browser, context, page, reused
+
+    def stop(self):
+        """Stopper kun den Chromium-proces denne session selv har startet"""
+        state = self._load_state()
+        if not state:
+            return False
+
+        pid = state.get("pid")
+        self.port = state.get("port", self.port)
+        stopped = False
+        if not self._owns_process(state):
+            # Processen er væk, eller pid'et tilhører nu en anden proces: kun state-filen ryddes
+            if self.debug_mode:
+                print(f"DEBUG: pid {pid} is not the managed Chromium - removing stale {self.state_file}")
+        else:
+            try:
+                if platform.system() == "Windows":
+                    subprocess.run(["taskkill", "/f", "/t", "/pid", str(pid)],
+                                   capture_output=True)
+                else:
+                    os.killpg(os.getpgid(pid), signal.SIGTERM)
+                stopped = True
+                print(f"✅ Managed Chromium (pid {pid}) stopped")
+            except Exception as e:
+                print(f"⚠️ Could not stop managed Chromium (pid {pid}): {e}")
+
+        try:
+            os.remove(self.state_file)
+        except OSError:
+            pass
+        return stopped
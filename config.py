@@ -1,13 +1,40 @@
 # config.py
 
 # Audio device configuration
-TTS_OUTPUT_DEVICE = "CABLE Input"  # VB-Cable input device (sender lyd TIL NotebookML)
-AUDIO_INPUT_DEVICE = "CABLE Output"  # VB-Cable output device (modtager lyd FRA NotebookML)
+# Et par per samtidig session. "playback" er hvor spørgsmålet afspilles (sender lyd TIL
+# NotebookML), "capture" er hvor svaret optages fra (modtager lyd FRA NotebookML).
+# "browser_microphone"/"browser_speaker" (valgfrie) er de device-labels sessionens side
+# skal bruge som mikrofon og højttaler, så parallelle sessioner ikke deler lydvej.
+AUDIO_DEVICE_PAIRS = [
+    {"playback": "CABLE Input", "capture": "CABLE Output"},
+    # {"playback": "CABLE-A Input", "browser_microphone": "CABLE-A Output",
+    #  "browser_speaker": "CABLE-B Input", "capture": "CABLE-B Output"},
+]
+TTS_OUTPUT_DEVICE = AUDIO_DEVICE_PAIRS[0]["playback"]  # Første par - bruges af enkelt-session flowet
+AUDIO_INPUT_DEVICE = AUDIO_DEVICE_PAIRS[0]["capture"]
 AUDIO_DEVICE_INDEX = None  # Lad scriptet finde den korrekte device
 
+# Hvordan spørgsmålet når NotebookLM:
+#   "vbcable"  - afspilles på playback-device'en og samles op af Chromium's mikrofon (VB-Cable)
+#   "webaudio" - injiceres direkte i sidens getUserMedia-stream; kræver ingen lyd-drivere
+QUESTION_INJECTION = "vbcable"
+
+# Hvorfra hostens svar optages:
+#   "device" - fra capture-device'en (CABLE Output loopback)
+#   "page"   - direkte fra sidens lyd-elementer/Web Audio graf; kræver intet lydkort
+ANSWER_CAPTURE = "device"
+
 # Gain settings
 DEFAULT_GAIN = 3.0  # Default gain for audio playback
 
+# Cache af klargjorte spørgsmål (resamplet, gain, kanaler) som .npy; None = slået fra
+QUESTION_CACHE_DIR = ".question_cache"
+QUESTION_CACHE_MAX_MB = 512
+
+# Spil spørgsmål blokvis fra filen i stedet for at indlæse hele filen først
+# (gælder kun når spørgsmålet ikke allerede er klargjort af batch-prefetch)
+STREAMED_PLAYBACK = True
+
 # TTS file path
 TTS_FILE_PATH = "graham.wav"  # Standard TTS fil
 TTS_FILE = "graham.wav"  # Alias for backward compatibility
@@ -16,9 +43,93 @@ TTS_FILE = "graham.wav"  # Alias for backward compatibility
 NOTEBOOK_URL = "https://notebooklm.google.com/"
 PODCAST_NAME = "Dr. Farsight Podcast"
 
+# Lokal mock af NotebookLM (python main.py --mock); timing i millisekunder,
+# se mock_notebooklm/index.html for alle parametre
+MOCK_NOTEBOOK_OPTIONS = {
+    "trigger": "mic",
+    "listen_after": 1500,
+    "answer_duration": 8000,
+}
+
+# Managed browser session (genbruges mellem kørsler via CDP)
+BROWSER_SESSION_FILE = ".browser_session.json"  # pid og port for den ejede Chromium
+BROWSER_PROFILE_DIR = "browser-profile"  # profilmappe for den ejede Chromium
+CDP_PORT = 9222
+
+# Blokering af ressourcer automationen ikke bruger. Browseren blokerer selv på URL
+# (CDP Network.setBlockedURLs), så HTTP-cachen bevares; resource types oversættes til
+# URL-mønstre i request_policy.RESOURCE_TYPE_PATTERNS. Mønstre bruger kun * som wildcard.
+# Stylesheets og media blokeres ikke: selectors venter på synlighed, og værtens svar
+# kan afspilles via media-elementer.
+REQUEST_POLICY = {
+    "enabled": True,
+    "block_resource_types": ["image", "font"],
+    "block_url_patterns": [
+        "*google-analytics.com/*",
+        "*googletagmanager.com/*",
+        "*doubleclick.net/*",
+        "*play.google.com/log*",
+        "*/gen_204*",
+        "*/jserror*",
+    ],
+}
+REQUEST_SIZE_CACHE = ".request_sizes.json"  # lærte størrelser til estimat af sparede bytes
+
+# Timeouts (sekunder) for hvert trin i opsætningen af Interactive mode
+SETUP_STEP_TIMEOUTS = {
+    "navigate": 30,
+    "open_notebook": 30,
+    "interactive_mode": 30,
+    "play_audio": 30,
+    "join": 30,
+}
+
 # Recording settings
 RECORDING_DIR = "recordings"
-RECORDING_DURATION = 60  # antal sekunder der optages fra NotebookLM
+RECORDING_DURATION = 60  # maksimal varighed (sekunder) af en optagelse fra NotebookLM
+
+# Optagelse fra capture-device'en kører altid i baggrunden med en pre-roll ring, så
+# svaret kan optages fra lidt før svarmode blev opdaget
+CAPTURE_PREROLL_SECONDS = 5.0  # historik i ringen
+ANSWER_PREROLL_SECONDS = 0.5   # hvor langt før skiftet til svarmode optagelsen starter
+
+# Kør lyd-motorens PortAudio-streams i en separat proces (audio_worker.py), så
+# Playwright og event loop'et ikke kan give xruns via GIL'en
+AUDIO_WORKER = False
+
+# WAV-optagelsernes sample-format. PCM_16 er det sf.write altid har skrevet WAV som;
+# "FLOAT" giver 32-bit float WAV (dobbelt så store filer, ingen klipning over 0 dBFS)
+RECORDING_SUBTYPE = "PCM_16"
+
+# Format optagelser gemmes i: "wav" (16-bit PCM), "flac" eller "opus" (Ogg/Opus).
+# Der optages altid til WAV; kodningen sker bagefter i en procespulje
+RECORDING_FORMAT = "flac"
+ENCODER_WORKERS = 2
+ENCODER_QUEUE_SIZE = 8      # filer i kø eller under kodning før optagelser må vente
+KEEP_SOURCE_WAV = False     # behold WAV-filen efter kodning
+
+# Slut-på-svar detektion (energi-VAD); optagelsen stopper når hosten har talt og
+# derefter været stille i hangover_seconds, dog senest efter RECORDING_DURATION
+VAD_SETTINGS = {
+    "enabled": True,
+    "threshold_db": -45.0,      # energi i dBFS over hvilken en frame er tale
+    "hangover_seconds": 2.5,    # stilhed efter tale før svaret regnes for slut
+    "min_speech_seconds": 0.5,  # tale der skal være hørt før stilhed kan stoppe optagelsen
+    "frame_ms": 20,
+}
+
+# Opdeling af optagelser i ytringer (én fil per ytring + <optagelse>.segments.json)
+SEGMENT_SETTINGS = {
+    "enabled": True,
+    "threshold_db": -45.0,        # energi i dBFS over hvilken en frame er tale
+    "min_silence_seconds": 0.6,   # pause der afslutter en ytring
+    "min_segment_seconds": 0.3,   # ytringer med mindre tale kasseres
+    "padding_seconds": 0.15,      # stilhed med før og efter hver ytring
+    "frame_ms": 20,
+}
+
+# Latens-målinger: én JSON-linje per interaktion, i mappen ved siden af RECORDING_DIR
+METRICS_FILE = "interaction_metrics.jsonl"
 
 # Listen settings
 MAX_LISTEN_ATTEMPTS = 3
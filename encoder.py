@@ -0,0 +1,199 @@
+import os
+import json
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import soundfile as sf
+from config import RECORDING_FORMAT, ENCODER_WORKERS, ENCODER_QUEUE_SIZE, KEEP_SOURCE_WAV
+
+# Format -> (filendelse, soundfile-format, subtype). "wav" omkoder kun optagelser der
+# ikke allerede er i dens subtype (se config.RECORDING_SUBTYPE)
+FORMATS = {
+    "wav": (".wav", "WAV", "PCM_16"),
+    "flac": (".flac", "FLAC", "PCM_16"),
+    "opus": (".ogg", "OGG", "OPUS"),
+}
+
+# Sample rates libsndfile's Opus-encoder accepterer
+OPUS_SAMPLERATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def target_format(source, fmt=RECORDING_FORMAT):
+    """Opus understøtter kun visse sample rates - andre optagelser kodes som FLAC"""
+    if fmt == "opus" and sf.info(source).samplerate not in OPUS_SAMPLERATES:
+        return "flac"
+    return fmt
+
+
+def encoded_path(source, fmt=RECORDING_FORMAT):
+    """Stien den komprimerede fil får (samme navn, formatets filendelse)"""
+    return os.path.splitext(source)[0] + FORMATS[target_format(source, fmt)][0]
+
+
+def needs_encoding(source, fmt=RECORDING_FORMAT):
+    """False når fmt er "wav" og optagelsen allerede har wav-formatets subtype"""
+    return fmt != "wav" or sf.info(source).subtype != FORMATS["wav"][2]
+
+
+def encode_file(source, fmt=RECORDING_FORMAT, delete_source=not KEEP_SOURCE_WAV, block_size=65536):
+    """
+    Koder en WAV-optagelse til fmt blok for blok (konstant hukommelse).
+
+    Kører i en worker-proces; skal derfor være en funktion på modul-niveau.
+
+    Returns:
+        str: Stien til den kodede fil
+    """
+    info = sf.info(source)
+    fmt = target_format(source, fmt)
+    target = encoded_path(source, fmt)
+    _, file_format, subtype = FORMATS[fmt]
+
+    partial = target + ".part"
+    with sf.SoundFile(partial, mode='w', samplerate=info.samplerate, channels=info.channels,
+                      format=file_format, subtype=subtype) as out:
+        for block in sf.blocks(source, blocksize=block_size, dtype='float32', always_2d=True):
+            out.write(block)
+    # Først når filen er komplet får den sit rigtige navn
+    os.replace(partial, target)
+
+    if delete_source and os.path.abspath(source) != os.path.abspath(target):
+        os.remove(source)
+    return target
+
+
+class EncoderPool:
+    """
+    Koder optagelser i en procespulje, uden for capture- og event loop-vejen.
+
+    Højst max_pending filer kan være i kø eller under kodning; er køen fuld blokerer
+    submit() (og encode_recording() venter uden at blokere event loop'et) til der er
+    plads - det er backpressure i stedet for en ubegrænset kø af rå WAV-filer på
+    disken. Ellers venter ingen på kodningen: resultatet kommer til on_done fra
+    puljens callback-tråd.
+
+    Args:
+        fmt (str): "wav", "flac" eller "opus"
+        workers (int): Antal worker-processer
+        max_pending (int): Maksimalt antal filer i kø eller under kodning
+    """
+
+    def __init__(self, fmt=RECORDING_FORMAT, workers=ENCODER_WORKERS, max_pending=ENCODER_QUEUE_SIZE,
+                 debug_mode=False):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown recording format '{fmt}' (choose {', '.join(FORMATS)})")
+        self.fmt = fmt
+        self.debug_mode = debug_mode
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        # spawn: workers må ikke forkes fra en proces med Playwrights tråde kørende
+        self._executor = ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        self.completed = 0
+        self.failed = 0
+
+    def _done(self, source, future, on_done):
+        self._slots.release()
+        try:
+            target = future.result()
+            self.completed += 1
+            if self.debug_mode:
+                print(f"DEBUG: Encoded {source} -> {target}")
+        except Exception as e:
+            self.failed += 1
+            target = source
+            print(f"⚠️ Could not encode {source}: {e} - keeping the WAV file")
+        if on_done is not None:
+            try:
+                on_done(target)
+            except Exception as e:
+                print(f"⚠️ Could not record the encoding of {source}: {e}")
+
+    def submit(self, source, on_done=None):
+        """
+        Lægger en fil i kø til kodning; blokerer mens køen er fuld.
+
+        on_done(target) kaldes når filen er færdig, med den kodede fil - eller source
+        hvis kodningen fejlede, eller hvis der intet er at kode (så med det samme).
+        """
+        if not needs_encoding(source, self.fmt):
+            if on_done is not None:
+                on_done(source)
+            return None
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(encode_file, source, self.fmt)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._done(source, f, on_done))
+        return future
+
+    async def encode_recording(self, source, index_file=None, on_done=None):
+        """
+        Lægger en optagelse og dens ytringer (et segmenter-indeks, se segmenter.py) i kø
+        til kodning og returnerer straks source - kun en fuld kø får kaldet til at vente.
+
+        Efterhånden som ytringerne bliver kodet, skrives indekset om til de kodede
+        filnavne. Når alle filer er færdige, kaldes on_done(target, segments) fra
+        puljens callback-tråd med optagelsens kodede fil (eller WAV-filen, hvis
+        kodningen fejlede) og indeksets ytringer.
+        """
+        index = None
+        if index_file:
+            with open(index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        segments = index["segments"] if index else []
+        folder = os.path.dirname(index_file) if index_file else ""
+        files = [source] + [os.path.join(folder, segment["file"]) for segment in segments]
+        results = {}
+        lock = threading.Lock()
+
+        def file_done(position, target):
+            with lock:
+                results[position] = target
+                if position > 0:
+                    segments[position - 1]["file"] = os.path.basename(target)
+                    _write_index(index_file, index)
+                finished = len(results) == len(files)
+            if finished and on_done is not None:
+                on_done(results[0], segments)
+
+        for position, path in enumerate(files):
+            await asyncio.to_thread(self.submit, path,
+                                    lambda target, position=position: file_done(position, target))
+        return source
+
+    def close(self):
+        """Venter på de filer der er i kø, og lukker processerne"""
+        self._executor.shutdown(wait=True)
+        if self.completed or self.failed:
+            print(f"Encoder: {self.completed} recordings encoded as {self.fmt}"
+                  + (f", {self.failed} failed" if self.failed else ""))
+
+
+def _write_index(index_file, index):
+    """Skriver et segmenter-indeks atomisk (skriv til .part, omdøb)"""
+    partial = index_file + ".part"
+    with open(partial, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    os.replace(partial, index_file)
+
+
+_pool = None
+
+
+def get_encoder_pool(debug_mode=False):
+    """Returnerer den fælles EncoderPool, og starter den første gang"""
+    global _pool
+    if _pool is None:
+        _pool = EncoderPool(debug_mode=debug_mode)
+    return _pool
+
+
+def close_encoder_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
@@ -10,32 +10,38 @@ import traceback
 import platform
 
 from browser import launch_browser_with_auth
+from browser_session import BrowserSession
+from session_pool import run_session_pool
+from audio_prep import load_question_queue
 from audio import list_audio_devices
-from config import RECORDING_DIR
-
-def kill_all_chromium():
-    """Dræber alle kørende Chromium-processer for at sikre en ren start"""
-    import os
-    import platform
-
-    system = platform.system()
+from audio_engine import close_audio_engines
+from encoder import close_encoder_pool
+from mock_server import start_mock_server
+from config import RECORDING_DIR, NOTEBOOK_URL, QUESTION_INJECTION, ANSWER_CAPTURE
 
+async def run_parallel(questions, debug_mode=False, headless=False, notebook_url=NOTEBOOK_URL,
+                       injection=QUESTION_INJECTION, capture=ANSWER_CAPTURE, block_requests=None,
+                       use_auth=True):
+    """Kører spørgsmålene fordelt over alle konfigurerede device-par (AUDIO_DEVICE_PAIRS)"""
     try:
-        if system == "Windows":
-            os.system("taskkill /f /im chromium.exe >nul 2>&1")
-            print("✅ Alle Chromium-processer afsluttet (Windows)")
-        elif system == "Darwin":  # macOS
-            os.system("pkill -f 'Chromium' >/dev/null 2>&1")
-            print("✅ Alle Chromium-processer afsluttet (macOS)")
-        elif system == "Linux":
-            os.system("pkill -f chromium >/dev/null 2>&1")
-            print("✅ Alle Chromium-processer afsluttet (Linux)")
-        else:
-            print(f"⚠️ Ukendt operativsystem: {system}, kan ikke afslutte Chromium-processer")
+        os.makedirs(RECORDING_DIR, exist_ok=True)
+        results = await run_session_pool(questions, debug_mode=debug_mode, headless=headless,
+                                         notebook_url=notebook_url, injection=injection,
+                                         capture=capture, block_requests=block_requests,
+                                         use_auth=use_auth)
     except Exception as e:
-        print(f"⚠️ Fejl ved afslutning af Chromium-processer: {e}")
+        if debug_mode:
+            print(f"DEBUG: Error in parallel run: {e}")
+            print(f"DEBUG: Traceback: {traceback.format_exc()}")
+        else:
+            print(f"Error in parallel run: {e}")
+        return 1
+
+    return 0 if all(r.get("recording") for r in results) else 1
 
-async def main(debug_mode=False, tts_file=None):
+async def main(debug_mode=False, tts_file=None, reuse_session=True, questions=None,
+               headless=False, notebook_url=NOTEBOOK_URL, injection=QUESTION_INJECTION,
+               capture=ANSWER_CAPTURE, block_requests=None, temporary_profile=False):
     """Hovedfunktion der kører hele processen"""
     try:
         # Sørg for at output-mappen eksisterer
@@ -54,7 +60,11 @@ async def main(debug_mode=False, tts_file=None):
                 print(f"DEBUG: Original TTS file was: {original_tts_path}")
         
         # Start browser og kør interaktionen
-        await launch_browser_with_auth(debug_mode=debug_mode)
+        await launch_browser_with_auth(debug_mode=debug_mode, reuse_session=reuse_session,
+                                       questions=questions, headless=headless,
+                                       notebook_url=notebook_url, injection=injection,
+                                       capture=capture, block_requests=block_requests,
+                                       temporary_profile=temporary_profile)
         
     except Exception as e:
         if debug_mode:
@@ -63,6 +73,11 @@ async def main(debug_mode=False, tts_file=None):
         else:
             print(f"Error in main function: {e}")
         return 1
+    finally:
+        # Lyd-motorerne holdes åbne mellem interaktioner og lukkes først her
+        close_audio_engines()
+        # Vent på optagelser der stadig er i kø til kodning
+        close_encoder_pool()
     
     return 0
 
@@ -71,11 +86,59 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="NotebookLM Podcast Automation")
     parser.add_argument("--debug", action="store_true", help="Enable debug mode")
     parser.add_argument("--tts", type=str, help="Path to TTS audio file to use")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Stop the managed browser session and start a new one")
+    parser.add_argument("--no-reuse", action="store_true",
+                        help="Launch a throwaway browser instead of the managed session")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Run one session per configured device pair and spread the questions over them")
+    parser.add_argument("--questions", nargs="+", help="Question audio files for --parallel")
+    parser.add_argument("--batch", type=str,
+                        help="Directory of question WAVs or a manifest (.txt/.json) to ask in order")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run Chromium without a window and without waiting for user input")
+    parser.add_argument("--mock", action="store_true",
+                        help="Run against the bundled local NotebookLM mock instead of the live site")
+    parser.add_argument("--injection", choices=["vbcable", "webaudio"],
+                        help="How the question reaches the page (default from config; webaudio with --mock)")
+    parser.add_argument("--capture", choices=["device", "page"],
+                        help="Where the answer is recorded from (default from config; page with --mock)")
+    parser.add_argument("--no-block", action="store_true",
+                        help="Do not block images, fonts and telemetry; only measure what would be blocked")
     args = parser.parse_args()
+    block_requests = False if args.no_block else None
+
+    notebook_url = NOTEBOOK_URL
+    injection = args.injection or QUESTION_INJECTION
+    capture = args.capture or ANSWER_CAPTURE
+    if args.mock:
+        # Offline: ingen login, ingen lyd-drivere, ingen genbrugt browser eller profil
+        mock_server, notebook_url = start_mock_server()
+        injection = args.injection or "webaudio"
+        capture = args.capture or "page"
+
+    batch_questions = load_question_queue(args.batch) if args.batch else None
+    if args.batch and not batch_questions:
+        print(f"No questions found in {args.batch}")
+        sys.exit(1)
 
-    # Kill all Chromium processes before starting
-    kill_all_chromium()
+    # Stop kun den browser vi selv har startet - aldrig andre Chromium-processer
+    if args.fresh:
+        BrowserSession(debug_mode=args.debug).stop()
 
     # Run the main function
-    exit_code = asyncio.run(main(debug_mode=args.debug, tts_file=args.tts))
+    if args.parallel:
+        from config import TTS_FILE_PATH
+        questions = batch_questions or args.questions or [args.tts or TTS_FILE_PATH]
+        exit_code = asyncio.run(run_parallel(questions, debug_mode=args.debug, headless=args.headless,
+                                             notebook_url=notebook_url, injection=injection,
+                                             capture=capture, block_requests=block_requests,
+                                             use_auth=not args.mock))
+    else:
+        exit_code = asyncio.run(main(debug_mode=args.debug, tts_file=args.tts,
+                                     reuse_session=not (args.no_reuse or args.mock),
+                                     questions=batch_questions, headless=args.headless,
+                                     notebook_url=notebook_url, injection=injection,
+                                     capture=capture, block_requests=block_requests,
+                                     temporary_profile=args.mock))
     sys.exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from config import RECORDING_DIR, METRICS_FILE
+
+_write_lock = threading.Lock()
+
+
+def metrics_path(recording_dir=RECORDING_DIR, filename=METRICS_FILE):
+    """Metrics-filen ligger ved siden af optagelsesmappen, ikke i den"""
+    parent = os.path.dirname(os.path.abspath(recording_dir))
+    return os.path.join(parent, filename)
+
+
+def monotonic_from_browser(timestamp_ms):
+    """
+    Omregner et browser-tidsstempel (performance.timeOrigin + now, epoch-ms) til
+    time.monotonic(). Browser og script kører på samme maskine og deler vægurets epoke.
+    """
+    age = max(0.0, time.time() - timestamp_ms / 1000)
+    return time.monotonic() - age
+
+
+class InteractionMetrics:
+    """
+    Tidsstempler (time.monotonic()) for én interaktions fasegrænser.
+
+    Faser der ikke nås (f.eks. ved timeout) udelades; to_record() regner de
+    afledte latenser ud for de faser der findes.
+
+    Fasegrænser:
+        started         interactive_flow startede
+        listen          siden gik i lyttemode
+        playback_start  første blok af spørgsmålet blev afspillet/injiceret
+        playback_end    sidste blok af spørgsmålet var afspillet
+        answer          siden gik i svarmode
+        first_sound     første ikke-stille sample i optagelsen (sample-præcist)
+        recording_end   optagelsen var skrevet færdig
+
+    finish() skriver record'en når flowet er slut. Arbejde der fortsætter bagefter
+    (kodning af optagelsen) kan holde den tilbage med hold() og tilføje sine værdier
+    med release(); record'en skrives så ved den sidste release().
+    """
+
+    def __init__(self, session=None, question=None):
+        self.session = session
+        self.question = question
+        self.marks = {"started": time.monotonic()}
+        self.values = {}
+        self._health_source = None
+        self._health_before = None
+        self._lock = threading.Lock()
+        self._holds = 0
+        self._finished = None  # (recording_dir, debug_mode) når flowet er slut
+        self._written = False
+
+    def mark(self, name, at=None):
+        """Sætter en fasegrænse; at er et time.monotonic()-tidspunkt (default nu)"""
+        self.marks[name] = time.monotonic() if at is None else at
+
+    def set(self, **values):
+        self.values.update(values)
+
+    def track_stream_health(self, engine):
+        """Medtager xruns for motorens streams i løbet af interaktionen (se stream_health)"""
+        self._health_source = engine
+        self._health_before = engine.health_snapshot()
+
+    def _between(self, start, end):
+        if start in self.marks and end in self.marks:
+            return round(self.marks[end] - self.marks[start], 4)
+        return None
+
+    def to_record(self):
+        record = {
+            "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+            "session": self.session,
+            "question": self.question,
+            "listen_to_playback_start": self._between("listen", "playback_start"),
+            "playback_seconds": self._between("playback_start", "playback_end"),
+            "playback_end_to_answer": self._between("playback_end", "answer"),
+            "answer_to_first_sound": self._between("answer", "first_sound"),
+            "total_seconds": self._between("started", "recording_end"),
+            "phases": {name: round(at - self.marks["started"], 4) for name, at in self.marks.items()},
+        }
+        if self._health_source is not None:
+            record["stream_health"] = self._health_source.health_since(self._health_before)
+        record.update(self.values)
+        return record
+
+    def append(self, recording_dir=RECORDING_DIR):
+        """Tilføjer én JSON-linje til metrics-filen og returnerer den skrevne record"""
+        record = self.to_record()
+        path = metrics_path(recording_dir)
+        line = json.dumps(record, ensure_ascii=False)
+        # Flere sessioner kan skrive samtidig; én linje ad gangen
+        with _write_lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        return record
+
+    def hold(self):
+        """Udskyder skrivningen til et tilsvarende release()"""
+        with self._lock:
+            self._holds += 1
+
+    def release(self, **values):
+        """Sætter values og skriver record'en hvis flowet er slut og intet andet holder den"""
+        with self._lock:
+            self.values.update(values)
+            self._holds -= 1
+        self._write_when_ready()
+
+    def finish(self, recording_dir=RECORDING_DIR, debug_mode=False):
+        """Flowet er slut: skriver record'en nu, eller ved den sidste release()"""
+        with self._lock:
+            self._finished = (recording_dir, debug_mode)
+        self._write_when_ready()
+
+    def _write_when_ready(self):
+        with self._lock:
+            if self._finished is None or self._holds or self._written:
+                return
+            self._written = True
+        recording_dir, debug_mode = self._finished
+        try:
+            record = self.append(recording_dir)
+            if debug_mode:
+                print(f"DEBUG: Metrics: {json.dumps(record, ensure_ascii=False)}")
+        except Exception as e:
+            print(f"Could not write interaction metrics: {e}")
@@ -0,0 +1,59 @@
+import os
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlencode
+from config import MOCK_NOTEBOOK_OPTIONS
+
+MOCK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_notebooklm")
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    """Serverer mock-siden uden at logge hver request til konsollen"""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(port=0, options=None, directory=MOCK_DIR):
+    """
+    Starter en lokal HTTP-server med mock-NotebookLM i en daemon-tråd.
+
+    Ekstra filer (f.eks. answer_audio) kan lægges i samme mappe og refereres relativt.
+
+    Args:
+        port (int): Port at lytte på (0 = vælg en ledig)
+        options (dict): Timing-parametre til siden (se mock_notebooklm/index.html);
+            overskriver MOCK_NOTEBOOK_OPTIONS fra config
+        directory (str): Mappen der serveres
+
+    Returns:
+        tuple: (server, url) - url indeholder timing-parametrene som query string
+    """
+    handler = partial(_QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, name="mock-notebooklm", daemon=True)
+    thread.start()
+
+    query = urlencode({**MOCK_NOTEBOOK_OPTIONS, **(options or {})})
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    if query:
+        url += f"?{query}"
+    print(f"Mock NotebookLM running at {url}")
+    return server, url
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Serve the local NotebookLM mock")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    args = parser.parse_args()
+
+    server, url = start_mock_server(port=args.port)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
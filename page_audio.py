@@ -0,0 +1,454 @@
+import os
+import base64
+import time
+import asyncio
+from datetime import datetime
+import numpy as np
+import soundfile as sf
+from config import VAD_SETTINGS, SEGMENT_SETTINGS
+from segmenter import UtteranceSegmenter
+from vad import EndOfAnswerDetector, OnsetDetector, END_SILENCE, END_CAP, END_ERROR
+
+# Format spørgsmål klargøres i når de injiceres direkte i siden (se prepare_question).
+# Mikrofon-streamen er mono; AudioContext'ens egen rate er typisk 48 kHz.
+PAGE_AUDIO_FORMAT = {"default_samplerate": 48000, "max_output_channels": 1}
+# Siden får 16-bit PCM, så spørgsmål klargøres (og caches) direkte som int16
+PAGE_AUDIO_DTYPE = "int16"
+
+# Chromium-flag til injektions-mode: getUserMedia virker uden rigtige devices (headless)
+INJECTION_CHROMIUM_ARGS = [
+    "--use-fake-device-for-media-stream",
+]
+
+# Init-script der erstatter sidens mikrofon med en Web Audio-kilde som Python fodrer.
+# getUserMedia({audio}) returnerer en MediaStreamDestination; indtil et spørgsmål
+# afspilles leverer den stilhed, præcis som en mikrofon i et stille rum.
+QUESTION_INJECTOR_SCRIPT = """
+(() => {
+    if (window.__questionInjector) {
+        return;
+    }
+
+    let context = null;
+    let destination = null;
+
+    const ensureContext = async () => {
+        if (!context) {
+            context = new AudioContext();
+            destination = context.createMediaStreamDestination();
+        }
+        if (context.state !== 'running') {
+            await context.resume();
+        }
+        return context;
+    };
+
+    const originalGetUserMedia = navigator.mediaDevices.getUserMedia.bind(navigator.mediaDevices);
+    navigator.mediaDevices.getUserMedia = async (constraints) => {
+        if (!constraints || !constraints.audio) {
+            return originalGetUserMedia(constraints);
+        }
+        await ensureContext();
+        const stream = new MediaStream(destination.stream.getAudioTracks());
+        if (constraints.video) {
+            const video = await originalGetUserMedia({ video: constraints.video });
+            video.getVideoTracks().forEach((track) => stream.addTrack(track));
+        }
+        return stream;
+    };
+
+    window.__questionInjector = {
+        play: async (b64, sampleRate, channels) => {
+            await ensureContext();
+            const bytes = Uint8Array.from(atob(b64), (c) => c.charCodeAt(0));
+            const pcm = new Int16Array(bytes.buffer);
+            const frames = pcm.length / channels;
+            const buffer = context.createBuffer(channels, frames, sampleRate);
+            for (let ch = 0; ch < channels; ch++) {
+                const data = buffer.getChannelData(ch);
+                for (let i = 0; i < frames; i++) {
+                    data[i] = pcm[i * channels + ch] / 32768;
+                }
+            }
+            const source = context.createBufferSource();
+            source.buffer = buffer;
+            source.connect(destination);
+            const startedAt = performance.timeOrigin + performance.now();
+            await new Promise((resolve) => {
+                source.onended = resolve;
+                source.start();
+            });
+            source.disconnect();
+            return { startedAt, endedAt: performance.timeOrigin + performance.now() };
+        },
+    };
+})();
+"""
+
+
+async def install_question_injector(page):
+    """Installerer Web Audio-mikrofonen på siden (før navigation, så NotebookLM får den)"""
+    await page.add_init_script(QUESTION_INJECTOR_SCRIPT)
+    await page.evaluate(QUESTION_INJECTOR_SCRIPT)
+
+
+async def inject_question(page, data, samplerate):
+    """
+    Afspiller et klargjort spørgsmål direkte ind i sidens getUserMedia-stream.
+
+    Lyden sendes som 16-bit PCM og afspilles af en AudioBufferSourceNode i siden;
+    kaldet returnerer først når afspilningen er slut.
+
+    Returns:
+        dict: startedAt/endedAt i browserens epoch-millisekunder
+    """
+    data = np.asarray(data)
+    channels = 1 if data.ndim == 1 else data.shape[1]
+    if data.dtype == np.int16:
+        pcm = data.astype('<i2', copy=False)
+    else:
+        # Klargjort lyd er allerede klippet; konverteres direkte ind i én int16-buffer
+        pcm = np.empty(data.shape, dtype='<i2')
+        np.multiply(data, 32767, out=pcm, casting='unsafe')
+    b64 = base64.b64encode(pcm.tobytes()).decode('ascii')
+    return await page.evaluate(
+        "([b64, sampleRate, channels]) => window.__questionInjector.play(b64, sampleRate, channels)",
+        [b64, int(samplerate), channels])
+
+
+# Init-script der aftapper sidens lyd-output: alt der forbindes til en AudioContext's
+# destination samt <audio>/<video>-elementer der afspiller. Lyden mixes i en separat
+# capture-context, hvor en AudioWorklet (ScriptProcessor som fallback) udtager PCM der
+# sendes til Python i ~100 ms bidder mens en optagelse er aktiv.
+ANSWER_CAPTURE_SCRIPT = """
+(() => {
+    if (window.__answerCapture) {
+        return;
+    }
+
+    const CHANNELS = 2;
+    const OriginalAudioContext = window.AudioContext;
+    const originalConnect = AudioNode.prototype.connect;
+    const tappedElements = new WeakSet();
+
+    let captureContext = null;
+    let captureInput = null;
+    let sampleRate = 48000;
+    let active = false;
+    let pending = [];
+    let pendingFrames = 0;
+    // Bidder sendt til Python som endnu ikke er behandlet (bindingens promise)
+    const inFlight = new Set();
+
+    const flush = () => {
+        if (!pendingFrames) {
+            return;
+        }
+        const out = new Int16Array(pendingFrames * CHANNELS);
+        let offset = 0;
+        for (const [left, right] of pending) {
+            for (let i = 0; i < left.length; i++) {
+                out[offset++] = Math.max(-1, Math.min(1, left[i])) * 32767;
+                out[offset++] = Math.max(-1, Math.min(1, right[i])) * 32767;
+            }
+        }
+        pending = [];
+        pendingFrames = 0;
+
+        const bytes = new Uint8Array(out.buffer);
+        let binary = '';
+        for (let i = 0; i < bytes.length; i += 0x8000) {
+            binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+        }
+        if (typeof window.%(binding)s === 'function') {
+            const sent = Promise.resolve(window.%(binding)s(btoa(binary), sampleRate, CHANNELS))
+                .catch(() => {})
+                .finally(() => inFlight.delete(sent));
+            inFlight.add(sent);
+        }
+    };
+
+    const onBlock = (left, right) => {
+        if (!active) {
+            return;
+        }
+        pending.push([left, right]);
+        pendingFrames += left.length;
+        if (pendingFrames >= sampleRate / 10) {
+            flush();
+        }
+    };
+
+    const WORKLET = `
+        class PcmTap extends AudioWorkletProcessor {
+            process(inputs) {
+                const input = inputs[0];
+                if (input.length) {
+                    this.port.postMessage([input[0].slice(), (input[1] || input[0]).slice()]);
+                }
+                return true;
+            }
+        }
+        registerProcessor('pcm-tap', PcmTap);
+    `;
+
+    const ensureCapture = () => {
+        if (captureContext) {
+            return;
+        }
+        captureContext = new OriginalAudioContext();
+        sampleRate = captureContext.sampleRate;
+        captureInput = captureContext.createGain();
+        const mute = captureContext.createGain();
+        mute.gain.value = 0;
+        originalConnect.call(mute, captureContext.destination);
+
+        const useScriptProcessor = () => {
+            const processor = captureContext.createScriptProcessor(4096, CHANNELS, CHANNELS);
+            processor.onaudioprocess = (event) => {
+                const input = event.inputBuffer;
+                onBlock(input.getChannelData(0).slice(),
+                        input.getChannelData(Math.min(1, input.numberOfChannels - 1)).slice());
+            };
+            originalConnect.call(captureInput, processor);
+            originalConnect.call(processor, mute);
+        };
+
+        const url = URL.createObjectURL(new Blob([WORKLET], { type: 'application/javascript' }));
+        captureContext.audioWorklet.addModule(url).then(() => {
+            const tap = new AudioWorkletNode(captureContext, 'pcm-tap', { channelCount: CHANNELS });
+            tap.port.onmessage = (event) => onBlock(event.data[0], event.data[1]);
+            originalConnect.call(captureInput, tap);
+            originalConnect.call(tap, mute);
+        }).catch(useScriptProcessor);
+    };
+
+    const addStream = (stream) => {
+        ensureCapture();
+        const connect = () => {
+            if (stream.getAudioTracks().length) {
+                originalConnect.call(captureContext.createMediaStreamSource(stream), captureInput);
+                return true;
+            }
+            return false;
+        };
+        if (!connect()) {
+            stream.addEventListener('addtrack', connect, { once: true });
+        }
+    };
+
+    // Web Audio: alt der forbindes til en destination får også en forbindelse til tap-bussen
+    const tapContext = (context) => {
+        if (!context.__answerTap) {
+            const bus = context.createGain();
+            const destination = context.createMediaStreamDestination();
+            originalConnect.call(bus, destination);
+            context.__answerTap = bus;
+            addStream(destination.stream);
+        }
+        return context.__answerTap;
+    };
+
+    AudioNode.prototype.connect = function (target, ...rest) {
+        const result = originalConnect.call(this, target, ...rest);
+        if (target instanceof AudioDestinationNode && this.context !== captureContext) {
+            originalConnect.call(this, tapContext(this.context));
+        }
+        return result;
+    };
+
+    // Elementer der routes gennem Web Audio fanges allerede af destination-hooket
+    const originalCreateMediaElementSource = OriginalAudioContext.prototype.createMediaElementSource;
+    OriginalAudioContext.prototype.createMediaElementSource = function (element) {
+        tappedElements.add(element);
+        return originalCreateMediaElementSource.call(this, element);
+    };
+
+    document.addEventListener('playing', (event) => {
+        const element = event.target;
+        if (!(element instanceof HTMLMediaElement) || tappedElements.has(element)) {
+            return;
+        }
+        tappedElements.add(element);
+        if (element.srcObject instanceof MediaStream) {
+            addStream(element.srcObject);
+        } else if (typeof element.captureStream === 'function') {
+            addStream(element.captureStream());
+        }
+    }, true);
+
+    window.__answerCapture = {
+        start: async () => {
+            ensureCapture();
+            pending = [];
+            pendingFrames = 0;
+            active = true;
+            await captureContext.resume();
+            return sampleRate;
+        },
+        stop: async () => {
+            // Ingen nye blokke efter stop; den sidste bid sendes og alle bidder er
+            // skrevet i Python før stop() resolver
+            active = false;
+            flush();
+            await Promise.all([...inFlight]);
+        },
+    };
+})();
+""" % {"binding": "__pushAnswerPcm"}
+
+
+class PageAnswerRecorder:
+    """
+    Skriver PCM-bidder fra sidens lyd-tap (ANSWER_CAPTURE_SCRIPT) til en WAV-fil.
+
+    Hver bid skrives og flushes med det samme, så filen altid har en gyldig header
+    og intet går tabt hvis processen dør midt i en optagelse. Med
+    SEGMENT_SETTINGS["enabled"] deles optagelsen i ytringer undervejs, som ved
+    optagelse fra et device (se segmenter.UtteranceSegmenter).
+    """
+
+    def __init__(self, debug_mode=False):
+        self.debug_mode = debug_mode
+        self.output_file = None
+        self.frames = 0
+        self._file = None
+        self._recording = False
+        self._detector = None
+        self._onset = None
+        self._segmenter = None
+        self._ended = None
+
+    async def _on_chunk(self, source, b64, samplerate, channels):
+        """Kaldes fra siden via page.expose_binding for hver PCM-bid"""
+        if not self._recording:
+            return
+        pcm = np.frombuffer(base64.b64decode(b64), dtype='<i2').reshape(-1, channels)
+        if self._file is None:
+            self._file = sf.SoundFile(self.output_file, mode='w', samplerate=int(samplerate),
+                                      channels=channels, subtype='PCM_16')
+            if SEGMENT_SETTINGS["enabled"]:
+                # Kanaler og rate kendes først med første bid
+                self._segmenter = UtteranceSegmenter(self.output_file, int(samplerate), channels)
+        self._file.write(pcm)
+        self._file.flush()
+        self.frames += len(pcm)
+
+        block = pcm / 32768.0
+        if self._onset is not None:
+            self._onset.feed(block)
+        if self._segmenter is not None:
+            self._segmenter.feed(block)
+        if self._detector is None:
+            return
+        if self._detector.feed(block):
+            self._ended.set()
+
+    async def record(self, page, duration, output_file, stop_on_silence=None, report=None):
+        """
+        Optager sidens lyd i højst duration sekunder; returnerer output_file eller None.
+
+        Med stop_on_silence stopper optagelsen når svaret er slut (se vad.EndOfAnswerDetector).
+        report udfyldes som i audio_capture.record_audio_from_output.
+        """
+        if stop_on_silence is None:
+            stop_on_silence = VAD_SETTINGS["enabled"]
+        if report is None:
+            report = {}
+        self.output_file = output_file
+        self.frames = 0
+        self._ended = asyncio.Event()
+        self._detector = None
+        end_reason = END_CAP
+        samplerate = None
+        started_at = None
+        self._recording = True
+        try:
+            samplerate = await page.evaluate("window.__answerCapture.start()")
+            started_at = time.monotonic()
+            self._onset = OnsetDetector(int(samplerate))
+            if stop_on_silence:
+                self._detector = EndOfAnswerDetector(int(samplerate))
+            if self.debug_mode:
+                print(f"DEBUG: Page capture started at {samplerate} Hz -> {output_file}")
+            try:
+                await asyncio.wait_for(self._ended.wait(), timeout=duration)
+                end_reason = END_SILENCE
+            except asyncio.TimeoutError:
+                end_reason = END_CAP
+            # Resolver først når sidens sidste bid er skrevet her, så filen lukkes komplet
+            await page.evaluate("window.__answerCapture.stop()")
+        except Exception:
+            end_reason = END_ERROR
+            raise
+        finally:
+            self._recording = False
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            detector, onset, segmenter = self._detector, self._onset, self._segmenter
+            self._detector = self._onset = self._segmenter = None
+            report.update({
+                "end_reason": end_reason,
+                "recorded_seconds": round(self.frames / samplerate, 3) if samplerate else 0.0,
+                "speech_seconds": round(detector.speech_seconds, 3) if detector else None,
+                "speech_started": detector.speech_started if detector else None,
+                "started_at": started_at,
+                "first_sound_seconds": onset.onset_seconds if onset else None,
+            })
+            if segmenter is not None:
+                try:
+                    report["segments"] = len(segmenter.finish())
+                    report["segment_index"] = segmenter.index_file
+                except Exception as e:
+                    print(f"⚠️ Kunne ikke skrive ytringsindeks: {e}")
+
+        if self.frames == 0:
+            print("❌ Ingen lyd modtaget fra siden under optagelsen")
+            report["end_reason"] = END_ERROR
+            return None
+        return output_file
+
+
+_recorders = {}
+
+
+async def attach_answer_capture(page, debug_mode=False):
+    """Installerer lyd-tappet på siden (før navigation) og returnerer dens PageAnswerRecorder"""
+    recorder = _recorders.get(id(page))
+    if recorder is not None:
+        return recorder
+
+    recorder = PageAnswerRecorder(debug_mode=debug_mode)
+    _recorders[id(page)] = recorder
+    page.on("close", lambda _: _recorders.pop(id(page), None))
+
+    await page.expose_binding("__pushAnswerPcm", recorder._on_chunk)
+    await page.add_init_script(ANSWER_CAPTURE_SCRIPT)
+    await page.evaluate(ANSWER_CAPTURE_SCRIPT)
+    return recorder
+
+
+async def record_answer_from_page(page, duration=10, output_dir="recordings",
+                                  filename_prefix="recording", debug_mode=False,
+                                  stop_on_silence=None, report=None):
+    """
+    Optager hostens svar direkte fra sidens lyd i stedet for fra et loopback-device.
+
+    Returns:
+        str: Sti til den gemte lydfil, eller None hvis der ikke kom lyd
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = os.path.join(output_dir, f"{filename_prefix}_{timestamp}.wav")
+
+    recorder = await attach_answer_capture(page, debug_mode=debug_mode)
+    report = {} if report is None else report
+    print(f"🎙️ Optager sidens lyd i højst {duration} sekunder...")
+    print(f"   Output fil: {output_file}")
+    output_file = await recorder.record(page, duration, output_file,
+                                        stop_on_silence=stop_on_silence, report=report)
+    if output_file:
+        print(f"✅ Optagelse gemt som {output_file} ({report['end_reason']}, "
+              f"{report['recorded_seconds']:.1f}s)")
+    return output_file
@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+# Podcastens tilstande afledt af .user-speaking-animation
+LISTEN = "listen"    # animationen vises - podcasten lytter efter vores spørgsmål
+ANSWER = "answer"    # animationen skjules - podcasten svarer
+UNKNOWN = "unknown"  # elementet findes ikke (endnu) på siden
+
+BINDING_NAME = "__reportSpeakingState"
+
+# MutationObserver der kører i siden og skubber tilstandsskift til Python.
+# Tidsstemplet er performance.timeOrigin + performance.now(), dvs. epoch-millisekunder
+# med sub-millisekund opløsning målt i browseren.
+OBSERVER_SCRIPT = """
+(() => {
+    if (window !== window.top) {
+        // Kun hovedframen har podcasten; iframes (cookie-rotation, gapi) ville melde 'unknown'
+        return;
+    }
+    if (window.__speakingObserverReport) {
+        // Allerede installeret (f.eks. genbrugt fane) - rapportér tilstanden igen
+        window.__speakingObserverReport(true);
+        return;
+    }
+
+    let lastMode = null;
+
+    const currentMode = () => {
+        const el = document.querySelector('.user-speaking-animation');
+        if (!el) {
+            return 'unknown';
+        }
+        const display = el.style.display || window.getComputedStyle(el).display;
+        return display === 'none' ? 'answer' : 'listen';
+    };
+
+    const report = (force) => {
+        const mode = currentMode();
+        if (mode === lastMode && force !== true) {
+            return;
+        }
+        lastMode = mode;
+        const timestamp = performance.timeOrigin + performance.now();
+        if (typeof window.%(binding)s === 'function') {
+            window.%(binding)s(mode, timestamp);
+        }
+    };
+
+    window.__speakingObserverReport = report;
+
+    const start = () => {
+        const observer = new MutationObserver(() => report(false));
+        observer.observe(document.documentElement, {
+            subtree: true,
+            childList: true,
+            attributes: true,
+            attributeFilter: ['style', 'class'],
+        });
+        report(false);
+    };
+
+    if (document.documentElement) {
+        start();
+    } else {
+        document.addEventListener('DOMContentLoaded', start, { once: true });
+    }
+})();
+""" % {"binding": BINDING_NAME}
+
+
+class PodcastState:
+    """Asyncio-side spejling af podcastens lytte/svar-tilstand i siden"""
+
+    def __init__(self, debug_mode=False):
+        self.debug_mode = debug_mode
+        self.mode = UNKNOWN
+        self.browser_timestamp = None  # epoch ms fra browseren for seneste skift
+        self.received_at = None  # time.monotonic() da Python modtog seneste skift
+        self.transitions = []
+        self._changed = asyncio.Condition()
+
+    async def _on_change(self, source, mode, timestamp):
+        """Kaldes fra siden via page.expose_binding ved hvert tilstandsskift"""
+        if source["frame"] is not source["page"].main_frame:
+            # Bindingen findes i alle frames; kun hovedframens tilstand tæller
+            return
+        transition = {
+            "mode": mode,
+            "browser_timestamp": timestamp,
+            "received_at": time.monotonic(),
+        }
+        async with self._changed:
+            self.mode = mode
+            self.browser_timestamp = timestamp
+            self.received_at = transition["received_at"]
+            self.transitions.append(transition)
+            self._changed.notify_all()
+
+        if self.debug_mode:
+            print(f"DEBUG: Podcast state -> {mode} (browser t={timestamp:.3f} ms)")
+
+    async def wait_for(self, mode, timeout=30):
+        """
+        Venter til podcasten er i den ønskede tilstand.
+
+        Returnerer straks hvis tilstanden allerede er nået.
+
+        Returns:
+            dict: Den transition der bragte siden i tilstanden
+
+        Raises:
+            asyncio.TimeoutError: Hvis tilstanden ikke nås inden for timeout sekunder
+        """
+        async with self._changed:
+            await asyncio.wait_for(
+                self._changed.wait_for(lambda: self.mode == mode), timeout)
+            return self.last_transition()
+
+    def last_transition(self):
+        """Returnerer seneste transition, eller None hvis ingen er modtaget"""
+        return self.transitions[-1] if self.transitions else None
+
+
+_states = {}
+
+
+async def attach_podcast_state(page, debug_mode=False):
+    """
+    Installerer MutationObserveren på siden og returnerer dens PodcastState.
+
+    Observeren installeres både som init-script (overlever navigation) og direkte i
+    det aktuelle dokument. Kald er idempotente per side.
+    """
+    state = _states.get(id(page))
+    if state is not None:
+        return state
+
+    state = PodcastState(debug_mode=debug_mode)
+    _states[id(page)] = state
+    page.on("close", lambda _: _states.pop(id(page), None))
+
+    await page.expose_binding(BINDING_NAME, state._on_change)
+    await page.add_init_script(OBSERVER_SCRIPT)
+    await page.evaluate(OBSERVER_SCRIPT)
+
+    if debug_mode:
+        print("DEBUG: Speaking-animation observer installed")
+    return state
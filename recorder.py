@@ -0,0 +1,342 @@
+import time
+import asyncio
+import threading
+import numpy as np
+import sounddevice as sd
+import soundfile as sf
+from config import CAPTURE_PREROLL_SECONDS, RECORDING_SUBTYPE
+from stream_health import get_stream_health
+
+
+class Completion:
+    """
+    En threading.Event der også kan awaites fra et event loop.
+
+    Sættes fra en audio-callback eller writer-tråd; ventende asyncio-futures løses
+    via loop.call_soon_threadsafe, så event loop'et aldrig blokerer på lyd.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._waiters = []
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout)
+
+    def set(self):
+        self._event.set()
+        for loop, future in list(self._waiters):
+            loop.call_soon_threadsafe(_resolve, future)
+
+    async def wait_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiters.append((loop, future))
+        # Sat mellem tjek og registrering? Så løses future'en her i stedet
+        if self._event.is_set():
+            _resolve(future)
+        try:
+            await future
+        finally:
+            self._waiters.remove((loop, future))
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class FrameRing:
+    """
+    Forhåndsallokeret ringbuffer af frames med absolutte frame-positioner.
+
+    Én producent (stream-callback'en) skriver; vilkårligt mange læsere holder hver deres
+    absolutte position og kopierer selv ud. Callback'en tager aldrig en lås: data
+    kopieres ind før `written` tælles op, så læsere kun ser færdigskrevne frames.
+    Ringen rummer de seneste `capacity` frames - det er pre-roll'en.
+
+    Args:
+        capacity (int): Antal frames ringen rummer
+        channels (int): Antal kanaler
+        samplerate (int): Sample rate (bruges til at omregne tid til frames)
+        dtype (str): Sample-type
+    """
+
+    def __init__(self, capacity, channels, samplerate, dtype='float32'):
+        self.capacity = capacity
+        self.channels = channels
+        self.samplerate = samplerate
+        self.buffer = np.zeros((capacity, channels), dtype=dtype)
+        self.written = 0
+        # (written, time.monotonic()) efter seneste blok; byttes atomisk som én tuple
+        self.clock = (0, time.monotonic())
+
+    def write(self, data):
+        """Skriver en blok (kaldes fra stream-callback'en)"""
+        frames = len(data)
+        written = self.written
+        if frames > self.capacity:
+            # Kan ikke ske med normale blokstørrelser; behold de nyeste frames
+            written += frames - self.capacity
+            data = data[-self.capacity:]
+            frames = self.capacity
+        position = written % self.capacity
+        first = min(frames, self.capacity - position)
+        self.buffer[position:position + first] = data[:first]
+        if first < frames:
+            self.buffer[:frames - first] = data[first:]
+        self._publish(written + frames)
+
+    def _publish(self, written):
+        """Gør frames op til written synlige for læserne - først når de er kopieret ind"""
+        self.written = written
+        self.clock = (written, time.monotonic())
+
+    @property
+    def oldest(self):
+        """Ældste frame-position der stadig ligger i ringen"""
+        return max(0, self.written - self.capacity)
+
+    def frame_at(self, timestamp):
+        """Omregner et time.monotonic()-tidspunkt til en frame-position i ringen"""
+        written, at = self.clock
+        frame = written - int(round((at - timestamp) * self.samplerate))
+        return min(max(frame, self.oldest), self.written)
+
+    def read(self, start, end):
+        """Kopierer frames [start, end) ud; start klippes til ældste frame i ringen"""
+        start = max(start, self.oldest)
+        end = min(end, self.written)
+        if end <= start:
+            return self.buffer[:0].copy()
+        first_pos = start % self.capacity
+        frames = end - start
+        first = min(frames, self.capacity - first_pos)
+        block = np.empty((frames, self.channels), dtype=self.buffer.dtype)
+        block[:first] = self.buffer[first_pos:first_pos + first]
+        if first < frames:
+            block[first:] = self.buffer[:frames - first]
+        return block
+
+
+class RingRecording:
+    """
+    En optagelse der læses ud af en FrameRing og streames til disk af en writer-tråd.
+
+    At starte en optagelse er kun at sætte en læseposition i ringen - også bagud i tid,
+    så lyd fra før optagelsen blev startet kommer med. Writer-tråden skriver faste blokke
+    til en sf.SoundFile og flusher efter hver, så WAV-headeren altid er gyldig og
+    hukommelsesforbruget er konstant. on_block kaldes fra writer-tråden (ikke fra
+    audio-callback'en) og kan stoppe optagelsen ved at returnere True - f.eks. en
+    EndOfAnswerDetector.
+
+    Args:
+        ring (FrameRing): Ringen der læses fra
+        output_file (str): WAV-fil der skrives til
+        start_frame (int): Absolut frame-position optagelsen starter ved
+        max_seconds (float): Loft over optagelsens længde (None = ingen)
+        on_block: fn(block) -> bool, kaldes for hver blok; True stopper optagelsen
+        block_size (int): Frames per blok (default 100 ms)
+        subtype (str): soundfile-subtype for filen (default RECORDING_SUBTYPE)
+    """
+
+    def __init__(self, ring, output_file, start_frame, max_seconds=None, on_block=None,
+                 block_size=None, subtype=RECORDING_SUBTYPE):
+        self.ring = ring
+        self.output_file = output_file
+        self.samplerate = ring.samplerate
+        self.start_frame = start_frame
+        self.max_frames = int(max_seconds * ring.samplerate) if max_seconds else None
+        self.on_block = on_block
+        self.block_size = block_size or ring.samplerate // 10
+        self.subtype = subtype
+
+        self.frames = 0
+        self.lost_frames = 0
+        self.started_at = None
+        self._preroll_frames = 0
+        self.error = None
+        self.stop_reason = None
+        self.finished = Completion()
+        self._end_frame = None
+        self._writer = None
+
+    @property
+    def recorded_seconds(self):
+        return self.frames / self.samplerate
+
+    @property
+    def preroll_seconds(self):
+        """Hvor meget lyd fra før start() optagelsen begyndte med"""
+        return self._preroll_frames / self.samplerate
+
+    def _finish(self, reason):
+        if self.stop_reason is None:
+            self.stop_reason = reason
+        self.finished.set()
+
+    def _write_loop(self):
+        cursor = self.start_frame
+        poll = self.block_size / self.samplerate / 4
+        try:
+            with sf.SoundFile(self.output_file, mode='w', samplerate=self.samplerate,
+                              channels=self.ring.channels, subtype=self.subtype) as f:
+                while True:
+                    end_frame = self._end_frame
+                    available = (end_frame if end_frame is not None else self.ring.written) - cursor
+                    if available < self.block_size and end_frame is None:
+                        time.sleep(poll)
+                        continue
+                    if available <= 0:
+                        break
+
+                    if cursor < self.ring.oldest:
+                        # Writer-tråden er sakket mere end hele ringen bagud
+                        self.lost_frames += self.ring.oldest - cursor
+                        cursor = self.ring.oldest
+                    end = cursor + min(available, self.block_size)
+                    if self.max_frames is not None:
+                        end = min(end, cursor + self.max_frames - self.frames)
+                    block = self.ring.read(cursor, end)
+                    cursor = end
+                    f.write(block)
+                    f.flush()
+                    self.frames += len(block)
+
+                    # Ved cap/on_block hører resten af ringen ikke til optagelsen
+                    if self.on_block is not None and self.on_block(block):
+                        self._finish("callback")
+                        break
+                    if self.max_frames is not None and self.frames >= self.max_frames:
+                        self._finish("cap")
+                        break
+        except Exception as e:
+            self.error = e
+            self._finish("error")
+
+    def start(self):
+        written, at = self.ring.clock
+        self._preroll_frames = max(0, self.ring.written - self.start_frame)
+        # time.monotonic() for optagelsens første frame (ringens ur, sample-præcist)
+        self.started_at = at - (written - self.start_frame) / self.samplerate
+        self._writer = threading.Thread(target=self._write_loop, name="recorder-writer", daemon=True)
+        self._writer.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Venter til optagelsen er færdig (cap, on_block eller fejl); True hvis færdig"""
+        return self.finished.wait(timeout)
+
+    async def wait_async(self):
+        """Som wait(), men awaitable - blokerer ikke event loop'et"""
+        await self.finished.wait_async()
+
+    def __await__(self):
+        """`await recording` venter til den er færdig og lukker filen; giver output_file"""
+        async def _finish_and_stop():
+            await self.finished.wait_async()
+            # Writer-tråden er på vej ud; join + luk filen uden for event loop'et
+            return await asyncio.to_thread(self.stop)
+        return _finish_and_stop().__await__()
+
+    def stop(self, reason="stopped"):
+        """Stopper ved den aktuelle position, skriver resten og lukker filen"""
+        if self._end_frame is None:
+            self._end_frame = self.ring.written
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        self._finish(reason)
+        if self.error is not None:
+            raise self.error
+        return self.output_file
+
+
+class CaptureStream:
+    """
+    Altid-åben InputStream der fylder en pre-roll ring, som optagelser læser fra.
+
+    Streamen åbnes én gang og holdes åben mellem interaktioner, så der hverken er
+    device-opslag eller stream-åbning i den kritiske vej, og en optagelse kan starte
+    med lyd fra før den blev bedt om (f.eks. fra før svarmode blev opdaget).
+
+    Args:
+        device (int): Input device index
+        samplerate (int): Sample rate
+        channels (int): Antal kanaler
+        preroll_seconds (float): Hvor mange sekunders historik ringen rummer
+        block_size (int): Stream-blokstørrelse i frames (default 20 ms)
+    """
+
+    def __init__(self, device, samplerate, channels, preroll_seconds=CAPTURE_PREROLL_SECONDS,
+                 block_size=None):
+        self.device = device
+        self.name = f"device {device}"
+        self.samplerate = samplerate
+        self.channels = channels
+        self.block_size = block_size or samplerate // 50
+        # Ringen skal både rumme pre-roll og give writer-tråden luft til at sakke bagud
+        capacity = int((preroll_seconds + 5) * samplerate)
+        self.ring = FrameRing(capacity, channels, samplerate)
+        self.health = get_stream_health(f"capture:{device}")
+        self._stream = None
+
+    @property
+    def active(self):
+        return self._stream is not None and self._stream.active
+
+    def _callback(self, indata, frames, time_info, status):
+        self.health.record(status)
+        self.ring.write(indata)
+
+    def start(self):
+        if self._stream is None:
+            self._stream = sd.InputStream(samplerate=self.samplerate, device=self.device,
+                                          channels=self.channels, dtype='float32',
+                                          blocksize=self.block_size, callback=self._callback)
+            self._stream.start()
+        return self
+
+    def record(self, output_file, since=None, max_seconds=None, on_block=None, subtype=RECORDING_SUBTYPE):
+        """
+        Starter en optagelse - kun en pointer-operation i ringen.
+
+        Args:
+            since (float): time.monotonic()-tidspunkt optagelsen skal starte ved; kan ligge
+                op til preroll_seconds tilbage. None = nu.
+
+        Returns:
+            RingRecording: Kørende optagelse (wait()/stop())
+        """
+        start_frame = self.ring.written if since is None else self.ring.frame_at(since)
+        return RingRecording(self.ring, output_file, start_frame, max_seconds=max_seconds,
+                             on_block=on_block, subtype=subtype).start()
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+
+_capture_streams = {}
+
+
+def get_capture_stream(device, samplerate, channels, preroll_seconds=CAPTURE_PREROLL_SECONDS):
+    """Returnerer den åbne CaptureStream for et device, og åbner den første gang"""
+    key = (device, samplerate, channels)
+    stream = _capture_streams.get(key)
+    if stream is None or not stream.active:
+        stream = CaptureStream(device, samplerate, channels, preroll_seconds=preroll_seconds).start()
+        _capture_streams[key] = stream
+    return stream
+
+
+def close_capture_streams():
+    """Lukker alle åbne capture-streams (ved programmets afslutning)"""
+    for stream in _capture_streams.values():
+        stream.close()
+    _capture_streams.clear()
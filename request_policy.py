@@ -0,0 +1,186 @@
+import os
+import re
+import json
+from urllib.parse import urlsplit
+from config import REQUEST_POLICY, REQUEST_SIZE_CACHE
+
+
+# Resource types oversat til URL-mønstre: browseren blokerer kun på URL. Kun filendelser -
+# et værtsmønster (f.eks. googleusercontent.com) ville også ramme lyd og andre ressourcer
+RESOURCE_TYPE_PATTERNS = {
+    "image": ["*.png", "*.png?*", "*.jpg", "*.jpg?*", "*.jpeg", "*.jpeg?*", "*.gif", "*.gif?*",
+              "*.webp", "*.webp?*", "*.ico", "*.ico?*", "*.svg", "*.svg?*"],
+    "font": ["*.woff", "*.woff?*", "*.woff2", "*.woff2?*", "*.ttf", "*.ttf?*", "*.otf", "*.otf?*",
+             "*fonts.gstatic.com/*"],
+}
+
+
+def _compile(pattern):
+    """Wildcard-mønster som Chromium matcher det: * er alt, resten er bogstaveligt, hele URL'en"""
+    return re.compile(".*".join(re.escape(part) for part in pattern.split("*")), re.DOTALL)
+
+
+def _size_key(url):
+    """Nøgle til størrelsestabellen: URL uden query, så cache-busters ikke splitter den op"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+class RequestPolicy:
+    """
+    Blokerer ressourcer automationen ikke bruger (billeder, fonte, analytics, telemetri)
+    og tæller hvad der blev sparet.
+
+    Blokeringen sker i browseren med CDP Network.setBlockedURLs per side - ikke med
+    context.route, som slår HTTP-cachen fra og sender hver request en tur forbi
+    Python. Alt der ikke matcher går derfor direkte gennem den persistente profils
+    cache. Browseren blokerer kun på URL, så resource types oversættes til
+    URL-mønstre (RESOURCE_TYPE_PATTERNS), og der er ingen undtagelser: et mønster
+    rammer alle URL'er det matcher.
+
+    Størrelsen af blokerede requests kendes naturligvis ikke, så sparede bytes
+    estimeres fra en størrelsestabel der læres i kørsler uden blokering (--no-block)
+    og gemmes i REQUEST_SIZE_CACHE.
+
+    Args:
+        block_resource_types (list): Resource types der blokeres (nøgler i RESOURCE_TYPE_PATTERNS)
+        block_url_patterns (list): Wildcard-mønstre (*) for URL'er der blokeres
+        enabled (bool): False = bloker intet, men mål hvad der ville være blokeret
+        name (str): Navn brugt i log (f.eks. sessionens navn)
+    """
+
+    def __init__(self, block_resource_types=None, block_url_patterns=None,
+                 enabled=True, name="browser", size_cache=REQUEST_SIZE_CACHE, debug_mode=False):
+        self.block_resource_types = list(block_resource_types or [])
+        self.block_url_patterns = list(block_url_patterns or [])
+        self.patterns = list(dict.fromkeys(
+            [pattern for resource_type in self.block_resource_types
+             for pattern in RESOURCE_TYPE_PATTERNS.get(resource_type, [])]
+            + self.block_url_patterns))
+        self._matchers = [_compile(pattern) for pattern in self.patterns]
+        self.enabled = enabled
+        self.name = name
+        self.size_cache = size_cache
+        self.debug_mode = debug_mode
+        self.known_sizes = self._load_sizes()
+        self._pages = set()
+
+        self.requests = 0
+        self.blocked = 0
+        self.blocked_by_type = {}
+        self.saved_bytes = 0
+        self.unknown_size = 0
+        self.would_block_bytes = 0
+
+    @classmethod
+    def from_config(cls, enabled=None, name="browser", debug_mode=False):
+        """Opretter en policy ud fra REQUEST_POLICY i config"""
+        return cls(
+            block_resource_types=REQUEST_POLICY.get("block_resource_types"),
+            block_url_patterns=REQUEST_POLICY.get("block_url_patterns"),
+            enabled=REQUEST_POLICY.get("enabled", True) if enabled is None else enabled,
+            name=name,
+            debug_mode=debug_mode,
+        )
+
+    def _load_sizes(self):
+        if not self.size_cache or not os.path.exists(self.size_cache):
+            return {}
+        try:
+            with open(self.size_cache, "r") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def save_sizes(self):
+        """Gemmer størrelsestabellen så senere kørsler kan estimere sparede bytes"""
+        if not self.size_cache:
+            return
+        try:
+            with open(self.size_cache, "w") as f:
+                json.dump(self.known_sizes, f, indent=1, sort_keys=True)
+        except Exception as e:
+            if self.debug_mode:
+                print(f"DEBUG: Could not save {self.size_cache}: {e}")
+
+    def should_block(self, url):
+        """True hvis URL'en matcher et af mønstrene browseren blokerer"""
+        return any(matcher.fullmatch(url) for matcher in self._matchers)
+
+    def _on_request(self, request):
+        self.requests += 1
+
+    def _on_request_failed(self, request):
+        if request.failure != "net::ERR_BLOCKED_BY_CLIENT":
+            return
+        self.blocked += 1
+        self.blocked_by_type[request.resource_type] = self.blocked_by_type.get(request.resource_type, 0) + 1
+        size = self.known_sizes.get(_size_key(request.url))
+        if size is None:
+            self.unknown_size += 1
+        else:
+            self.saved_bytes += size
+        if self.debug_mode:
+            print(f"DEBUG: [{self.name}] Blocked {request.resource_type} {request.url[:100]}")
+
+    async def _on_request_finished(self, request):
+        # Kun requests policy'en ville blokere måles; det koster en CDP-rundtur per request
+        if not self.should_block(request.url):
+            return
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        size = sizes.get("responseBodySize", 0) + sizes.get("responseHeadersSize", 0)
+        self.known_sizes[_size_key(request.url)] = size
+        self.would_block_bytes += size
+
+    async def attach_page(self, page):
+        """Sætter blokeringen på én side (én gang per side)"""
+        if id(page) in self._pages:
+            return
+        self._pages.add(id(page))
+        session = await page.context.new_cdp_session(page)
+        await session.send("Network.enable")
+        await session.send("Network.setBlockedURLs", {"urls": self.patterns})
+
+    async def attach(self, context):
+        """
+        Installerer policy'en på en browser-context: dens nuværende sider nu, og nye
+        sider når de åbnes. Kald attach_page direkte på en ny side der skal navigere
+        med det samme, så blokeringen er sat før første request.
+        """
+        if self.enabled:
+            context.on("request", self._on_request)
+            context.on("requestfailed", self._on_request_failed)
+            context.on("page", self.attach_page)
+            for page in context.pages:
+                await self.attach_page(page)
+        else:
+            context.on("requestfinished", self._on_request_finished)
+        if self.debug_mode:
+            state = "enabled" if self.enabled else "measuring only"
+            print(f"DEBUG: [{self.name}] Request policy {state}")
+
+    def summary(self):
+        """Returnerer tællerne som en dict (til log og metrics)"""
+        return {
+            "enabled": self.enabled,
+            "allowed": self.requests - self.blocked,
+            "blocked": self.blocked,
+            "blocked_by_type": dict(self.blocked_by_type),
+            "saved_bytes": self.saved_bytes,
+            "blocked_unknown_size": self.unknown_size,
+            "would_block_bytes": self.would_block_bytes,
+        }
+
+    def print_summary(self):
+        if self.enabled:
+            by_type = ", ".join(f"{t}: {n}" for t, n in sorted(self.blocked_by_type.items()))
+            print(f"[{self.name}] Blocked {self.blocked} of {self.requests} requests "
+                  f"({by_type or 'none'}), ~{self.saved_bytes / 1024:.0f} KiB saved"
+                  + (f", {self.unknown_size} of unknown size" if self.unknown_size else ""))
+        else:
+            print(f"[{self.name}] Request blocking disabled - "
+                  f"{self.would_block_bytes / 1024:.0f} KiB would have been blocked")
+        self.save_sizes()
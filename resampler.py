@@ -0,0 +1,196 @@
+import time
+from math import gcd
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Taps per polyfase-gren; 32 giver > 80 dB stopbånd med Kaiser beta 8.6
+TAPS_PER_PHASE = 32
+KAISER_BETA = 8.6
+ROLLOFF = 0.94  # cutoff som andel af den laveste Nyquist-frekvens
+
+
+class PolyphaseResampler:
+    """
+    Blok-baseret rationel resampler (from_rate -> to_rate = up/down) i ren NumPy.
+
+    Et Kaiser-vinduet sinc-filter deles i up polyfase-grene á TAPS_PER_PHASE taps, og
+    hver output-sample er ét prikprodukt med den gren dens fase peger på. Mellem
+    blokke gemmes kun de sidste TAPS_PER_PHASE - 1 input-samples og output-tælleren,
+    så lyd kan resamples blok for blok - også fra en playback- eller capture-callback -
+    uden kanteffekter ved blokgrænserne. Arbejdet per blok er O(frames * taps) og
+    hukommelsen konstant; modsat FFT-resampling af hele signalet.
+
+    Output er tidsjusteret med input: output-frame n svarer til input-tid n * from/to.
+    Prisen er en fast latens på `latency` input-samples (filterets halve længde), som
+    skal være kommet før de tilsvarende output-frames kan beregnes; flush() giver resten.
+
+    Args:
+        from_rate (int): Input sample rate
+        to_rate (int): Output sample rate
+        channels (int): Antal kanaler
+    """
+
+    def __init__(self, from_rate, to_rate, channels=1, taps_per_phase=TAPS_PER_PHASE, dtype='float32'):
+        divisor = gcd(int(from_rate), int(to_rate))
+        self.up = int(to_rate) // divisor
+        self.down = int(from_rate) // divisor
+        self.channels = channels
+        self.taps = taps_per_phase
+        self.dtype = np.dtype(dtype)
+
+        # Ulige længde giver et helt center, så output kan tidsjusteres præcist
+        length = self.taps * self.up - 1
+        cutoff = ROLLOFF * 0.5 / max(self.up, self.down)  # cykler per sample ved up * from_rate
+        n = np.arange(length) - (length - 1) / 2
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, KAISER_BETA) * self.up
+        prototype = np.append(prototype, 0.0)
+        # phases[p, k] = h[p + (taps - 1 - k) * up]: vendt, så grenen ganges direkte på
+        # vinduet x[base - taps + 1 .. base]
+        self.phases = prototype.reshape(self.taps, self.up).T[:, ::-1].astype(self.dtype)
+        self.center = (length - 1) // 2
+        self.latency = self.center / self.up
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros((self.taps - 1, self.channels), dtype=self.dtype)
+        self._offset = -(self.taps - 1)  # absolut input-index for _history[0]
+        self._next = 0                   # næste output-index
+        self._mono = False               # seneste blok var mono (1-D); flush() giver samme form
+
+    def output_frames(self, input_frames):
+        """Antal output-frames process() giver for de næste input_frames"""
+        end = self._offset + len(self._history) + input_frames
+        return max(0, self._stop(end) - self._next)
+
+    def _stop(self, end):
+        # Første output hvis seneste input-sample (base) endnu ikke er kommet
+        return -(-(end * self.up - self.center) // self.down)
+
+    def process(self, block):
+        """
+        Resampler én blok (frames x kanaler eller mono) og returnerer de output-frames
+        der nu kan beregnes. Mono ind giver mono ud.
+        """
+        block = np.asarray(block, dtype=self.dtype)
+        mono = self._mono = block.ndim == 1
+        if mono:
+            block = block.reshape(-1, 1)
+        if len(block) == 0:
+            # Tom blok (f.eks. fra en callback uden nye data): intet nyt at beregne
+            return np.zeros((0,) if mono else (0, self.channels), dtype=self.dtype)
+        buffer = np.concatenate((self._history, block))
+        end = self._offset + len(buffer)  # første input-index der endnu ikke er kommet
+
+        stop = max(self._stop(end), self._next)
+        positions = np.arange(self._next, stop, dtype=np.int64) * self.down + self.center
+        bases = positions // self.up - self._offset
+        coefficients = self.phases[positions % self.up]
+
+        # (outputs, kanaler, taps)-vinduer ind i bufferen; ét batch-prikprodukt per output
+        windows = sliding_window_view(buffer, self.taps, axis=0)[bases - (self.taps - 1)]
+        output = np.matmul(windows, coefficients[:, :, None])[:, :, 0]
+
+        self._next = stop
+        self._history = buffer[len(buffer) - (self.taps - 1):]
+        self._offset = end - (self.taps - 1)
+        return output[:, 0] if mono else output
+
+    def flush(self):
+        """Skubber filterets forsinkelse ud med stilhed (efter sidste blok), i samme form som input"""
+        padding = int(np.ceil(self.latency)) + 1
+        shape = (padding,) if self._mono else (padding, self.channels)
+        return self.process(np.zeros(shape, dtype=self.dtype))
+
+
+def resample(data, from_rate, to_rate, block_size=8192):
+    """
+    Resampler et helt signal blokvis og fjerner filterets forsinkelse.
+
+    Returnerer ceil(len(data) * to_rate / from_rate) frames, justeret i tid med input
+    (samme kontrakt som scipy.signal.resample, uden FFT over hele signalet).
+    """
+    data = np.asarray(data)
+    if int(from_rate) == int(to_rate):
+        return data
+    mono = data.ndim == 1
+    frames = data.reshape(len(data), -1)
+    resampler = PolyphaseResampler(from_rate, to_rate, frames.shape[1],
+                                   dtype=np.float64 if data.dtype == np.float64 else np.float32)
+    chunks = [resampler.process(frames[start:start + block_size])
+              for start in range(0, len(frames), block_size)]
+    chunks.append(resampler.flush())
+    length = -(-len(frames) * resampler.up // resampler.down)
+    output = np.concatenate(chunks)[:length]
+    return output[:, 0] if mono else output
+
+
+def _scipy_resample(data, from_rate, to_rate):
+    """Den tidligere vej i audio_prep: FFT-resampling af hele signalet, kanal for kanal"""
+    import scipy.signal
+    num_samples = int(len(data) * to_rate / from_rate)
+    output = np.zeros((num_samples, data.shape[1]))
+    for channel in range(data.shape[1]):
+        output[:, channel] = scipy.signal.resample(data[:, channel], num_samples)
+    return output
+
+
+def benchmark(seconds=30.0, channels=2, repeats=3):
+    """Sammenligner tid, peak-hukommelse og kvalitet med scipy-vejen for typiske TTS-rater"""
+    import tracemalloc
+
+    try:
+        import scipy.signal  # noqa: F401
+        have_scipy = True
+    except ImportError:
+        have_scipy = False
+        print("scipy er ikke installeret - måler kun polyfase-resampleren")
+
+    for from_rate, to_rate in ((44100, 48000), (24000, 48000)):
+        # Skæv længde og frekvens, som en rigtig TTS-fil (ikke et helt antal perioder)
+        frequency = 997.3
+        t = np.arange(int(seconds * from_rate) + 4321) / from_rate
+        tone = 0.5 * np.sin(2 * np.pi * frequency * t)
+        data = np.repeat(tone[:, None], channels, axis=1)
+        expected = 0.5 * np.sin(2 * np.pi * frequency * np.arange(-(-len(t) * to_rate // from_rate)) / to_rate)
+
+        print(f"\n{from_rate} -> {to_rate} Hz, {seconds:.0f}s, {channels} kanaler")
+        methods = [("polyphase", lambda: resample(data, from_rate, to_rate))]
+        if have_scipy:
+            methods.append(("scipy", lambda: _scipy_resample(data, from_rate, to_rate)))
+        for name, method in methods:
+            timings = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                output = method()
+                timings.append(time.perf_counter() - started)
+            tracemalloc.start()
+            method()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            # Fejl målt midt i signalet (uden kanterne, hvor FFT-vejen ringer)
+            middle = slice(to_rate, len(expected) - to_rate)
+            error = output[middle, 0] - expected[middle]
+            snr = 10 * np.log10(np.mean(expected[middle] ** 2) / max(np.mean(error ** 2), 1e-20))
+            edge = np.abs(output[:to_rate // 100, 0] - expected[:to_rate // 100]).max()
+            print(f"  {name:10s} {min(timings) * 1000:8.1f} ms  peak {peak / 1e6:7.1f} MB  "
+                  f"SNR {snr:5.1f} dB  kantfejl {edge:.4f}")
+
+    # Callback-brug: én 20 ms blok ad gangen
+    resampler = PolyphaseResampler(44100, 48000, channels)
+    block = np.zeros((882, channels), dtype=np.float32)
+    started = time.perf_counter()
+    for _ in range(500):
+        resampler.process(block)
+    per_block = (time.perf_counter() - started) / 500
+    print(f"\nPolyphase per 20 ms blok (44.1 -> 48 kHz): {per_block * 1e6:.0f} µs")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark af polyfase-resampleren mod scipy.signal.resample")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Længde af testsignalet")
+    parser.add_argument("--channels", type=int, default=2, help="Antal kanaler")
+    args = parser.parse_args()
+    benchmark(args.seconds, args.channels)
@@ -0,0 +1,187 @@
+import os
+import json
+import numpy as np
+import soundfile as sf
+from config import SEGMENT_SETTINGS, RECORDING_SUBTYPE
+
+
+def _db(value):
+    """Lineær amplitude -> dBFS (stilhed giver None i stedet for -inf)"""
+    return round(20 * float(np.log10(value)), 2) if value > 0 else None
+
+
+class UtteranceSegmenter:
+    """
+    Deler en optagelse op i ytringer mens den optages - uden en ekstra gennemgang bagefter.
+
+    Blokkene fra optagelsen deles i korte frames, og frame-energien regnes vektoriseret
+    for hele blokken på én gang. Sammenhængende tale (med pauser kortere end
+    min_silence_seconds) skrives til sin egen fil, <optagelse>_segNN.wav, med
+    padding_seconds stilhed før og efter. Ytringer med mindre tale end
+    min_segment_seconds kasseres. finish() skriver indekset <optagelse>.segments.json
+    med start/slut (sekunder og frames i forhold til optagelsens start), RMS og peak
+    (dBFS) per ytring.
+
+    feed() kaldes fra optagelsens writer-tråd, ikke fra audio-callback'en.
+
+    Args:
+        output_file (str): Optagelsens fil; ytringer og indeks får samme navn som basis
+        samplerate (int): Sample rate
+        channels (int): Antal kanaler
+        threshold_db (float): Energi i dBFS over hvilken en frame er tale
+        min_silence_seconds (float): Pause der afslutter en ytring
+        min_segment_seconds (float): Mindste mængde tale i en ytring der gemmes
+        padding_seconds (float): Stilhed der medtages før og efter hver ytring
+        frame_ms (float): Frame-længde i millisekunder
+    """
+
+    def __init__(self, output_file, samplerate, channels, threshold_db=None, min_silence_seconds=None,
+                 min_segment_seconds=None, padding_seconds=None, frame_ms=None, subtype=RECORDING_SUBTYPE):
+        settings = SEGMENT_SETTINGS
+        threshold_db = settings["threshold_db"] if threshold_db is None else threshold_db
+        min_silence_seconds = settings["min_silence_seconds"] if min_silence_seconds is None else min_silence_seconds
+        min_segment_seconds = settings["min_segment_seconds"] if min_segment_seconds is None else min_segment_seconds
+        padding_seconds = settings["padding_seconds"] if padding_seconds is None else padding_seconds
+        frame_ms = settings["frame_ms"] if frame_ms is None else frame_ms
+
+        self.base = os.path.splitext(output_file)[0]
+        self.index_file = self.base + ".segments.json"
+        self.samplerate = samplerate
+        self.channels = channels
+        self.subtype = subtype
+        self.threshold = 10 ** (threshold_db / 20)
+        self.frame_length = max(1, int(samplerate * frame_ms / 1000))
+        self.min_silence = int(min_silence_seconds * samplerate)
+        self.min_speech = int(min_segment_seconds * samplerate)
+        self.padding = int(padding_seconds * samplerate)
+
+        self.position = 0        # frames behandlet (absolut i optagelsen)
+        self.segments = []
+        self._remainder = np.zeros((0, channels), dtype=np.float32)
+        self._history = np.zeros((0, channels), dtype=np.float32)  # stilhed før en ytring
+        self._current = None
+
+    def feed(self, block):
+        """Fodrer en blok (frames x kanaler) ind; returnerer altid False (stopper ikke optagelsen)"""
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim == 1:
+            block = block.reshape(-1, 1)
+        if len(self._remainder):
+            block = np.concatenate((self._remainder, block))
+
+        usable = len(block) - len(block) % self.frame_length
+        self._remainder = block[usable:]
+        if usable == 0:
+            return False
+
+        # Tale/stilhed per frame for hele blokken på én gang
+        frames = block[:usable].reshape(-1, self.frame_length, block.shape[1])
+        mono = frames.mean(axis=2)
+        voiced = np.sqrt(np.mean(mono * mono, axis=1)) > self.threshold
+
+        # Gennemløb sammenhængende serier af tale/stilhed, ikke enkelte frames
+        edges = np.flatnonzero(np.diff(voiced)) + 1
+        starts = np.concatenate(([0], edges)) * self.frame_length
+        ends = np.concatenate((edges, [len(voiced)])) * self.frame_length
+        for start, end, is_voiced in zip(starts, ends, voiced[np.concatenate(([0], edges))]):
+            run = block[start:end]
+            if is_voiced:
+                self._speech(run)
+            else:
+                self._silence(run)
+            self.position += len(run)
+        return False
+
+    def _speech(self, run):
+        current = self._current
+        if current is None:
+            start = self.position - len(self._history)
+            path = f"{self.base}_seg{len(self.segments) + 1:02d}.wav"
+            current = self._current = {
+                "file": path,
+                "start_frame": start,
+                "speech_frames": 0,
+                "pending": [],
+                "pending_frames": 0,
+                "sum_squares": 0.0,
+                "samples": 0,
+                "peak": 0.0,
+                "writer": sf.SoundFile(path, mode='w', samplerate=self.samplerate,
+                                       channels=self.channels, subtype=self.subtype),
+            }
+            self._write(self._history)
+            self._history = self._history[:0]
+        else:
+            # Pausen var kort nok til at høre med til ytringen
+            for pending in current["pending"]:
+                self._write(pending)
+            current["pending"] = []
+            current["pending_frames"] = 0
+        self._write(run)
+        current["speech_frames"] += len(run)
+
+    def _silence(self, run):
+        current = self._current
+        if current is None:
+            self._history = np.concatenate((self._history, run))[-self.padding:] if self.padding else self._history
+            return
+        current["pending"].append(run)
+        current["pending_frames"] += len(run)
+        if current["pending_frames"] >= self.min_silence:
+            self._close()
+
+    def _write(self, data):
+        if not len(data):
+            return
+        current = self._current
+        current["writer"].write(data)
+        current["sum_squares"] += float(np.dot(data.ravel(), data.ravel()))
+        current["samples"] += data.size
+        current["peak"] = max(current["peak"], float(np.abs(data).max()))
+
+    def _close(self):
+        """Afslutter den aktuelle ytring med padding; resten af pausen bliver historik"""
+        current = self._current
+        tail = np.concatenate(current["pending"]) if current["pending"] else self._history[:0]
+        self._write(tail[:self.padding])
+        self._history = tail[-self.padding:] if self.padding else tail[:0]
+        current["writer"].close()
+        self._current = None
+
+        written = current["samples"] // self.channels
+        if current["speech_frames"] < self.min_speech:
+            os.remove(current["file"])
+            return
+        end = current["start_frame"] + written
+        self.segments.append({
+            "index": len(self.segments) + 1,
+            "file": os.path.basename(current["file"]),
+            "start": round(current["start_frame"] / self.samplerate, 4),
+            "end": round(end / self.samplerate, 4),
+            "start_frame": int(current["start_frame"]),
+            "end_frame": int(end),
+            "speech_seconds": round(current["speech_frames"] / self.samplerate, 3),
+            "rms_db": _db(np.sqrt(current["sum_squares"] / current["samples"])),
+            "peak_db": _db(current["peak"]),
+        })
+
+    def finish(self):
+        """
+        Afslutter en igangværende ytring og skriver indekset.
+
+        Returns:
+            list: Ytringerne som de står i indekset
+        """
+        if self._current is not None:
+            if len(self._remainder):
+                self._current["pending"].append(self._remainder)
+            self._close()
+        index = {
+            "samplerate": self.samplerate,
+            "channels": self.channels,
+            "duration": round((self.position + len(self._remainder)) / self.samplerate, 4),
+            "segments": self.segments,
+        }
+        with open(self.index_file, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        return self.segments
@@ -0,0 +1,247 @@
+import asyncio
+import json
+import time
+import traceback
+from config import NOTEBOOK_URL, AUDIO_DEVICE_PAIRS, RECORDING_DURATION, QUESTION_INJECTION, ANSWER_CAPTURE
+from browser import interactive_flow
+from audio_engine import close_audio_engines
+from encoder import close_encoder_pool
+from stream_health import print_stream_health_summary
+from browser_session import load_storage_state, check_cookie_expiry
+from page_audio import INJECTION_CHROMIUM_ARGS, install_question_injector, attach_answer_capture
+from podcast_state import attach_podcast_state
+from setup_flow import run_setup_sequence
+from request_policy import RequestPolicy
+
+# Init-script der binder en sides mikrofon og højttaler til bestemte devices (matchet på
+# label), så parallelle sessioner i samme browser ikke deler lydvej.
+DEVICE_ROUTING_SCRIPT = """
+(routing) => {
+    const findDevice = async (kind, label) => {
+        if (!label) {
+            return null;
+        }
+        const devices = await navigator.mediaDevices.enumerateDevices();
+        const match = devices.find((d) => d.kind === kind && d.label.includes(label));
+        return match ? match.deviceId : null;
+    };
+
+    const originalGetUserMedia = navigator.mediaDevices.getUserMedia.bind(navigator.mediaDevices);
+    navigator.mediaDevices.getUserMedia = async (constraints) => {
+        if (constraints && constraints.audio && routing.microphone) {
+            const deviceId = await findDevice('audioinput', routing.microphone);
+            if (deviceId) {
+                const audio = typeof constraints.audio === 'object' ? constraints.audio : {};
+                constraints = { ...constraints, audio: { ...audio, deviceId: { exact: deviceId } } };
+            }
+        }
+        return originalGetUserMedia(constraints);
+    };
+
+    if (routing.speaker) {
+        const routeSink = async (target) => {
+            const sinkId = await findDevice('audiooutput', routing.speaker);
+            if (sinkId && typeof target.setSinkId === 'function') {
+                await target.setSinkId(sinkId);
+            }
+        };
+        const OriginalAudioContext = window.AudioContext;
+        window.AudioContext = function (...args) {
+            const context = new OriginalAudioContext(...args);
+            routeSink(context);
+            return context;
+        };
+        window.AudioContext.prototype = OriginalAudioContext.prototype;
+        document.addEventListener('play', (event) => routeSink(event.target), true);
+    }
+}
+"""
+
+
+class PodcastSession:
+    """En browser-context med sin egen NotebookLM-side og sit eget device-par"""
+
+    def __init__(self, name, device_pair, debug_mode=False, injection=QUESTION_INJECTION,
+                 capture=ANSWER_CAPTURE, block_requests=None):
+        self.name = name
+        self.playback_device = device_pair["playback"]
+        self.capture_device = device_pair["capture"]
+        self.browser_microphone = device_pair.get("browser_microphone")
+        self.browser_speaker = device_pair.get("browser_speaker")
+        self.debug_mode = debug_mode
+        self.injection = injection
+        self.capture = capture
+        self.context = None
+        self.page = None
+        self.completed = 0
+        self.request_policy = RequestPolicy.from_config(enabled=block_requests, name=name,
+                                                        debug_mode=debug_mode)
+
+    async def start(self, browser, notebook_url=NOTEBOOK_URL, storage_state=None):
+        """Opretter sessionens context og side og sætter den i Interactive mode"""
+        # Fuld storage_state (cookies og localStorage) i stedet for kun cookies
+        self.context = await browser.new_context(permissions=["microphone"],
+                                                 storage_state=storage_state)
+        await self.request_policy.attach(self.context)
+
+        # Med Web Audio-injektion har hver side allerede sin egen mikrofon
+        microphone = None if self.injection == "webaudio" else self.browser_microphone
+        routing = {"microphone": microphone, "speaker": self.browser_speaker}
+        await self.context.add_init_script(
+            script=f"({DEVICE_ROUTING_SCRIPT})({json.dumps(routing)})")
+
+        self.page = await self.context.new_page()
+        await self.request_policy.attach_page(self.page)
+        await attach_podcast_state(self.page, debug_mode=self.debug_mode)
+        if self.injection == "webaudio":
+            await install_question_injector(self.page)
+        if self.capture == "page":
+            await attach_answer_capture(self.page, debug_mode=self.debug_mode)
+        await run_setup_sequence(self.page, debug_mode=self.debug_mode, url=notebook_url)
+        print(f"[{self.name}] Ready ({self.playback_device} -> {self.capture_device})")
+
+    async def ask(self, tts_file, record_duration=RECORDING_DURATION, monitor=False):
+        """Stiller ét spørgsmål og returnerer stien til optagelsen (eller None)"""
+        return await interactive_flow(
+            self.page, tts_file,
+            record_duration=record_duration,
+            monitor=monitor,
+            debug_mode=self.debug_mode,
+            playback_device=self.playback_device,
+            capture_device=self.capture_device,
+            session_name=self.name,
+            injection=self.injection,
+            capture=self.capture,
+        )
+
+    async def close(self):
+        if self.context is not None:
+            await self.context.close()
+
+
+class SessionPool:
+    """
+    Kører flere interaktive podcasts parallelt, én session per konfigureret device-par.
+
+    Spørgsmål lægges i en fælles kø; hver session har sin egen worker der henter næste
+    spørgsmål så snart sessionen er ledig.
+    """
+
+    def __init__(self, device_pairs=None, debug_mode=False, injection=QUESTION_INJECTION,
+                 capture=ANSWER_CAPTURE, block_requests=None):
+        device_pairs = device_pairs or AUDIO_DEVICE_PAIRS
+        self.sessions = [PodcastSession(f"session{i + 1}", pair, debug_mode=debug_mode,
+                                        injection=injection, capture=capture,
+                                        block_requests=block_requests)
+                         for i, pair in enumerate(device_pairs)]
+        self.debug_mode = debug_mode
+        self.queue = asyncio.Queue()
+        self.results = []
+
+    async def start(self, browser, notebook_url=NOTEBOOK_URL, storage_state=None):
+        """Starter alle sessioner samtidig; sessioner der fejler opsætningen udelades"""
+        outcomes = await asyncio.gather(*(s.start(browser, notebook_url, storage_state) for s in self.sessions),
+                                        return_exceptions=True)
+        ready = []
+        for session, outcome in zip(self.sessions, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"[{session.name}] Setup failed: {outcome}")
+                await session.close()
+            else:
+                ready.append(session)
+        self.sessions = ready
+        if not self.sessions:
+            raise RuntimeError("No sessions could be set up")
+        return self.sessions
+
+    def submit(self, tts_file):
+        """Lægger et spørgsmål i køen"""
+        self.queue.put_nowait(tts_file)
+
+    async def _worker(self, session, record_duration, monitor):
+        while True:
+            tts_file = await self.queue.get()
+            try:
+                started = time.monotonic()
+                print(f"[{session.name}] Asking {tts_file}")
+                recording_file = await session.ask(tts_file, record_duration, monitor)
+                session.completed += 1
+                self.results.append({
+                    "session": session.name,
+                    "question": tts_file,
+                    "recording": recording_file,
+                    "seconds": round(time.monotonic() - started, 3),
+                })
+            except Exception as e:
+                print(f"[{session.name}] Error asking {tts_file}: {e}")
+                if self.debug_mode:
+                    print(f"DEBUG: Traceback: {traceback.format_exc()}")
+                self.results.append({"session": session.name, "question": tts_file,
+                                     "recording": None, "error": str(e)})
+            finally:
+                self.queue.task_done()
+
+    async def run(self, record_duration=RECORDING_DURATION, monitor=False):
+        """Kører indtil køen er tom og returnerer en resultat-dict per spørgsmål"""
+        workers = [asyncio.create_task(self._worker(s, record_duration, monitor))
+                   for s in self.sessions]
+        try:
+            await self.queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return self.results
+
+    async def close(self):
+        await asyncio.gather(*(s.close() for s in self.sessions), return_exceptions=True)
+
+
+async def run_session_pool(questions, device_pairs=None, record_duration=RECORDING_DURATION,
+                           debug_mode=False, headless=False, notebook_url=NOTEBOOK_URL,
+                           injection=QUESTION_INJECTION, capture=ANSWER_CAPTURE, block_requests=None,
+                           use_auth=True):
+    """
+    Starter en browser, kører alle spørgsmål gennem en SessionPool og printer et resumé.
+
+    Med use_auth=False (kørsler mod mocken) får sessionerne tomme contexts: auth.json
+    hverken læses, tjekkes eller sendes med.
+    """
+    from playwright.async_api import async_playwright
+
+    storage_state = None
+    if use_auth:
+        storage_state = load_storage_state()
+        if storage_state is None:
+            print("Warning: auth.json not found - login will be required")
+        check_cookie_expiry(storage_state, debug_mode=debug_mode)
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(
+            headless=headless,
+            args=[
+                "--use-fake-ui-for-media-stream",
+                "--autoplay-policy=no-user-gesture-required",
+                *(INJECTION_CHROMIUM_ARGS if injection == "webaudio" else []),
+            ]
+        )
+        pool = SessionPool(device_pairs, debug_mode=debug_mode, injection=injection, capture=capture,
+                           block_requests=block_requests)
+        try:
+            await pool.start(browser, notebook_url, storage_state)
+            for tts_file in questions:
+                pool.submit(tts_file)
+            results = await pool.run(record_duration=record_duration)
+        finally:
+            await pool.close()
+            await browser.close()
+            close_audio_engines()
+            close_encoder_pool()
+
+    print(f"\n=== {len(results)} spørgsmål besvaret af {len(pool.sessions)} sessioner ===")
+    for result in results:
+        print(f"   [{result['session']}] {result['question']} -> {result['recording']}")
+    for session in pool.sessions:
+        session.request_policy.print_summary()
+    print_stream_health_summary()
+    return results
@@ -0,0 +1,139 @@
+import time
+from config import NOTEBOOK_URL, PODCAST_NAME, SETUP_STEP_TIMEOUTS
+
+# Selectors brugt under opsætningen af Interactive mode
+NOTEBOOK_SELECTOR = f"text={PODCAST_NAME}"
+INTERACTIVE_MODE_SELECTOR = "text=Interactive mode"
+PLAY_AUDIO_SELECTOR = 'button[aria-label="Play audio"]'
+JOIN_SELECTOR = 'button:has-text("Join")'
+SPEAKING_ANIMATION_SELECTOR = ".user-speaking-animation"
+
+
+class SetupStep:
+    """
+    Et trin i opsætningen: en handling efterfulgt af en konkret readiness-betingelse.
+
+    Args:
+        name (str): Trinnets navn (bruges i log og timings)
+        description (str): Tekst der printes når trinnet starter
+        action: async fn(page, timeout_ms) der udfører trinnet
+        ready: async fn(page, timeout_ms) der returnerer når næste trin kan starte
+        timeout (float): Timeout i sekunder for både handling og readiness
+    """
+
+    def __init__(self, name, description, action, ready, timeout):
+        self.name = name
+        self.description = description
+        self.action = action
+        self.ready = ready
+        self.timeout = timeout
+
+
+def _navigate_to(url):
+    async def _navigate(page, timeout_ms):
+        await page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+    return _navigate
+
+
+async def _notebook_visible(page, timeout_ms):
+    await page.wait_for_selector(NOTEBOOK_SELECTOR, state="visible", timeout=timeout_ms)
+
+
+async def _open_notebook(page, timeout_ms):
+    await page.click(NOTEBOOK_SELECTOR, timeout=timeout_ms)
+
+
+async def _interactive_mode_visible(page, timeout_ms):
+    await page.wait_for_selector(INTERACTIVE_MODE_SELECTOR, state="visible", timeout=timeout_ms)
+
+
+async def _enter_interactive_mode(page, timeout_ms):
+    await page.click(INTERACTIVE_MODE_SELECTOR, timeout=timeout_ms)
+
+
+async def _play_audio_enabled(page, timeout_ms):
+    await page.wait_for_selector(f"{PLAY_AUDIO_SELECTOR}:not([disabled])", state="visible", timeout=timeout_ms)
+
+
+async def _play_audio(page, timeout_ms):
+    await page.click(PLAY_AUDIO_SELECTOR, timeout=timeout_ms)
+
+
+async def _join_enabled(page, timeout_ms):
+    await page.wait_for_selector(f"{JOIN_SELECTOR}:not([disabled])", state="visible", timeout=timeout_ms)
+
+
+async def _join(page, timeout_ms):
+    await page.click(JOIN_SELECTOR, timeout=timeout_ms)
+
+
+async def _speaking_animation_attached(page, timeout_ms):
+    await page.wait_for_selector(SPEAKING_ANIMATION_SELECTOR, state="attached", timeout=timeout_ms)
+
+
+def build_setup_steps(timeouts=None, url=None):
+    """Returnerer opsætningens trin i rækkefølge: navigate -> notebook -> interactive -> play -> join"""
+    timeouts = {**SETUP_STEP_TIMEOUTS, **(timeouts or {})}
+    return [
+        SetupStep("navigate", "Navigating to NotebookLM...",
+                  _navigate_to(url or NOTEBOOK_URL), _notebook_visible, timeouts["navigate"]),
+        SetupStep("open_notebook", f"Clicking on {PODCAST_NAME}...",
+                  _open_notebook, _interactive_mode_visible, timeouts["open_notebook"]),
+        SetupStep("interactive_mode", "Clicking on Interactive mode...",
+                  _enter_interactive_mode, _play_audio_enabled, timeouts["interactive_mode"]),
+        SetupStep("play_audio", "Clicking Play audio button...",
+                  _play_audio, _join_enabled, timeouts["play_audio"]),
+        SetupStep("join", "Clicking Join button...",
+                  _join, _speaking_animation_attached, timeouts["join"]),
+    ]
+
+
+async def run_setup_sequence(page, steps=None, debug_mode=False, url=None):
+    """
+    Kører opsætningen som en tilstandsmaskine uden faste pauser.
+
+    Hvert trin venter kun så længe siden faktisk er om at blive klar. Fejler et trin
+    rejses en TimeoutError med trinnets navn; timings for de gennemførte trin ligger
+    i undtagelsens `timings` attribut.
+
+    Returns:
+        list: En dict per trin med name, action_seconds, ready_seconds og total_seconds
+    """
+    steps = steps or build_setup_steps(url=url)
+    timings = []
+    sequence_start = time.monotonic()
+
+    for step in steps:
+        if debug_mode:
+            print(f"DEBUG: [{step.name}] {step.description}")
+        else:
+            print(step.description)
+
+        timeout_ms = step.timeout * 1000
+        step_start = time.monotonic()
+        try:
+            await step.action(page, timeout_ms)
+            action_done = time.monotonic()
+            await step.ready(page, timeout_ms)
+        except Exception as e:
+            error = TimeoutError(f"Setup step '{step.name}' failed within {step.timeout}s: {e}")
+            error.timings = timings
+            raise error from e
+        step_done = time.monotonic()
+
+        timing = {
+            "name": step.name,
+            "action_seconds": round(action_done - step_start, 3),
+            "ready_seconds": round(step_done - action_done, 3),
+            "total_seconds": round(step_done - step_start, 3),
+        }
+        timings.append(timing)
+        if debug_mode:
+            print(f"DEBUG: [{step.name}] ready after {timing['total_seconds']:.2f}s")
+
+    total = time.monotonic() - sequence_start
+    print(f"Session setup completed in {total:.2f}s")
+    for timing in timings:
+        print(f"   {timing['name']:<18} {timing['total_seconds']:>6.2f}s "
+              f"(action {timing['action_seconds']:.2f}s, ready {timing['ready_seconds']:.2f}s)")
+    return timings
@@ -0,0 +1,66 @@
+import time
+
+# CallbackFlags-attributter i sounddevice der tælles
+HEALTH_FIELDS = ("input_overflow", "input_underflow", "output_overflow", "output_underflow", "priming_output")
+
+
+class StreamHealth:
+    """
+    Tæller xruns for én PortAudio-stream på tværs af alle dens callbacks.
+
+    record(status) kaldes fra stream-callback'en med dens CallbackFlags; det er kun
+    heltals-tællinger, så det er billigt nok til audio-tråden.
+
+    Args:
+        name (str): Streamens navn i oversigter og metrics
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = dict.fromkeys(HEALTH_FIELDS, 0)
+        self.callbacks = 0
+        self.created = time.monotonic()
+
+    def record(self, status):
+        self.callbacks += 1
+        if not status:
+            return
+        for field in HEALTH_FIELDS:
+            if getattr(status, field, False):
+                self.counts[field] += 1
+
+    @property
+    def issues(self):
+        return sum(self.counts.values())
+
+    def snapshot(self):
+        """Tællerne som dict (til metrics og diff)"""
+        return {"callbacks": self.callbacks, **self.counts}
+
+    def since(self, snapshot):
+        """Ændringen i tællerne siden et tidligere snapshot()"""
+        return {key: value - snapshot.get(key, 0) for key, value in self.snapshot().items()}
+
+    def __str__(self):
+        problems = ", ".join(f"{field}={count}" for field, count in self.counts.items() if count)
+        return f"{self.name}: {self.callbacks} callbacks, {problems or 'no xruns'}"
+
+
+_health = {}
+
+
+def get_stream_health(name):
+    """Returnerer den delte StreamHealth for en stream, og opretter den første gang"""
+    health = _health.get(name)
+    if health is None:
+        health = _health[name] = StreamHealth(name)
+    return health
+
+
+def print_stream_health_summary():
+    if not _health:
+        return
+    print("Stream health:")
+    for health in _health.values():
+        marker = "⚠️" if health.issues else "✅"
+        print(f"   {marker} {health}")
@@ -0,0 +1,410 @@
+import queue
+import threading
+import numpy as np
+import sounddevice as sd
+import soundfile as sf
+from resampler import PolyphaseResampler
+from stream_health import get_stream_health
+
+# Frames per blok læst fra filen, og hvor mange blokke der læses forud
+READ_BLOCK_SIZE = 4096
+PREFETCH_BLOCKS = 4
+
+
+def map_channels(out, block):
+    """
+    Kopierer block ind i out og mapper kanaler undervejs: samme antal kopieres direkte,
+    flere kanaler klippes til out's, og mono broadcastes til alle out's kanaler - uden
+    at lave en fysisk flerkanals-kopi af lyden. Har out flere kanaler end en
+    flerkanals-block, kopieres blockens kanaler til de første og resten er stilhed.
+    """
+    channels = block.shape[1]
+    if channels == out.shape[1] or channels == 1:
+        out[:] = block
+    elif channels > out.shape[1]:
+        out[:] = block[:, :out.shape[1]]
+    else:
+        out[:, :channels] = block
+        out[:, channels:] = 0
+
+
+class FileBlockReader:
+    """
+    Læser en lydfil blokvis (sf.blocks) i en baggrundstråd ind i en lille prefetch-kø.
+
+    Gain og klipning sker in-place på hver blok, og resampling blokvis med en
+    PolyphaseResampler, så hverken hele filen eller kopier af den ligger i hukommelsen.
+    Første blok er klar efter én fil-læsning uanset filens længde. fill() kaldes fra en
+    output-callback og tager aldrig en lås eller venter: er køen tom, tælles det som
+    starved og resten af blokken er stilhed.
+
+    Args:
+        file_path (str): Lydfilen
+        samplerate (int): Output sample rate (None = filens egen)
+        gain (float): Forstærkning
+        block_size (int): Frames per læst blok
+        prefetch (int): Antal blokke der læses forud
+    """
+
+    def __init__(self, file_path, samplerate=None, gain=1.0, block_size=READ_BLOCK_SIZE,
+                 prefetch=PREFETCH_BLOCKS):
+        info = sf.info(file_path)
+        self.file_path = file_path
+        self.file_samplerate = info.samplerate
+        self.samplerate = int(samplerate or info.samplerate)
+        self.channels = info.channels
+        self.gain = gain
+        self.block_size = block_size
+        # Samme længde som resampler.resample ville give for hele filen
+        self.frames = -(-info.frames * self.samplerate // self.file_samplerate)
+        self.resampler = (PolyphaseResampler(self.file_samplerate, self.samplerate, self.channels)
+                          if self.samplerate != self.file_samplerate else None)
+
+        self.error = None
+        self.exhausted = False
+        self.starved = 0
+        self.delivered = 0
+        self._queue = queue.Queue(maxsize=prefetch)
+        self._block = None
+        self._position = 0
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._read_loop, name="playback-reader", daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _prepare(self, block, emitted):
+        # Resamplerens flush giver lidt mere end filens længde; klip ved self.frames
+        block = block[:max(0, self.frames - emitted)]
+        if self.gain != 1.0:
+            block *= self.gain
+        np.clip(block, -1.0, 1.0, out=block)
+        return block
+
+    def _read_loop(self):
+        emitted = 0
+        try:
+            for block in sf.blocks(self.file_path, blocksize=self.block_size, dtype='float32',
+                                   always_2d=True):
+                if self.resampler is not None:
+                    block = self.resampler.process(block)
+                block = self._prepare(block, emitted)
+                emitted += len(block)
+                if len(block) and not self._put(block):
+                    return
+            if self.resampler is not None and emitted < self.frames:
+                block = self._prepare(self.resampler.flush(), emitted)
+                if len(block) and not self._put(block):
+                    return
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(None)
+
+    def wait_ready(self, timeout=None):
+        """Venter til første blok er læst (eller filen er tom/fejlede); True hvis klar"""
+        if self._block is not None or self.exhausted:
+            return True
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        # Blokken bliver den aktuelle, så fill() starter med den
+        if item is None:
+            self.exhausted = True
+        else:
+            self._block, self._position = item, 0
+        return True
+
+    def fill(self, out):
+        """
+        Kopierer næste frames ind i out (kaldes fra output-callback'en).
+
+        Returns:
+            int: Antal frames skrevet; færre end len(out) betyder tom kø eller slut
+        """
+        filled = 0
+        while filled < len(out) and not self.exhausted:
+            if self._block is None:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    self.starved += 1
+                    break
+                if item is None:
+                    self.exhausted = True
+                    break
+                self._block, self._position = item, 0
+
+            count = min(len(out) - filled, len(self._block) - self._position)
+            map_channels(out[filled:filled + count], self._block[self._position:self._position + count])
+            self._position += count
+            filled += count
+            if self._position >= len(self._block):
+                self._block = None
+        self.delivered += filled
+        return filled
+
+    def close(self):
+        """Stopper læse-tråden (f.eks. ved annullering)"""
+        self._closed.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join(timeout=1)
+
+
+class BufferReader:
+    """Samme fill()-interface som FileBlockReader for lyd der allerede ligger i hukommelsen"""
+
+    def __init__(self, data):
+        data = np.asarray(data)
+        self.data = data.reshape(-1, 1) if data.ndim == 1 else data
+        self.frames = len(self.data)
+        self.position = 0
+        self.error = None
+        self.starved = 0
+
+    @property
+    def exhausted(self):
+        return self.position >= self.frames
+
+    @property
+    def delivered(self):
+        return self.position
+
+    def fill(self, out):
+        count = min(len(out), self.frames - self.position)
+        map_channels(out[:count], self.data[self.position:self.position + count])
+        self.position += count
+        return count
+
+    def close(self):
+        pass
+
+
+def read_scaled(file_path, gain=1.0):
+    """
+    Læser en hel lydfil som float32 (frames x kanaler) og giver den gain in-place.
+
+    Én allokering i filens egen kanal-opsætning: ingen float64-mellemtrin, ingen
+    kopier til gain/klipning og ingen fysisk mono -> stereo (det klarer map_channels).
+
+    Returns:
+        tuple: (data, samplerate)
+    """
+    data, samplerate = sf.read(file_path, dtype='float32', always_2d=True)
+    if gain != 1.0:
+        data *= gain
+    np.clip(data, -1.0, 1.0, out=data)
+    return data, samplerate
+
+
+def play_reader(reader, device_index, samplerate, channels, monitor=False):
+    """
+    Afspiller fra en reader (FileBlockReader/BufferReader) på en OutputStream og blokerer
+    til den er spillet. Kanal-mapping sker i callback'en; med monitor vises
+    output-niveauet fra hovedtråden (callback'en gemmer kun tallet).
+    """
+    health = get_stream_health(f"playback:{device_index}")
+    level = [0.0]
+    finished = threading.Event()
+
+    def callback(outdata, frames, time_info, status):
+        health.record(status)
+        count = reader.fill(outdata)
+        outdata[count:] = 0
+        if monitor and count:
+            level[0] = float(np.sqrt(np.mean(outdata[:count] ** 2)))
+        if reader.exhausted:
+            raise sd.CallbackStop
+
+    try:
+        with sd.OutputStream(samplerate=samplerate, device=device_index, channels=channels,
+                             dtype='float32', callback=callback, finished_callback=finished.set):
+            while not finished.wait(0.1):
+                if monitor:
+                    bars = min(50, int(level[0] * 50))
+                    print('\r[' + '█' * bars + ' ' * (50 - bars) + f'] {level[0]:.3f}', end='', flush=True)
+        if monitor:
+            print()
+    finally:
+        reader.close()
+    if reader.error is not None:
+        raise reader.error
+    return reader
+
+
+def play_buffer(data, samplerate, device_index, channels=None, monitor=False):
+    """
+    Afspiller en buffer med kanal-mapping i stedet for en flerkanals-kopi (mono
+    broadcastes til alle kanaler i callback'en).
+    """
+    if channels is None:
+        channels = min(2, sd.query_devices(device_index)['max_output_channels'])
+    return play_reader(BufferReader(data), device_index, samplerate, channels, monitor=monitor)
+
+
+def play_file_streamed(file_path, device_index, gain=1.0, samplerate=None, channels=None,
+                       monitor=False, debug=False):
+    """
+    Afspiller en lydfil blokvis på en OutputStream: filen læses mens den spilles.
+
+    Tid til første sample er én blok-læsning uanset filens længde, og hukommelsen er
+    et par blokke.
+
+    Args:
+        samplerate (int): Stream-rate (None = filens); afviger den resamples blokvis
+        channels (int): Stream-kanaler (None = device'ens, max 2)
+
+    Returns:
+        FileBlockReader: Læseren, med starved/delivered til diagnose
+    """
+    if channels is None:
+        channels = min(2, sd.query_devices(device_index)['max_output_channels'])
+    reader = FileBlockReader(file_path, samplerate=samplerate, gain=gain)
+    reader.wait_ready()
+    if debug:
+        print(f"Streaming {file_path}: {reader.file_samplerate} Hz -> {reader.samplerate} Hz, "
+              f"{reader.channels} -> {channels} channels, gain {gain}x")
+    play_reader(reader, device_index, reader.samplerate, channels, monitor=monitor)
+    if debug and reader.starved:
+        print(f"⚠️ Prefetch queue ran dry {reader.starved} times")
+    return reader
+
+
+def _legacy_load(file_path, gain, channels):
+    """Den tidligere vej: float64-læsning og en ny fuld kopi for gain, klipning, mono -> stereo og float32"""
+    data, samplerate = sf.read(file_path)
+    data = data * gain
+    data = np.clip(data, -1.0, 1.0)
+    if data.ndim == 1 and channels > 1:
+        data = np.tile(data.reshape(-1, 1), (1, channels))
+    data = data.astype(np.float32)
+    return BufferReader(data)
+
+
+_BENCHMARK_VARIANTS = {
+    "idle": lambda file_path, gain, channels: BufferReader(np.zeros((0, 1), dtype=np.float32)),
+    "legacy": _legacy_load,
+    "float32": lambda file_path, gain, channels: BufferReader(read_scaled(file_path, gain)[0]),
+    "streamed": lambda file_path, gain, channels: FileBlockReader(file_path, gain=gain),
+}
+
+
+def _peak_rss():
+    """Processens peak RSS i bytes (None hvor resource-modulet ikke findes, f.eks. Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # macOS: bytes, Linux: KiB
+
+
+def _measure(variant, file_path, gain, channels, blocksize=512):
+    """Én "afspilning" uden lydkort: readeren tømmes blok for blok som output-callback'en ville"""
+    import time
+    import tracemalloc
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    reader = _BENCHMARK_VARIANTS[variant](file_path, gain, channels)
+    out = np.zeros((blocksize, channels), dtype=np.float32)
+    first = None
+    while not reader.exhausted:
+        if reader.fill(out):
+            first = first if first is not None else time.perf_counter() - started
+        else:
+            time.sleep(0.001)  # prefetch-køen er tom - vent på læse-tråden
+    elapsed = time.perf_counter() - started
+    reader.close()
+    _, traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak = _peak_rss()
+    return {
+        "variant": variant,
+        "rss_bytes": peak,
+        "traced_bytes": traced,
+        "first_block_ms": round((first or 0) * 1000, 2),
+        "total_ms": round(elapsed * 1000, 1),
+        "frames": reader.delivered,
+    }
+
+
+def benchmark(file_path=None, seconds=120.0, samplerate=48000, gain=3.0, channels=2):
+    """
+    Måler peak-hukommelse per afspilning for den tidligere vej og de nye.
+
+    Hver variant kører i sin egen proces, så peak RSS (ru_maxrss kan kun stige) ikke
+    arves fra en anden variant. "idle" er samme proces uden lyd (Python, NumPy,
+    soundfile), og forskellen til den er afspilningens egen peak. tracemalloc-peak
+    (NumPy-allokeringer) vises også, så der er et tal på Windows.
+    """
+    import json
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    temp = None
+    if file_path is None:
+        # Mono 16-bit som en TTS-fil; skæv frekvens så blokkene ikke er ens
+        temp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
+        temp.close()
+        # Skrives i bidder: på Linux arver børneprocesserne forælderens peak RSS
+        with sf.SoundFile(temp.name, mode='w', samplerate=samplerate, channels=1, subtype='PCM_16') as f:
+            for start in range(0, int(seconds * samplerate), samplerate):
+                t = np.arange(start, min(start + samplerate, int(seconds * samplerate))) / samplerate
+                f.write(0.2 * np.sin(2 * np.pi * 997.3 * t))
+        file_path = temp.name
+
+    info = sf.info(file_path)
+    print(f"{file_path}: {info.duration:.0f}s, {info.channels} kanal(er), {info.samplerate} Hz, "
+          f"gain {gain}x, afspillet på {channels} kanaler")
+    print(f"  {'variant':10s} {'peak RSS':>10s} {'over idle':>10s} {'tracemalloc':>12s} "
+          f"{'første blok':>12s} {'i alt':>10s}")
+    idle = None
+    try:
+        for variant in _BENCHMARK_VARIANTS:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--measure", variant, file_path,
+                 "--gain", str(gain), "--channels", str(channels)],
+                check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            peak = result["rss_bytes"]
+            idle = peak if variant == "idle" else idle
+            rss = "n/a" if peak is None else f"{peak / 1e6:7.1f} MB"
+            over = "n/a" if peak is None else f"{(peak - idle) / 1e6:7.1f} MB"
+            print(f"  {variant:10s} {rss:>10s} {over:>10s} {result['traced_bytes'] / 1e6:9.1f} MB "
+                  f"{result['first_block_ms']:9.1f} ms {result['total_ms']:7.0f} ms")
+    finally:
+        if temp is not None:
+            os.remove(temp.name)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Hukommelses-benchmark af afspilningsvejene (peak RSS per afspilning)")
+    parser.add_argument("file", nargs="?", help="Lydfil (default: genereret mono-testfil)")
+    parser.add_argument("--seconds", type=float, default=120.0, help="Længde af den genererede testfil")
+    parser.add_argument("--gain", type=float, default=3.0, help="Forstærkning")
+    parser.add_argument("--channels", type=int, default=2, help="Output-kanaler")
+    parser.add_argument("--measure", choices=sorted(_BENCHMARK_VARIANTS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(_measure(args.measure, args.file, args.gain, args.channels)))
+    else:
+        benchmark(args.file, args.seconds, gain=args.gain, channels=args.channels)
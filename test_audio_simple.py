@@ -2,6 +2,9 @@
 import os
 import time
 from audio import list_audio_devices
+from audio_format import negotiate_format
+from resampler import resample
+from stream_playback import play_buffer, read_scaled
 import sounddevice as sd
 import numpy as np
 
@@ -39,18 +42,16 @@ def main():
         # Generer en simpel tone
         duration = 3  # sekunder
         frequency = 440  # Hz
-        t = np.linspace(0, duration, int(sample_rate * duration), False)
-        tone = 0.5 * np.sin(2 * np.pi * frequency * t)
+        t = np.arange(int(sample_rate * duration), dtype=np.float32) / sample_rate
+        tone = np.sin(2 * np.pi * frequency * t)
+        tone *= 0.5
 
-        # Konverter til stereo hvis nødvendigt
+        # Mono-tonen mappes til alle device'ens kanaler under afspilning (ingen stereo-kopi)
         channels = device_info.get('max_output_channels', 2)
-        if channels > 1:
-            tone = np.tile(tone.reshape(-1, 1), (1, channels))
 
         # Afspil tonen
         print(f"Afspiller {frequency}Hz tone i {duration} sekunder...")
-        sd.play(tone, sample_rate, device=cable_input_index)
-        sd.wait()
+        play_buffer(tone, sample_rate, cable_input_index, channels=channels)
         print("Tone afspillet!")
     except Exception as e:
         print(f"Fejl ved afspilning af testtone: {e}")
@@ -71,29 +72,27 @@ def main():
         return
 
     try:
-        import soundfile as sf
-
-        # Indlæs lydfilen
-        data, file_samplerate = sf.read(file_path)
+        # Indlæs lydfilen som float32 med gain anvendt in-place (klippet til [-1, 1])
+        gain = 3.0
+        data, file_samplerate = read_scaled(file_path, gain)
         print(f"Lydfil: {file_path}")
         print(f"Sample rate: {file_samplerate} Hz")
-        print(f"Kanaler: {data.shape[1] if len(data.shape) > 1 else 1}")
+        print(f"Kanaler: {data.shape[1]}")
 
-        # Konverter til stereo hvis nødvendigt
-        if len(data.shape) == 1 and channels > 1:
-            data = np.tile(data.reshape(-1, 1), (1, channels))
-        elif len(data.shape) > 1 and data.shape[1] > channels:
+        # Overskydende kanaler skæres fra; mono mappes til alle kanaler under afspilning
+        if data.shape[1] > channels:
             data = data[:, :channels]
 
-        # Anvend gain
-        gain = 3.0
-        data = data * gain
-        data = np.clip(data, -1.0, 1.0)  # Undgå forvrængning
+        # Afspil i filens egen rate hvis device'en kan; ellers resample
+        stream_format = negotiate_format(cable_input_index, file_samplerate, channels)
+        if stream_format["resample"]:
+            print(f"Resampler fra {file_samplerate} Hz til {stream_format['samplerate']} Hz")
+            data = resample(data, file_samplerate, stream_format["samplerate"])
+            file_samplerate = stream_format["samplerate"]
 
         # Afspil lydfilen
         print(f"Afspiller {file_path} med gain {gain}...")
-        sd.play(data, file_samplerate, device=cable_input_index)
-        sd.wait()
+        play_buffer(data, file_samplerate, cable_input_index, channels=stream_format["channels"])
         print("Lydfil afspillet!")
     except Exception as e:
         print(f"Fejl ved afspilning af lydfil: {e}")
@@ -0,0 +1,64 @@
+import asyncio
+import numpy as np
+import pytest
+import soundfile as sf
+
+try:
+    import stream_playback
+    from audio_engine import PlaybackRequest, StreamedPlaybackRequest
+except (ImportError, OSError):
+    # audio_engine importerer sounddevice, som kræver PortAudio
+    pytest.skip("sounddevice/PortAudio not available", allow_module_level=True)
+
+
+def _play(request, block_size=960, channels=2):
+    """Spiller en request som motorens output-callback gør, til den er opbrugt"""
+    out = np.empty((block_size, channels), dtype=np.float32)
+    for _ in range(10000):
+        request.fill(out)
+        if request.exhausted:
+            break
+    request.done.set()
+    return request
+
+
+@pytest.fixture
+def question(tmp_path):
+    path = str(tmp_path / "question.wav")
+    sf.write(path, np.full(48000, 0.1, dtype=np.float32), 48000)
+    return path
+
+
+def test_buffer_request_completes():
+    request = _play(PlaybackRequest(np.zeros(5000, dtype=np.float32)))
+    assert request.wait(1) is True
+    asyncio.run(_await(request))
+
+
+def test_streamed_request_completes(question):
+    request = _play(StreamedPlaybackRequest(question, 48000))
+    assert request.error is None
+    assert request.wait(1) is True
+    assert request.position == 48000
+
+
+def test_streamed_read_error_is_raised(question, monkeypatch):
+    blocks = sf.blocks
+
+    def failing(*args, **kwargs):
+        for number, block in enumerate(blocks(*args, **kwargs)):
+            if number == 2:
+                raise RuntimeError("decode failed")
+            yield block
+    monkeypatch.setattr(stream_playback.sf, "blocks", failing)
+
+    request = _play(StreamedPlaybackRequest(question, 48000))
+    assert request.position < 48000
+    with pytest.raises(RuntimeError, match="decode failed"):
+        request.wait(1)
+    with pytest.raises(RuntimeError, match="decode failed"):
+        asyncio.run(_await(request))
+
+
+async def _await(request):
+    await request
@@ -0,0 +1,63 @@
+import pytest
+
+try:
+    import audio_format
+except (ImportError, OSError):
+    # audio_format importerer sounddevice, som kræver PortAudio
+    pytest.skip("sounddevice/PortAudio not available", allow_module_level=True)
+
+from audio_format import negotiate_format, SAMPLE_FORMAT
+
+
+@pytest.fixture
+def device(monkeypatch):
+    """Et device med 44.1 kHz default der kun accepterer 44.1/48 kHz stereo float32"""
+    probes = []
+
+    def query_devices(device):
+        return {"default_samplerate": 44100.0, "max_output_channels": 2, "max_input_channels": 2}
+
+    def check(device, samplerate, channels, dtype):
+        probes.append((samplerate, channels, dtype))
+        if samplerate not in (44100, 48000) or channels != 2 or dtype != "float32":
+            raise ValueError("Invalid sample rate")
+
+    monkeypatch.setattr(audio_format, "_supported", {})
+    monkeypatch.setattr(audio_format, "_decisions", {})
+    monkeypatch.setattr(audio_format.sd, "query_devices", query_devices)
+    monkeypatch.setattr(audio_format.sd, "check_output_settings", check)
+    monkeypatch.setattr(audio_format.sd, "check_input_settings", check)
+    return probes
+
+
+def test_native_rate_needs_no_resampling(device):
+    decision = negotiate_format(3, samplerate=48000, channels=2)
+    assert decision["samplerate"] == 48000
+    assert decision["resample"] is False
+    assert decision["dtype"] == SAMPLE_FORMAT == "float32"
+    assert decision["default_samplerate"] == 48000 and decision["max_output_channels"] == 2
+
+
+def test_falls_back_to_default_rate_and_device_channels(device):
+    decision = negotiate_format(3, samplerate=24000, channels=1)
+    assert (decision["samplerate"], decision["channels"]) == (44100, 2)
+    assert decision["resample"] is True and decision["checked"] is True
+    # Kun float32 probes - det format streams faktisk åbnes med
+    assert {dtype for _, _, dtype in device} == {"float32"}
+
+
+def test_decision_is_cached(device):
+    first = negotiate_format(3, samplerate=22050, channels=2)
+    probes = len(device)
+    assert negotiate_format(3, samplerate=22050, channels=2) is first
+    assert len(device) == probes
+
+
+def test_unsupported_device_uses_default(device, monkeypatch):
+    def reject(**kwargs):
+        raise ValueError("Invalid device")
+    monkeypatch.setattr(audio_format.sd, "check_input_settings", reject)
+    decision = negotiate_format(3, samplerate=16000, kind="input")
+    assert (decision["samplerate"], decision["channels"]) == (44100, 2)
+    assert decision["checked"] is False
+    assert decision["max_input_channels"] == 2
@@ -0,0 +1,69 @@
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+import audio_prep
+from audio_prep import PreparedCache, prepare_question
+
+
+@pytest.fixture
+def tts_file(tmp_path):
+    path = str(tmp_path / "question.wav")
+    t = np.arange(24000) / 24000
+    sf.write(path, (0.25 * np.sin(2 * np.pi * 440 * t)).astype(np.float32), 24000, subtype="FLOAT")
+    return path
+
+
+def test_key_covers_format_and_source(tmp_path, tts_file):
+    cache = PreparedCache(str(tmp_path / "cache"), 1 << 20)
+    path = cache.path_for(tts_file, 48000, 2, 1.0, "float32")
+    assert path == cache.path_for(tts_file, 48000, 2, 1.0, "float32")
+    assert path.startswith(os.path.join(cache.cache_dir, "question-"))
+    others = {cache.path_for(tts_file, 44100, 2, 1.0, "float32"),
+              cache.path_for(tts_file, 48000, 1, 1.0, "float32"),
+              cache.path_for(tts_file, 48000, 2, 0.5, "float32"),
+              cache.path_for(tts_file, 48000, 2, 1.0, "int16")}
+    assert path not in others and len(others) == 4
+
+    # En ændret kildefil giver en ny nøgle
+    stat = os.stat(tts_file)
+    os.utime(tts_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.path_for(tts_file, 48000, 2, 1.0, "float32") != path
+
+
+def test_store_and_load(tmp_path):
+    cache = PreparedCache(str(tmp_path / "cache"), 1 << 20)
+    path = os.path.join(cache.cache_dir, "a.npy")
+    assert cache.load(path) is None
+    data = np.arange(20, dtype=np.float32).reshape(10, 2)
+    cache.store(path, data)
+    loaded = cache.load(path)
+    assert isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(loaded, data)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert not [name for name in os.listdir(cache.cache_dir) if name.endswith(".tmp")]
+
+
+def test_evicts_least_recently_used(tmp_path):
+    data = np.zeros(1000, dtype=np.float32)
+    cache = PreparedCache(str(tmp_path / "cache"), 2.5 * (data.nbytes + 128))
+    paths = [os.path.join(cache.cache_dir, f"{name}.npy") for name in "abc"]
+    for age, path in enumerate(paths[:2]):
+        cache.store(path, data)
+        os.utime(path, (1000 + age, 1000 + age))
+    assert cache.load(paths[0]) is not None  # a er nu senest brugt
+    cache.store(paths[2], data)
+    assert [os.path.exists(path) for path in paths] == [True, False, True]
+
+
+def test_prepare_question_uses_cache(tmp_path, tts_file, monkeypatch):
+    monkeypatch.setattr(audio_prep, "_cache", PreparedCache(str(tmp_path / "cache"), 1 << 24))
+    device_info = {"default_samplerate": 48000.0, "max_output_channels": 2}
+    first, samplerate = prepare_question(tts_file, device_info, gain=2.0)
+    second, _ = prepare_question(tts_file, device_info, gain=2.0)
+    assert samplerate == 48000
+    assert first.shape == (48000, 1) and first.dtype == np.float32
+    assert isinstance(second, np.memmap)
+    np.testing.assert_array_equal(second, first)
+    assert audio_prep._cache.hits == 1
+    assert np.abs(first).max() == pytest.approx(0.5, abs=0.01)
@@ -0,0 +1,65 @@
+import time
+import numpy as np
+import pytest
+
+try:
+    from audio_worker import SharedFrameRing
+except (ImportError, OSError):
+    # audio_worker importerer sounddevice, som kræver PortAudio
+    pytest.skip("sounddevice/PortAudio not available", allow_module_level=True)
+
+
+def _frames(start, end, channels=2):
+    """Frames hvor hver sample er sin absolutte frame-position - let at genkende efter wrap"""
+    return np.repeat(np.arange(start, end, dtype=np.float32)[:, None], channels, axis=1)
+
+
+def test_shared_ring_between_handles():
+    owner = SharedFrameRing(100, 2, 1000)
+    reader = SharedFrameRing(100, 2, 1000, name=owner.name)
+    try:
+        for start in range(0, 250, 30):
+            owner.write(_frames(start, start + 30))
+        assert reader.written == 270
+        assert reader.clock[0] == 270
+        np.testing.assert_array_equal(reader.read(190, 260), _frames(190, 260))
+    finally:
+        reader.close()
+        owner.close()
+
+
+def test_shared_ring_read_into_counts_consumed():
+    ring = SharedFrameRing(100, 1, 1000)
+    try:
+        ring.write(_frames(0, 60, channels=1))
+        out = np.ones((40, 1), dtype=np.float32)
+        assert ring.read_into(out) == 40
+        np.testing.assert_array_equal(out, _frames(0, 40, channels=1))
+        assert ring.read_into(out) == 20
+        np.testing.assert_array_equal(out[:20], _frames(40, 60, channels=1))
+        assert not out[20:].any()
+        consumed, at = ring.consumed_clock
+        assert consumed == 60
+        assert at <= time.monotonic()
+    finally:
+        ring.close()
+
+
+def test_shared_ring_publishes_written_only_with_its_clock():
+    ring = SharedFrameRing(100, 1, 1000)
+    published = []
+    original = ring._write_pair
+
+    def record(seq_slot, value_slot, time_slot, value, at):
+        # Når et nyt written publiceres, står det gamle stadig i headeren
+        published.append((ring.written, value))
+        original(seq_slot, value_slot, time_slot, value, at)
+    ring._write_pair = record
+    try:
+        ring.write(_frames(0, 30, channels=1))
+        ring.write(_frames(30, 280, channels=1))
+        assert published == [(0, 30), (30, 280)]
+        assert ring.clock[0] == ring.written == 280
+        np.testing.assert_array_equal(ring.read(180, 280), _frames(180, 280, channels=1))
+    finally:
+        ring.close()
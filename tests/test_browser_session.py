@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import time
+import subprocess
+import pytest
+from browser_session import BrowserSession, check_cookie_expiry
+
+
+def _state(*cookies):
+    return {"cookies": [dict(name=name, expires=expires) for name, expires in cookies]}
+
+
+def test_missing_state_is_invalid():
+    assert check_cookie_expiry(None) is False
+    assert check_cookie_expiry({}) is False
+
+
+def test_valid_and_session_cookies():
+    now = time.time()
+    assert check_cookie_expiry(_state(("SID", now + 86400), ("HSID", -1)))
+
+
+def test_expired_or_expiring_auth_cookie():
+    now = time.time()
+    assert check_cookie_expiry(_state(("SID", now - 10), ("HSID", now + 86400))) is False
+    assert check_cookie_expiry(_state(("SID", now + 600)), margin_seconds=3600) is False
+    assert check_cookie_expiry(_state(("SID", now + 600)), margin_seconds=60)
+
+
+def test_other_cookies_ignored_when_auth_cookies_present():
+    now = time.time()
+    assert check_cookie_expiry(_state(("SID", now + 86400), ("NID", now - 10)))
+    # Uden kendte login-cookies tjekkes alle
+    assert check_cookie_expiry(_state(("NID", now - 10))) is False
+
+
+def _sleeper(*args):
+    """En proces i sin egen procesgruppe der ikke er vores Chromium, medmindre args siger det"""
+    process = subprocess.Popen([sys.executable, "-c", "import time; print(flush=True); time.sleep(30)", *args],
+                               stdout=subprocess.PIPE, start_new_session=True)
+    process.stdout.readline()  # processen kører sin egen kommandolinje
+    return process
+
+
+def _session(tmp_path, pid):
+    session = BrowserSession(state_file=str(tmp_path / "session.json"), profile_dir=str(tmp_path / "profile"),
+                             port=1)
+    with open(session.state_file, "w") as f:
+        json.dump({"pid": pid, "port": 1, "profile_dir": session.profile_dir, "args": []}, f)
+    return session
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses POSIX process groups")
+def test_stop_leaves_unrelated_process_alone(tmp_path):
+    process = _sleeper()
+    try:
+        session = _session(tmp_path, process.pid)
+        assert session.stop() is False
+        assert process.poll() is None
+        assert not os.path.exists(session.state_file)
+    finally:
+        process.kill()
+        process.wait()
+        process.stdout.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses POSIX process groups")
+def test_stop_kills_own_browser(tmp_path):
+    process = _sleeper(f"--user-data-dir={tmp_path / 'profile'}")
+    try:
+        session = _session(tmp_path, process.pid)
+        assert session.stop() is True
+        assert process.wait(5) is not None
+        assert not os.path.exists(session.state_file)
+    finally:
+        process.kill()
+        process.wait()
+        process.stdout.close()
@@ -0,0 +1,94 @@
+import os
+import json
+import asyncio
+import threading
+import numpy as np
+import pytest
+import soundfile as sf
+from encoder import EncoderPool, needs_encoding
+
+
+def _wav(path, seconds=0.5, subtype="PCM_16"):
+    t = np.arange(int(seconds * 16000)) / 16000
+    sf.write(str(path), (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32), 16000, subtype=subtype)
+    return str(path)
+
+
+@pytest.fixture
+def pool():
+    pools = []
+
+    def make(fmt, **kwargs):
+        pools.append(EncoderPool(fmt, workers=1, **kwargs))
+        return pools[-1]
+    yield make
+    for created in pools:
+        created.close()
+
+
+def _encode(pool, source, index_file=None):
+    """Kører encode_recording og venter på on_done; giver (returværdi, target, segments)"""
+    done = threading.Event()
+    result = {}
+
+    def on_done(target, segments):
+        result.update(target=target, segments=segments)
+        done.set()
+    returned = asyncio.run(pool.encode_recording(source, index_file, on_done=on_done))
+    assert done.wait(30)
+    return returned, result["target"], result["segments"]
+
+
+def test_needs_encoding(tmp_path):
+    pcm = _wav(tmp_path / "pcm.wav")
+    float_wav = _wav(tmp_path / "float.wav", subtype="FLOAT")
+    assert not needs_encoding(pcm, "wav")
+    assert needs_encoding(float_wav, "wav")
+    assert needs_encoding(pcm, "flac")
+
+
+def test_returns_wav_and_reports_encoded_file(tmp_path, pool):
+    source = _wav(tmp_path / "answer.wav")
+    returned, target, segments = _encode(pool("flac"), source)
+    assert returned == source
+    assert target == str(tmp_path / "answer.flac")
+    assert segments == []
+    assert sf.info(target).format == "FLAC"
+    assert not os.path.exists(source)
+
+
+def test_segments_encoded_and_index_rewritten(tmp_path, pool):
+    source = _wav(tmp_path / "answer.wav")
+    segment_files = [_wav(tmp_path / f"answer_seg0{n}.wav", 0.2) for n in (1, 2)]
+    index_file = str(tmp_path / "answer.segments.json")
+    with open(index_file, "w", encoding="utf-8") as f:
+        json.dump({"segments": [{"index": n + 1, "file": os.path.basename(path)}
+                                for n, path in enumerate(segment_files)]}, f)
+
+    _, _, segments = _encode(pool("flac"), source, index_file)
+    assert [segment["file"] for segment in segments] == ["answer_seg01.flac", "answer_seg02.flac"]
+    with open(index_file, encoding="utf-8") as f:
+        assert json.load(f)["segments"] == segments
+    assert all(os.path.exists(tmp_path / segment["file"]) for segment in segments)
+
+
+def test_wav_transcoded_only_when_subtype_differs(tmp_path, pool):
+    encoder = pool("wav")
+    pcm = _wav(tmp_path / "pcm.wav")
+    assert _encode(encoder, pcm)[1] == pcm
+    assert encoder.completed == 0
+
+    float_wav = _wav(tmp_path / "float.wav", subtype="FLOAT")
+    assert _encode(encoder, float_wav)[1] == float_wav
+    assert sf.info(float_wav).subtype == "PCM_16"
+    assert encoder.completed == 1
+
+
+def test_failed_encoding_keeps_wav(tmp_path, pool):
+    source = _wav(tmp_path / "answer.wav")
+    encoder = pool("flac")
+    os.remove(source)
+    open(source, "wb").close()  # findes, men er ikke en lydfil
+    assert _encode(encoder, source)[1] == source
+    assert os.path.exists(source)
+    assert encoder.failed == 1
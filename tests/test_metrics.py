@@ -0,0 +1,42 @@
+import json
+from metrics import InteractionMetrics, metrics_path
+
+
+def _records(recording_dir):
+    try:
+        with open(metrics_path(str(recording_dir)), encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+    except FileNotFoundError:
+        return []
+
+
+def test_finish_writes_once(tmp_path):
+    recording_dir = tmp_path / "recordings"
+    metrics = InteractionMetrics(session="s1", question="q.wav")
+    metrics.set(outcome="recorded")
+    metrics.finish(str(recording_dir))
+    metrics.finish(str(recording_dir))
+    records = _records(recording_dir)
+    assert len(records) == 1
+    assert records[0]["outcome"] == "recorded" and records[0]["session"] == "s1"
+
+
+def test_hold_defers_until_release(tmp_path):
+    recording_dir = tmp_path / "recordings"
+    metrics = InteractionMetrics()
+    metrics.set(recording="answer.wav")
+    metrics.hold()
+    metrics.finish(str(recording_dir))
+    assert _records(recording_dir) == []
+    metrics.release(recording="answer.flac")
+    assert [record["recording"] for record in _records(recording_dir)] == ["answer.flac"]
+
+
+def test_release_before_finish(tmp_path):
+    recording_dir = tmp_path / "recordings"
+    metrics = InteractionMetrics()
+    metrics.hold()
+    metrics.release(recording="answer.flac")
+    assert _records(recording_dir) == []
+    metrics.finish(str(recording_dir))
+    assert [record["recording"] for record in _records(recording_dir)] == ["answer.flac"]
@@ -0,0 +1,108 @@
+import asyncio
+import numpy as np
+import pytest
+import soundfile as sf
+
+try:
+    from recorder import FrameRing, RingRecording
+except (ImportError, OSError):
+    # recorder importerer sounddevice, som kræver PortAudio
+    pytest.skip("sounddevice/PortAudio not available", allow_module_level=True)
+
+
+def _frames(start, end, channels=2):
+    """Frames hvor hver sample er sin absolutte frame-position - let at genkende efter wrap"""
+    return np.repeat(np.arange(start, end, dtype=np.float32)[:, None], channels, axis=1)
+
+
+def test_read_across_wraparound():
+    ring = FrameRing(100, 2, 1000)
+    for start in range(0, 250, 30):
+        ring.write(_frames(start, start + 30))
+    assert ring.written == 270
+    assert ring.oldest == 170
+    np.testing.assert_array_equal(ring.read(190, 260), _frames(190, 260))
+
+
+def test_read_clips_to_ring():
+    ring = FrameRing(100, 2, 1000)
+    ring.write(_frames(0, 150))
+    np.testing.assert_array_equal(ring.read(0, 1000), _frames(50, 150))
+    assert len(ring.read(200, 300)) == 0
+
+
+def test_oversized_write_keeps_newest():
+    ring = FrameRing(100, 1, 1000)
+    ring.write(_frames(0, 250, channels=1))
+    assert ring.written == 250
+    np.testing.assert_array_equal(ring.read(ring.oldest, ring.written), _frames(150, 250, channels=1))
+
+
+def test_frame_at_is_clamped():
+    ring = FrameRing(1000, 1, 1000)
+    ring.write(_frames(0, 500, channels=1))
+    written, at = ring.clock
+    assert written == 500
+    assert ring.frame_at(at - 0.1) == 400
+    assert ring.frame_at(at - 10) == ring.oldest
+    assert ring.frame_at(at + 10) == ring.written
+
+
+def test_recording_includes_preroll(tmp_path):
+    ring = FrameRing(48000, 2, 48000)
+    data = np.random.default_rng(3).uniform(-0.5, 0.5, (12000, 2)).astype(np.float32)
+    ring.write(data[:4800])
+    output_file = str(tmp_path / "answer.wav")
+    recording = RingRecording(ring, output_file, start_frame=0, block_size=1000, subtype="FLOAT").start()
+    assert recording.preroll_seconds == pytest.approx(0.1)
+    ring.write(data[4800:])
+    assert recording.stop() == output_file
+    written, samplerate = sf.read(output_file, dtype="float32")
+    assert samplerate == 48000
+    np.testing.assert_array_equal(written, data)
+    assert recording.stop_reason == "stopped"
+    assert recording.lost_frames == 0
+
+
+def test_recording_cap(tmp_path):
+    ring = FrameRing(48000, 1, 8000)
+    ring.write(_frames(0, 8000, channels=1))
+    recording = RingRecording(ring, str(tmp_path / "cap.wav"), start_frame=0, max_seconds=0.5,
+                              block_size=300).start()
+    assert recording.wait(5)
+    assert recording.stop_reason == "cap"
+    assert recording.frames == 4000
+    assert len(sf.read(recording.stop())[0]) == 4000
+
+
+def test_recording_on_block_stops(tmp_path):
+    ring = FrameRing(48000, 1, 8000)
+    ring.write(_frames(0, 8000, channels=1))
+    blocks = []
+    recording = RingRecording(ring, str(tmp_path / "callback.wav"), start_frame=0, block_size=800,
+                              on_block=lambda block: blocks.append(len(block)) or len(blocks) == 3).start()
+    assert recording.wait(5)
+    assert recording.stop_reason == "callback"
+    assert blocks == [800, 800, 800]
+    assert recording.frames == 2400
+
+
+def test_recording_lagging_writer_counts_lost_frames(tmp_path):
+    ring = FrameRing(1000, 1, 1000)
+    ring.write(_frames(0, 3000, channels=1))
+    recording = RingRecording(ring, str(tmp_path / "lost.wav"), start_frame=0, block_size=100).start()
+    recording.stop()
+    assert recording.lost_frames == 2000
+    assert recording.frames == 1000
+
+
+def test_await_recording(tmp_path):
+    ring = FrameRing(8000, 1, 8000)
+    ring.write(_frames(0, 2000, channels=1))
+    recording = RingRecording(ring, str(tmp_path / "awaited.wav"), start_frame=0, max_seconds=0.1,
+                              block_size=100).start()
+    assert asyncio.run(asyncio.wait_for(_await(recording), 5)) == recording.output_file
+
+
+async def _await(recording):
+    return await recording
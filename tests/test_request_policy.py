@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from request_policy import RequestPolicy, RESOURCE_TYPE_PATTERNS
+
+
+def _policy(**kwargs):
+    return RequestPolicy(size_cache=None, **kwargs)
+
+
+@pytest.mark.parametrize("url, blocked", [
+    ("https://www.google-analytics.com/g/collect?v=2", True),
+    ("https://play.google.com/log?format=json", True),
+    ("https://notebooklm.google.com/_/gen_204?atyp=i", True),
+    ("https://lh3.googleusercontent.com/a/photo.png", True),
+    # Samme vært serverer lyd; kun billed-endelser blokeres
+    ("https://lh3.googleusercontent.com/notebooklm/audio=m140", False),
+    ("https://notebooklm.google.com/static/logo.png", True),
+    ("https://notebooklm.google.com/static/logo.png?v=3", True),
+    ("https://fonts.gstatic.com/s/roboto.woff2", True),
+    ("https://notebooklm.google.com/notebook/abc", False),
+    ("https://notebooklm.google.com/static/app.js", False),
+    # Kun hele URL'en matcher, ikke en delstreng
+    ("https://example.com/logo.png.js", False),
+    ("https://example.com/a.b/c", False),
+])
+def test_should_block(url, blocked):
+    policy = _policy(block_resource_types=["image", "font"],
+                     block_url_patterns=["*google-analytics.com/*", "*play.google.com/log*", "*/gen_204*"])
+    assert policy.should_block(url) is blocked
+
+
+def test_patterns_from_types_and_urls_without_duplicates():
+    policy = _policy(block_resource_types=["font", "font", "media"], block_url_patterns=["*.woff", "*/x*"])
+    assert policy.patterns == RESOURCE_TYPE_PATTERNS["font"] + ["*/x*"]
+
+
+def test_pattern_characters_are_literal():
+    policy = _policy(block_url_patterns=["*/a.b?c=[1]*"])
+    assert policy.should_block("https://x/a.b?c=[1]&d")
+    assert not policy.should_block("https://x/aXb?c=[1]")
+
+
+def _request(url, failure=None, resource_type="image"):
+    return SimpleNamespace(url=url, failure=failure, resource_type=resource_type)
+
+
+def test_counts_only_requests_blocked_by_browser():
+    policy = _policy(block_resource_types=["image"])
+    policy.known_sizes = {"https://x/a.png": 1000}
+    for request in (_request("https://x/a.png?v=1", "net::ERR_BLOCKED_BY_CLIENT"),
+                    _request("https://x/b.png", "net::ERR_BLOCKED_BY_CLIENT"),
+                    _request("https://x/app.js", "net::ERR_ABORTED", "script"),
+                    _request("https://x/page")):
+        policy._on_request(request)
+        if request.failure:
+            policy._on_request_failed(request)
+    summary = policy.summary()
+    assert summary["allowed"] == 2
+    assert summary["blocked"] == 2
+    assert summary["blocked_by_type"] == {"image": 2}
+    assert summary["saved_bytes"] == 1000
+    assert summary["blocked_unknown_size"] == 1
+
+
+class _Session:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, method, params=None):
+        self.sent.append((method, params))
+
+
+class _Context:
+    def __init__(self):
+        self.pages = []
+        self.sessions = []
+        self.handlers = {}
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    async def new_cdp_session(self, page):
+        self.sessions.append(_Session())
+        return self.sessions[-1]
+
+
+def test_attach_sets_blocked_urls_once_per_page():
+    context = _Context()
+    page = SimpleNamespace(context=context)
+    context.pages.append(page)
+    policy = _policy(block_url_patterns=["*/gen_204*"])
+
+    async def run():
+        await policy.attach(context)
+        await policy.attach_page(page)
+        await context.handlers["page"](SimpleNamespace(context=context))
+    asyncio.run(run())
+
+    assert len(context.sessions) == 2
+    assert context.sessions[0].sent == [("Network.enable", None),
+                                        ("Network.setBlockedURLs", {"urls": ["*/gen_204*"]})]
+    assert set(context.handlers) == {"request", "requestfailed", "page"}
+
+
+def test_measuring_mode_does_not_block():
+    context = _Context()
+    context.pages.append(SimpleNamespace(context=context))
+    policy = _policy(block_resource_types=["image"], enabled=False)
+    asyncio.run(policy.attach(context))
+    assert context.sessions == []
+    assert set(context.handlers) == {"requestfinished"}
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from resampler import PolyphaseResampler, resample
+
+RATES = [(24000, 48000), (44100, 48000), (48000, 44100), (22050, 16000)]
+
+
+def _run(resampler, data, block_size):
+    chunks = [resampler.process(data[start:start + block_size]) for start in range(0, len(data), block_size)]
+    chunks.append(resampler.flush())
+    return np.concatenate(chunks)
+
+
+@pytest.mark.parametrize("from_rate, to_rate", RATES)
+def test_output_independent_of_block_size(from_rate, to_rate):
+    data = np.random.default_rng(1).uniform(-1, 1, (4000, 2)).astype(np.float32)
+    reference = _run(PolyphaseResampler(from_rate, to_rate, 2), data, len(data))
+    for block_size in (1, 7, 160, 1024):
+        output = _run(PolyphaseResampler(from_rate, to_rate, 2), data, block_size)
+        assert output.shape == reference.shape
+        np.testing.assert_allclose(output, reference, atol=1e-6)
+
+
+@pytest.mark.parametrize("from_rate, to_rate", RATES)
+def test_output_frames_predicts_process(from_rate, to_rate):
+    resampler = PolyphaseResampler(from_rate, to_rate, 1)
+    for frames in (0, 1, 33, 480, 2048):
+        expected = resampler.output_frames(frames)
+        assert len(resampler.process(np.zeros(frames, dtype=np.float32))) == expected
+
+
+@pytest.mark.parametrize("from_rate, to_rate", RATES)
+def test_resample_length(from_rate, to_rate):
+    for frames in (1, 999, 44100):
+        output = resample(np.zeros((frames, 2), dtype=np.float32), from_rate, to_rate)
+        assert output.shape == (-(-frames * to_rate // from_rate), 2)
+
+
+def test_resample_same_rate_is_identity():
+    data = np.arange(10, dtype=np.float32)
+    assert resample(data, 48000, 48000) is data
+
+
+@pytest.mark.parametrize("from_rate, to_rate", RATES)
+def test_sine_is_time_aligned(from_rate, to_rate):
+    # 1 kHz ligger et godt stykke under cutoff for alle rater; kanterne udelades
+    seconds = 0.5
+    t_in = np.arange(int(seconds * from_rate)) / from_rate
+    output = resample(np.sin(2 * np.pi * 1000 * t_in).astype(np.float32), from_rate, to_rate)
+    t_out = np.arange(len(output)) / to_rate
+    expected = np.sin(2 * np.pi * 1000 * t_out)
+    edge = to_rate // 100
+    error = output[edge:-edge] - expected[edge:-edge]
+    snr_db = 10 * np.log10(np.mean(expected[edge:-edge] ** 2) / np.mean(error ** 2))
+    assert snr_db > 60
+
+
+def test_mono_in_mono_out():
+    resampler = PolyphaseResampler(44100, 48000, 1)
+    block = resampler.process(np.ones(1000, dtype=np.float32))
+    tail = resampler.flush()
+    assert block.ndim == 1 and tail.ndim == 1
+    assert np.concatenate((block, tail)).ndim == 1
+
+
+def test_stereo_flush_keeps_channels():
+    resampler = PolyphaseResampler(44100, 48000, 2)
+    resampler.process(np.ones((1000, 2), dtype=np.float32))
+    assert resampler.flush().shape[1] == 2
+
+
+def test_reset_forgets_history():
+    data = np.random.default_rng(2).uniform(-1, 1, (2000, 1)).astype(np.float32)
+    resampler = PolyphaseResampler(24000, 48000, 1)
+    first = _run(resampler, data, 256)
+    resampler.reset()
+    np.testing.assert_array_equal(_run(resampler, data, 256), first)
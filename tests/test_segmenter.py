@@ -0,0 +1,70 @@
+import os
+import json
+import numpy as np
+import soundfile as sf
+from segmenter import UtteranceSegmenter
+
+RATE = 16000
+
+
+def _tone(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return np.stack([amplitude * np.sin(2 * np.pi * 440 * t)] * 2, axis=1).astype(np.float32)
+
+
+def _silence(seconds):
+    return np.zeros((int(seconds * RATE), 2), dtype=np.float32)
+
+
+def _segment(tmp_path, signal, block_size=1600, **kwargs):
+    settings = dict(threshold_db=-45, min_silence_seconds=0.5, min_segment_seconds=0.2, padding_seconds=0.1,
+                    frame_ms=20, subtype="FLOAT")
+    settings.update(kwargs)
+    segmenter = UtteranceSegmenter(str(tmp_path / "answer.wav"), RATE, 2, **settings)
+    for start in range(0, len(signal), block_size):
+        assert segmenter.feed(signal[start:start + block_size]) is False
+    return segmenter, segmenter.finish()
+
+
+def test_splits_on_long_pauses(tmp_path):
+    signal = np.concatenate((_silence(0.5), _tone(1), _silence(1), _tone(0.8), _silence(0.2), _tone(0.4),
+                             _silence(1)))
+    segmenter, segments = _segment(tmp_path, signal)
+    assert len(segments) == 2
+    first, second = segments
+    assert abs(first["start"] - 0.4) <= 0.03 and abs(first["end"] - 1.6) <= 0.03
+    # Pausen på 0.2 s er kortere end min_silence_seconds og deler ikke ytringen
+    assert abs(second["start"] - 2.4) <= 0.03 and abs(second["end"] - 4.0) <= 0.03
+    for segment in segments:
+        data, samplerate = sf.read(str(tmp_path / segment["file"]))
+        assert samplerate == RATE
+        assert len(data) == segment["end_frame"] - segment["start_frame"]
+        assert -15 < segment["peak_db"] < -5
+
+    with open(segmenter.index_file, encoding="utf-8") as f:
+        index = json.load(f)
+    assert index["segments"] == segments
+    assert index["duration"] == round(len(signal) / RATE, 4)
+
+
+def test_result_independent_of_block_size(tmp_path):
+    signal = np.concatenate((_tone(0.6), _silence(0.8), _tone(0.6)))
+    results = []
+    for block_size in (160, 1601, len(signal)):
+        run = tmp_path / str(block_size)
+        run.mkdir()
+        results.append(_segment(run, signal, block_size)[1])
+    assert results[0] == results[1] == results[2]
+
+
+def test_short_noise_is_discarded(tmp_path):
+    signal = np.concatenate((_silence(0.5), _tone(0.05), _silence(1)))
+    segmenter, segments = _segment(tmp_path, signal)
+    assert segments == []
+    assert sorted(os.listdir(tmp_path)) == ["answer.segments.json"]
+
+
+def test_open_segment_closed_by_finish(tmp_path):
+    _, segments = _segment(tmp_path, np.concatenate((_silence(0.3), _tone(1))))
+    assert len(segments) == 1
+    assert segments[0]["end_frame"] == int(1.3 * RATE)
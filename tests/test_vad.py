@@ -0,0 +1,65 @@
+import numpy as np
+from vad import EndOfAnswerDetector, OnsetDetector
+
+RATE = 16000
+
+
+def _tone(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+
+def _silence(seconds):
+    return np.zeros(int(seconds * RATE), dtype=np.float32)
+
+
+def _feed(detector, signal, block_size=333):
+    """Fodrer blokvis; returnerer antal samples fodret da detektoren svarede True"""
+    for start in range(0, len(signal), block_size):
+        if detector.feed(signal[start:start + block_size]):
+            return start + block_size
+    return None
+
+
+def test_silence_alone_never_ends():
+    detector = EndOfAnswerDetector(RATE, threshold_db=-45, hangover_seconds=0.5, min_speech_seconds=0.2)
+    assert _feed(detector, _silence(5)) is None
+    assert detector.speech_started is None
+
+
+def test_ends_after_speech_and_hangover():
+    detector = EndOfAnswerDetector(RATE, threshold_db=-45, hangover_seconds=0.5, min_speech_seconds=0.2,
+                                   frame_ms=20)
+    signal = np.concatenate((_silence(1), _tone(1), _silence(2)))
+    ended_at = _feed(detector, signal)
+    assert ended_at is not None
+    assert 2.5 <= ended_at / RATE < 2.5 + 333 / RATE + 0.02
+    assert abs(detector.speech_started - 1.0) <= 0.02
+    assert abs(detector.speech_seconds - 1.0) <= 0.04
+
+
+def test_short_pause_does_not_end():
+    detector = EndOfAnswerDetector(RATE, threshold_db=-45, hangover_seconds=0.5, min_speech_seconds=0.2)
+    signal = np.concatenate((_tone(0.5), _silence(0.3), _tone(0.5), _silence(0.3)))
+    assert _feed(detector, signal) is None
+
+
+def test_stereo_blocks():
+    detector = EndOfAnswerDetector(RATE, threshold_db=-45, hangover_seconds=0.2, min_speech_seconds=0.1)
+    mono = np.concatenate((_tone(0.5), _silence(0.5)))
+    assert _feed(detector, np.stack((mono, mono), axis=1)) is not None
+
+
+def test_onset_is_sample_exact():
+    signal = np.concatenate((_silence(0.25), np.full(100, 0.5, dtype=np.float32)))
+    for block_size in (1, 64, 1000, len(signal)):
+        detector = OnsetDetector(RATE, threshold_db=-40)
+        _feed(detector, signal, block_size)
+        assert detector.onset_frame == int(0.25 * RATE)
+        assert detector.onset_seconds == 0.25
+
+
+def test_onset_none_for_silence():
+    detector = OnsetDetector(RATE, threshold_db=-40)
+    assert _feed(detector, _silence(1)) is None
+    assert detector.onset_seconds is None
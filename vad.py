@@ -0,0 +1,136 @@
+import numpy as np
+from config import VAD_SETTINGS
+
+# Hvorfor en optagelse sluttede
+END_SILENCE = "silence"  # stilhed i hangover-tiden efter tale
+END_CAP = "cap"          # maksimal varighed nået
+END_ERROR = "error"      # fejl i stream eller fil
+END_STOPPED = "stopped"  # stoppet manuelt (Ctrl+C)
+
+
+class EndOfAnswerDetector:
+    """
+    Streamende energi-baseret VAD der afgør hvornår hostens svar er slut.
+
+    Lyden deles i korte frames; en frame er tale når dens RMS ligger over threshold_db
+    (dBFS). Svaret er slut når der har været mindst min_speech_seconds tale og derefter
+    hangover_seconds sammenhængende stilhed. Før der er hørt nok tale slutter optagelsen
+    aldrig på stilhed, så en langsom start ikke giver en tom fil.
+
+    Args:
+        samplerate (int): Sample rate for de blokke der fodres ind
+        threshold_db (float): Energi-tærskel for tale i dBFS
+        hangover_seconds (float): Stilhed efter tale før svaret regnes for slut
+        min_speech_seconds (float): Tale der skal være hørt før stilhed kan afslutte
+        frame_ms (float): Frame-længde i millisekunder
+    """
+
+    def __init__(self, samplerate, threshold_db=None, hangover_seconds=None, min_speech_seconds=None,
+                 frame_ms=None):
+        self.samplerate = samplerate
+        threshold_db = VAD_SETTINGS["threshold_db"] if threshold_db is None else threshold_db
+        hangover_seconds = VAD_SETTINGS["hangover_seconds"] if hangover_seconds is None else hangover_seconds
+        min_speech_seconds = (VAD_SETTINGS["min_speech_seconds"] if min_speech_seconds is None
+                              else min_speech_seconds)
+        frame_ms = VAD_SETTINGS["frame_ms"] if frame_ms is None else frame_ms
+
+        self.threshold = 10 ** (threshold_db / 20)
+        self.frame_length = max(1, int(samplerate * frame_ms / 1000))
+        self.hangover_frames = int(np.ceil(hangover_seconds * samplerate / self.frame_length))
+        self.min_speech_frames = int(np.ceil(min_speech_seconds * samplerate / self.frame_length))
+
+        self._remainder = None
+        self.speech_frames = 0
+        self.silent_frames = 0
+        self.frames_seen = 0
+        self.first_speech_frame = None
+        self.ended = False
+
+    @property
+    def speech_seconds(self):
+        return self.speech_frames * self.frame_length / self.samplerate
+
+    @property
+    def speech_started(self):
+        """Sekunder fra første fodrede sample til første tale-frame, eller None"""
+        if self.first_speech_frame is None:
+            return None
+        return self.first_speech_frame * self.frame_length / self.samplerate
+
+    def feed(self, block):
+        """
+        Fodrer en blok (frames x kanaler eller mono) ind i detektoren.
+
+        Returns:
+            bool: True når svaret er slut (stilhed efter tale)
+        """
+        if self.ended:
+            return True
+
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim > 1:
+            block = block.mean(axis=1)
+        if self._remainder is not None:
+            block = np.concatenate((self._remainder, block))
+
+        usable = len(block) - len(block) % self.frame_length
+        self._remainder = block[usable:]
+        if usable == 0:
+            return False
+
+        frames = block[:usable].reshape(-1, self.frame_length)
+        voiced = np.sqrt(np.mean(frames * frames, axis=1)) > self.threshold
+
+        for is_voiced in voiced:
+            if is_voiced:
+                if self.first_speech_frame is None:
+                    self.first_speech_frame = self.frames_seen
+                self.speech_frames += 1
+                self.silent_frames = 0
+            else:
+                self.silent_frames += 1
+                if self.speech_frames >= self.min_speech_frames and self.silent_frames >= self.hangover_frames:
+                    self.ended = True
+                    return True
+            self.frames_seen += 1
+        return False
+
+
+class OnsetDetector:
+    """
+    Finder den første ikke-stille sample i en strøm af blokke - sample-præcist.
+
+    Hvor EndOfAnswerDetector arbejder på frames, leder denne efter første sample hvis
+    amplitude (på tværs af kanaler) overstiger threshold_db, så latensen fra svarmode
+    til første lyd kan måles ned til én sample.
+
+    Args:
+        samplerate (int): Sample rate for de blokke der fodres ind
+        threshold_db (float): Amplitude-tærskel i dBFS
+    """
+
+    def __init__(self, samplerate, threshold_db=None):
+        self.samplerate = samplerate
+        threshold_db = VAD_SETTINGS["threshold_db"] if threshold_db is None else threshold_db
+        self.threshold = 10 ** (threshold_db / 20)
+        self.frames_seen = 0
+        self.onset_frame = None
+
+    @property
+    def onset_seconds(self):
+        """Sekunder fra første fodrede sample til første lyd, eller None"""
+        if self.onset_frame is None:
+            return None
+        return self.onset_frame / self.samplerate
+
+    def feed(self, block):
+        """Fodrer en blok ind; returnerer True når første lyd er fundet"""
+        if self.onset_frame is not None:
+            return True
+        block = np.asarray(block)
+        loud = np.abs(block).max(axis=1) if block.ndim > 1 else np.abs(block)
+        above = np.flatnonzero(loud > self.threshold)
+        if len(above):
+            self.onset_frame = self.frames_seen + int(above[0])
+        self.frames_seen += len(block)
+        return self.onset_frame is not None